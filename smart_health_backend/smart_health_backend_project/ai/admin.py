@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import AIUsageRecord
 
-# Register your models here.
+
+@admin.register(AIUsageRecord)
+class AIUsageRecordAdmin(admin.ModelAdmin):
+    list_display = ("endpoint", "user_id", "latency_ms", "prompt_tokens", "response_tokens", "cache_hit", "error_class", "created_at")
+    list_filter = ("endpoint", "cache_hit", "error_class")
+    date_hierarchy = "created_at"
@@ -1,6 +1,16 @@
 import google.genai as genai
 from django.conf import settings
 import logging
+import time
+
+from .resilience import (
+    CircuitBreaker,
+    call_with_deadline,
+    get_deadline,
+    hedge_delay,
+    record_latency,
+)
+from .usage import record_ai_call
 
 # Dedicated AI logger
 logger = logging.getLogger("ai")
@@ -16,23 +26,64 @@ except Exception as e:
 
 MODEL_NAME = getattr(settings, "GEMINI_MODEL", "gemini-1.5-flash")
 
+# Fallback texts returned instead of raising, so callers can detect them
+AI_EMPTY_MESSAGE = "The AI could not generate a response."
+AI_UNAVAILABLE_MESSAGE = "AI service unavailable. Please try again."
+
+
+def is_ai_fallback(text: str) -> bool:
+    """
+    True when call_gemini() returned one of its fallback texts.
+    """
+    return text in (AI_EMPTY_MESSAGE, AI_UNAVAILABLE_MESSAGE)
+
+# Shared by every worker; opens after repeated failures so outages fail fast
+breaker = CircuitBreaker("gemini")
+
+
+def _generate(prompt: str):
+    MODEL = genai.GenerativeModel(MODEL_NAME)
+    return MODEL.generate_content(prompt)
+
 # -------------------------------------------------
 # Safe Wrapper for all AI calls
 # -------------------------------------------------
-def call_gemini(prompt: str) -> str:
-    try:
-        MODEL = genai.GenerativeModel(MODEL_NAME)
-        response = MODEL.generate_content(prompt)
+def call_gemini(prompt: str, endpoint: str = "default") -> str:
+    if not breaker.allow_request():
+        logger.warning(f"AI circuit open, failing fast for '{endpoint}'.")
+        record_ai_call(endpoint, prompt=prompt, error_class="CircuitOpen")
+        return AI_UNAVAILABLE_MESSAGE
 
-        if hasattr(response, "text") and response.text:
-            return response.text.strip()
-
-        logger.warning("Empty AI response.")
-        return "The AI could not generate a response."
+    deadline = get_deadline(endpoint)
+    started = time.monotonic()
 
+    try:
+        response = call_with_deadline(
+            lambda: _generate(prompt),
+            deadline=deadline,
+            hedge_after=hedge_delay(endpoint, deadline),
+        )
     except Exception as e:
-        logger.error("Gemini API Error", exc_info=True)
-        return "AI service unavailable. Please try again."
+        breaker.record_failure()
+        logger.error(f"Gemini API Error ({endpoint})", exc_info=True)
+        record_ai_call(
+            endpoint, prompt=prompt, latency=time.monotonic() - started,
+            error_class=type(e).__name__,
+        )
+        return AI_UNAVAILABLE_MESSAGE
+
+    elapsed = time.monotonic() - started
+    breaker.record_success()
+    record_latency(endpoint, elapsed)
+
+    if hasattr(response, "text") and response.text:
+        text = response.text.strip()
+        record_ai_call(endpoint, prompt=prompt, response=text, latency=elapsed)
+        return text
+
+    logger.warning("Empty AI response.")
+    record_ai_call(endpoint, prompt=prompt, latency=elapsed, error_class="EmptyResponse")
+    return AI_EMPTY_MESSAGE
 
 
 
@@ -1,3 +1,79 @@
 from django.db import models
+from django.conf import settings
+from django.utils import timezone
 
-# Create your models here.
+
+class PatientSummaryCache(models.Model):
+    """
+    Last AI summary of a patient's medical_history, keyed by a hash of
+    the text it was generated from. A hash mismatch means it is stale.
+    """
+    patient = models.OneToOneField(
+        "patients.PatientProfile",
+        on_delete=models.CASCADE,
+        related_name="summary_cache",
+    )
+    history_hash = models.CharField(max_length=64)
+    summary = models.TextField()
+    usage = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"SummaryCache(patient={self.patient_id})"
+
+
+class TriageBatch(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="triage_batches",
+    )
+    entries = models.JSONField(default=list)
+    results = models.JSONField(default=list, blank=True)
+    stats = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"TriageBatch {self.id} ({self.status}, {len(self.entries)} entries)"
+
+
+class AIUsageRecord(models.Model):
+    """
+    One row per AI call or cache hit. Kept narrow (no foreign keys) and
+    written in batches by ai.usage.
+    """
+    endpoint = models.CharField(max_length=50)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    response_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    cache_hit = models.BooleanField(default=False)
+    error_class = models.CharField(max_length=50, blank=True)
+    # Time of the call, not of the (possibly delayed) bulk insert
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "endpoint"]),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} ({self.latency_ms} ms)"
@@ -0,0 +1,148 @@
+import re
+import hashlib
+import logging
+
+from django.conf import settings
+
+from users.caching import get_namespace
+
+from .gemini_utils import call_gemini, is_ai_fallback
+from .usage import estimate_tokens, record_ai_call
+
+logger = logging.getLogger("ai")
+
+# Rough budget for a single prompt, and the size of each map-step chunk
+PROMPT_TOKEN_BUDGET = getattr(settings, "AI_PROMPT_TOKEN_BUDGET", 3000)
+CHUNK_TOKENS = getattr(settings, "AI_SUMMARY_CHUNK_TOKENS", 1500)
+CHUNK_SUMMARY_TTL = getattr(settings, "AI_CHUNK_SUMMARY_TTL", 60 * 60 * 24 * 30)
+MAX_REDUCE_ROUNDS = 3
+ai_cache = get_namespace("ai")
+
+SUMMARY_PROMPT = "Generate a medical summary: {text}"
+CHUNK_PROMPT = (
+    "Summarize this part of a patient's medical history as short bullet points. "
+    "Keep diagnoses, medications, allergies, procedures and dates: {text}"
+)
+REDUCE_PROMPT = "Generate a medical summary from these partial summaries of one patient's history: {text}"
+
+
+# -------------------------------------------------
+# Compaction
+# -------------------------------------------------
+def split_entries(history: str) -> list:
+    """
+    Splits history into entries: one per line, or per sentence when
+    the history is a single paragraph.
+    """
+    lines = [line.strip(" \t-*•") for line in history.splitlines()]
+    lines = [line for line in lines if line]
+    if len(lines) > 1:
+        return lines
+    return [s.strip() for s in re.split(r"(?<=[.;])\s+", history.strip()) if s.strip()]
+
+
+def _entry_key(entry: str) -> str:
+    return " ".join(entry.lower().split()).rstrip(".;,")
+
+
+def deduplicate_entries(entries: list) -> list:
+    """
+    Drops repeated entries (case/whitespace/trailing punctuation
+    insensitive), keeping the first occurrence and original order.
+    """
+    seen = set()
+    unique = []
+    for entry in entries:
+        key = _entry_key(entry)
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(entry)
+    return unique
+
+
+def chunk_entries(entries: list, max_tokens: int = None) -> list:
+    """
+    Greedily packs consecutive entries into chunks of at most max_tokens.
+    Chunk boundaries only depend on the entries before them, so appending
+    to a history leaves earlier chunks (and their cached summaries) intact.
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS
+    chunks, current, size = [], [], 0
+    for entry in entries:
+        tokens = estimate_tokens(entry)
+        if current and size + tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(entry)
+        size += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+# -------------------------------------------------
+# Map-reduce summarization
+# -------------------------------------------------
+def _chunk_cache_key(chunk: str) -> str:
+    return "chunk_summary:" + hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+def summarize_medical_history(history: str) -> dict:
+    """
+    Builds the smallest prompt(s) that summarize `history`.
+
+    Short histories go out as one deduplicated prompt. Long ones are
+    chunked; each chunk summary is cached by content hash so only new
+    chunks cost a model call, then the partial summaries are reduced.
+
+    Returns {"summary": str, "usage": {...}} where usage reports
+    estimated tokens sent versus forwarding the raw history.
+    """
+    usage = {
+        "original_tokens": estimate_tokens(SUMMARY_PROMPT.format(text=history)),
+        "prompt_tokens": 0,
+        "tokens_saved": 0,
+        "chunks": 0,
+        "cached_chunks": 0,
+    }
+
+    entries = deduplicate_entries(split_entries(history))
+    text = "\n".join(entries)
+    rounds = 0
+
+    while estimate_tokens(text) > PROMPT_TOKEN_BUDGET and rounds < MAX_REDUCE_ROUNDS:
+        partials = []
+        for chunk in chunk_entries(entries):
+            usage["chunks"] += 1
+            key = _chunk_cache_key(chunk)
+            partial = ai_cache.get(key)
+            if partial is not None:
+                usage["cached_chunks"] += 1
+                record_ai_call("medical_summary", cache_hit=True)
+            else:
+                prompt = CHUNK_PROMPT.format(text=chunk)
+                usage["prompt_tokens"] += estimate_tokens(prompt)
+                partial = call_gemini(prompt, endpoint="medical_summary")
+                if is_ai_fallback(partial):
+                    return _finish(partial, usage)
+                ai_cache.set(key, partial, CHUNK_SUMMARY_TTL)
+            partials.append(partial)
+
+        entries = partials
+        text = "\n".join(entries)
+        rounds += 1
+
+    template = REDUCE_PROMPT if rounds else SUMMARY_PROMPT
+    prompt = template.format(text=text)
+    usage["prompt_tokens"] += estimate_tokens(prompt)
+    return _finish(call_gemini(prompt, endpoint="medical_summary"), usage)
+
+
+def _finish(summary: str, usage: dict) -> dict:
+    usage["tokens_saved"] = max(usage["original_tokens"] - usage["prompt_tokens"], 0)
+    logger.info(
+        f"Medical summary prompt: {usage['prompt_tokens']} tokens sent, "
+        f"{usage['tokens_saved']} saved, {usage['cached_chunks']}/{usage['chunks']} chunks cached"
+    )
+    return {"summary": summary, "usage": usage}
@@ -0,0 +1,247 @@
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, When, Value, IntegerField, Count
+
+TOP_K = getattr(settings, "AI_RECOMMENDATION_TOP_K", 5)
+
+# -------------------------------------------------
+# Bundled symptom vocabulary
+# -------------------------------------------------
+# "aliases" are stems matched against the start of a word in
+# DoctorProfile.specialization ("urol" is Urology, not Neurology),
+# "keywords" are symptom terms matched against the patient's input.
+SPECIALIZATIONS = {
+    "cardiology": {
+        "label": "Cardiology",
+        "aliases": ["cardio", "heart"],
+        "keywords": [
+            "chest pain", "palpitations", "shortness of breath", "high blood pressure",
+            "hypertension", "irregular heartbeat", "fainting", "swollen legs",
+        ],
+    },
+    "pulmonology": {
+        "label": "Pulmonology",
+        "aliases": ["pulmo", "respir", "chest"],
+        "keywords": [
+            "cough", "shortness of breath", "wheezing", "asthma", "chest tightness",
+            "coughing blood", "breathing difficulty",
+        ],
+    },
+    "neurology": {
+        "label": "Neurology",
+        "aliases": ["neuro"],
+        "keywords": [
+            "headache", "migraine", "dizziness", "seizure", "numbness", "tingling",
+            "memory loss", "fainting", "tremor", "blurred vision",
+        ],
+    },
+    "gastroenterology": {
+        "label": "Gastroenterology",
+        "aliases": ["gastro", "digest"],
+        "keywords": [
+            "abdominal pain", "stomach pain", "nausea", "vomiting", "diarrhea",
+            "constipation", "heartburn", "bloating", "blood in stool",
+        ],
+    },
+    "dermatology": {
+        "label": "Dermatology",
+        "aliases": ["derma", "skin"],
+        "keywords": ["rash", "itching", "acne", "eczema", "skin lesion", "hair loss", "hives"],
+    },
+    "orthopedics": {
+        "label": "Orthopedics",
+        "aliases": ["ortho", "bone"],
+        "keywords": [
+            "back pain", "joint pain", "knee pain", "fracture", "sprain",
+            "neck pain", "stiffness", "swollen joint",
+        ],
+    },
+    "ent": {
+        "label": "ENT",
+        "aliases": ["otolaryn", "ear", "throat"],
+        "keywords": [
+            "sore throat", "ear pain", "hearing loss", "sinus", "nasal congestion",
+            "runny nose", "tinnitus", "hoarseness",
+        ],
+    },
+    "ophthalmology": {
+        "label": "Ophthalmology",
+        "aliases": ["ophthalm", "eye"],
+        "keywords": ["blurred vision", "eye pain", "red eye", "vision loss", "itchy eyes"],
+    },
+    "psychiatry": {
+        "label": "Psychiatry",
+        "aliases": ["psych", "mental"],
+        "keywords": ["anxiety", "depression", "insomnia", "panic", "mood swings", "stress"],
+    },
+    "gynecology": {
+        "label": "Gynecology",
+        "aliases": ["gyn", "obstet"],
+        "keywords": [
+            "pelvic pain", "irregular periods", "menstrual pain", "vaginal bleeding",
+            "pregnancy",
+        ],
+    },
+    "urology": {
+        "label": "Urology",
+        "aliases": ["urol"],
+        "keywords": ["painful urination", "blood in urine", "frequent urination", "kidney pain"],
+    },
+    "endocrinology": {
+        "label": "Endocrinology",
+        "aliases": ["endocrin", "diabet"],
+        "keywords": [
+            "excessive thirst", "frequent urination", "weight loss", "weight gain",
+            "fatigue", "diabetes", "thyroid",
+        ],
+    },
+    "pediatrics": {
+        "label": "Pediatrics",
+        "aliases": ["pediatr", "paediatr", "child"],
+        "keywords": ["child", "baby", "infant", "toddler"],
+    },
+    "general": {
+        "label": "General Practice",
+        "aliases": ["general", "family", "internal"],
+        "keywords": ["fever", "fatigue", "cold", "flu", "body aches", "chills", "weakness"],
+    },
+}
+
+# Baseline so general practitioners remain candidates for unmatched symptoms
+GENERAL_BASELINE = 1
+
+
+def _build_keyword_index():
+    """
+    keyword -> list of specialization keys, built once at import.
+    """
+    index = defaultdict(list)
+    for key, spec in SPECIALIZATIONS.items():
+        for keyword in spec["keywords"]:
+            index[keyword].append(key)
+    return dict(index)
+
+
+KEYWORD_INDEX = _build_keyword_index()
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(re.findall(r"[a-z]+", text.lower()))
+
+
+# -------------------------------------------------
+# Scoring
+# -------------------------------------------------
+def score_specializations(symptoms: str) -> dict:
+    """
+    Scores each specialization against the symptom text.
+
+    A keyword shared by several specializations is worth less to each
+    of them (inverse document frequency), and multi-word keywords are
+    worth more than single words. Scores are integers (x10) so they can
+    be used directly in a database ordering.
+    """
+    padded = f" {normalize_text(symptoms)} "
+    scores = defaultdict(int)
+
+    for keyword, keys in KEYWORD_INDEX.items():
+        if f" {keyword} " not in padded:
+            continue
+        weight = 10 * len(keyword.split()) // len(keys)
+        for key in keys:
+            scores[key] += max(weight, 1)
+
+    scores["general"] += GENERAL_BASELINE
+    return dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+
+
+def alias_pattern(alias: str) -> str:
+    """Regex for `alias` at the start of a word, for a case-insensitive match."""
+    return rf"(^|[^a-z]){re.escape(alias)}"
+
+
+def rank_doctors(symptoms: str, doctors, top_k: int = TOP_K):
+    """
+    Narrows a DoctorProfile queryset to the top-K candidates.
+
+    Ranking is done in the database: specialization score first, then the
+    number of weekly availability slots, then years of experience.
+    Returns (doctors, scores) where doctors is a list.
+    """
+    scores = score_specializations(symptoms)
+
+    whens = []
+    for key, score in scores.items():
+        whens.append(When(specialization__iexact=key, then=Value(score)))
+        whens.extend(
+            When(specialization__iregex=alias_pattern(alias), then=Value(score))
+            for alias in SPECIALIZATIONS[key]["aliases"]
+        )
+
+    ranked = (
+        doctors
+        .select_related("user")
+        .annotate(
+            match_score=Case(*whens, default=Value(0), output_field=IntegerField()),
+            availability_count=Count("availabilities"),
+        )
+        .order_by("-match_score", "-availability_count", "-years_of_experience", "id")
+    )
+    return list(ranked[:top_k]), scores
+
+
+def matched_labels(scores: dict) -> list:
+    return [
+        SPECIALIZATIONS[key]["label"]
+        for key, score in scores.items()
+        if score > (GENERAL_BASELINE if key == "general" else 0)
+    ]
+
+
+def serialize_candidates(doctors) -> list:
+    return [
+        {
+            "id": d.id,
+            "username": d.user.username,
+            "specialization": d.specialization,
+            "location": d.location,
+            "years_of_experience": d.years_of_experience,
+            "availability_slots": d.availability_count,
+        }
+        for d in doctors
+    ]
+
+
+# -------------------------------------------------
+# Prompt & local answer
+# -------------------------------------------------
+def build_recommendation_prompt(symptoms: str, location: str, doctors, scores: dict) -> str:
+    lines = "\n".join(
+        f"- Dr. {d.user.username} | {d.specialization} | "
+        f"{d.years_of_experience} yrs | {d.availability_count} weekly slots"
+        for d in doctors
+    )
+    likely = ", ".join(matched_labels(scores)) or "General Practice"
+    return (
+        f"Patient symptoms: '{symptoms}' (location: '{location}').\n"
+        f"Likely specializations: {likely}.\n"
+        f"Recommend the most suitable doctors from this shortlist and explain why:\n"
+        f"{lines}"
+    )
+
+
+def local_recommendation(doctors, scores: dict) -> str:
+    """
+    Plain-text answer used when the model is unavailable.
+    """
+    likely = ", ".join(matched_labels(scores)) or "General Practice"
+    picks = "; ".join(
+        f"Dr. {d.user.username} ({d.specialization}, {d.years_of_experience} yrs experience)"
+        for d in doctors
+    )
+    return (
+        f"Based on your symptoms, the most relevant specializations are: {likely}. "
+        f"Suggested doctors: {picks}."
+    )
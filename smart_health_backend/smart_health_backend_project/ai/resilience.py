@@ -0,0 +1,185 @@
+import time
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger("ai")
+
+FAILURE_THRESHOLD = getattr(settings, "AI_BREAKER_FAILURE_THRESHOLD", 5)
+FAILURE_WINDOW = getattr(settings, "AI_BREAKER_FAILURE_WINDOW", 60)
+RECOVERY_TIMEOUT = getattr(settings, "AI_BREAKER_RECOVERY_SECONDS", 30)
+# How long a half-open probe holds its slot if it never reports back
+PROBE_TIMEOUT = 60
+
+DEFAULT_DEADLINE = 10
+ENDPOINT_DEADLINES = getattr(settings, "AI_ENDPOINT_DEADLINES", {})
+HEDGE_ATTEMPTS = getattr(settings, "AI_HEDGE_ATTEMPTS", 2)
+RETRY_JITTER = 0.25
+LATENCY_ALPHA = 0.2
+
+# Bounded pool: a hung backend can tie up at most this many threads,
+# never the request workers themselves.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "AI_MAX_CONCURRENT_CALLS", 8),
+    thread_name_prefix="ai-call",
+)
+
+
+# -------------------------------------------------
+# Circuit breaker (state shared across workers via the cache)
+# -------------------------------------------------
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD,
+                 recovery_timeout=RECOVERY_TIMEOUT, failure_window=FAILURE_WINDOW):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failure_window = failure_window
+        prefix = f"ai:breaker:{name}"
+        self.opened_key = f"{prefix}:opened_at"
+        self.failures_key = f"{prefix}:failures"
+        self.probe_key = f"{prefix}:probe"
+        self.transitions_prefix = f"{prefix}:transitions"
+
+    def state(self) -> str:
+        opened_at = cache.get(self.opened_key)
+        if opened_at is None:
+            return self.CLOSED
+        if time.time() - opened_at < self.recovery_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow_request(self) -> bool:
+        """
+        Closed: always. Open: never. Half-open: exactly one probe at a
+        time across all workers (cache.add is an atomic set-if-absent).
+        """
+        state = self.state()
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        if cache.add(self.probe_key, 1, timeout=PROBE_TIMEOUT):
+            self._transition(self.HALF_OPEN)
+            return True
+        return False
+
+    def record_success(self):
+        if cache.get(self.opened_key) is not None:
+            cache.delete_many([self.opened_key, self.probe_key, self.failures_key])
+            self._transition(self.CLOSED)
+        else:
+            cache.delete(self.failures_key)
+
+    def record_failure(self):
+        if cache.get(self.opened_key) is not None:
+            # Failed half-open probe: stay open for another recovery period
+            cache.set(self.opened_key, time.time(), timeout=None)
+            cache.delete(self.probe_key)
+            self._transition(self.OPEN)
+            return
+
+        cache.add(self.failures_key, 0, timeout=self.failure_window)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            failures = 1
+        if failures >= self.failure_threshold:
+            cache.set(self.opened_key, time.time(), timeout=None)
+            cache.delete(self.failures_key)
+            self._transition(self.OPEN)
+
+    def _transition(self, state):
+        key = f"{self.transitions_prefix}:{state}"
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+        logger.warning(f"AI circuit breaker '{self.name}' -> {state}")
+
+    def metrics(self) -> dict:
+        states = (self.OPEN, self.HALF_OPEN, self.CLOSED)
+        counts = cache.get_many([f"{self.transitions_prefix}:{s}" for s in states])
+        return {
+            "state": self.state(),
+            "transitions": {
+                s: counts.get(f"{self.transitions_prefix}:{s}", 0) for s in states
+            },
+        }
+
+
+# -------------------------------------------------
+# Deadlines, adaptive hedging and jittered retries
+# -------------------------------------------------
+def get_deadline(endpoint: str) -> float:
+    return ENDPOINT_DEADLINES.get(endpoint, DEFAULT_DEADLINE)
+
+
+def record_latency(endpoint: str, seconds: float):
+    """
+    Keeps an exponentially weighted moving average of successful call
+    latency per endpoint, shared across workers.
+    """
+    key = f"ai:latency:{endpoint}"
+    previous = cache.get(key)
+    value = seconds if previous is None else (1 - LATENCY_ALPHA) * previous + LATENCY_ALPHA * seconds
+    cache.set(key, value, timeout=None)
+
+
+def hedge_delay(endpoint: str, deadline: float) -> float:
+    """
+    Launch a hedged attempt once a call takes twice the usual latency,
+    but never later than half the deadline.
+    """
+    average = cache.get(f"ai:latency:{endpoint}")
+    if average is None:
+        return deadline / 2
+    return min(max(2 * average, 0.5), deadline / 2)
+
+
+def call_with_deadline(fn, deadline: float, hedge_after: float, attempts: int = HEDGE_ATTEMPTS):
+    """
+    Runs fn() in the bounded pool and returns the first successful result.
+
+    A slow attempt is hedged with a parallel one after `hedge_after`
+    seconds; a failed attempt is retried after a small random jitter.
+    Raises TimeoutError once `deadline` seconds have passed, leaving any
+    straggler to finish in the pool.
+    """
+    started = time.monotonic()
+    pending = {_executor.submit(fn)}
+    launched = 1
+    error = None
+
+    while pending:
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+
+        timeout = min(remaining, hedge_after) if launched < attempts else remaining
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+
+        if launched < attempts:
+            if done and not pending:
+                time.sleep(min(random.uniform(0, RETRY_JITTER), max(remaining, 0)))
+            pending.add(_executor.submit(fn))
+            launched += 1
+
+    for future in pending:
+        future.cancel()
+    raise error or TimeoutError(f"AI call exceeded its {deadline}s deadline")
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .models import TriageBatch
 
 # 1. Symptom Checker
 class SymptomCheckerSerializer(serializers.Serializer):
@@ -14,7 +15,8 @@ class SymptomCheckerSerializer(serializers.Serializer):
 
 # 2. Medical Summary
 class MedicalSummarySerializer(serializers.Serializer):
-    medical_history = serializers.CharField(max_length=5000, help_text="Full medical history text.")
+    # Long histories are compacted and chunked by ai.prompt_builder
+    medical_history = serializers.CharField(max_length=100000, help_text="Full medical history text.")
     medical_history.swagger_example = "Patient has hypertension and is on medication. Previous surgery in 2018."
 
     def validate_medical_history(self, value):
@@ -44,6 +46,29 @@ class DoctorRecommendationSerializer(serializers.Serializer):
         return value
 
 
+# 4. Batch Symptom Triage
+class TriageEntrySerializer(serializers.Serializer):
+    reference = serializers.CharField(max_length=100, allow_blank=True, default="")
+    symptoms = serializers.CharField(max_length=1000)
+
+    def validate_symptoms(self, value):
+        value = value.strip()
+        if not value:
+            raise serializers.ValidationError("Symptoms cannot be empty.")
+        return value
+
+
+class BatchTriageSerializer(serializers.Serializer):
+    entries = TriageEntrySerializer(many=True, allow_empty=False, max_length=500)
+
+
+class TriageBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TriageBatch
+        fields = ["id", "status", "stats", "results", "created_at", "completed_at"]
+        read_only_fields = fields
+
+
 
 
 
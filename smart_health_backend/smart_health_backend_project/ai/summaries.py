@@ -0,0 +1,65 @@
+import hashlib
+import logging
+
+from django.db import transaction
+
+from .gemini_utils import is_ai_fallback
+from .models import PatientSummaryCache
+from .prompt_builder import summarize_medical_history
+
+logger = logging.getLogger("ai")
+
+
+def history_hash(history: str) -> str:
+    return hashlib.sha256((history or "").strip().encode("utf-8")).hexdigest()
+
+
+def get_cached_summary(patient):
+    """
+    Returns the stored summary if it still matches the patient's
+    current medical_history, otherwise None.
+    """
+    cached = PatientSummaryCache.objects.filter(patient=patient).first()
+    if cached and cached.history_hash == history_hash(patient.medical_history):
+        return cached
+    return None
+
+
+def refresh_patient_summary(patient):
+    """
+    Summarizes the patient's history (reusing cached chunk summaries)
+    and stores the result. Fallback texts are never stored.
+    """
+    history = (patient.medical_history or "").strip()
+    if not history:
+        PatientSummaryCache.objects.filter(patient=patient).delete()
+        return None
+
+    result = summarize_medical_history(history)
+    if is_ai_fallback(result["summary"]):
+        return None
+
+    cached, _ = PatientSummaryCache.objects.update_or_create(
+        patient=patient,
+        defaults={
+            "history_hash": history_hash(history),
+            "summary": result["summary"],
+            "usage": result["usage"],
+        },
+    )
+    return cached
+
+
+def schedule_summary_refresh(patient_id):
+    """
+    Queues a background refresh once the current transaction commits.
+    """
+    from .tasks import refresh_patient_summary_task
+
+    def enqueue():
+        try:
+            refresh_patient_summary_task.delay(patient_id)
+        except Exception as e:
+            logger.error(f"Failed to queue summary refresh for patient {patient_id}: {e}")
+
+    transaction.on_commit(enqueue)
@@ -0,0 +1,52 @@
+from celery import shared_task
+from django.utils import timezone
+import logging
+
+from patients.models import PatientProfile
+from .models import TriageBatch
+from .summaries import get_cached_summary, refresh_patient_summary
+from .triage import triage_entries
+
+logger = logging.getLogger("ai")
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={"max_retries": 3})
+def refresh_patient_summary_task(self, patient_id):
+    patient = PatientProfile.objects.filter(id=patient_id).first()
+    if not patient:
+        logger.error(f"PatientProfile with ID {patient_id} does not exist.")
+        return
+
+    if get_cached_summary(patient):
+        return
+
+    if refresh_patient_summary(patient):
+        logger.info(f"Medical summary refreshed for patient {patient_id}")
+    else:
+        logger.warning(f"Medical summary refresh produced no result for patient {patient_id}")
+
+
+@shared_task(bind=True)
+def run_triage_batch_task(self, batch_id):
+    batch = TriageBatch.objects.filter(id=batch_id).first()
+    if not batch:
+        logger.error(f"TriageBatch with ID {batch_id} does not exist.")
+        return
+
+    batch.status = TriageBatch.STATUS_RUNNING
+    batch.save(update_fields=["status"])
+
+    try:
+        outcome = triage_entries(batch.entries)
+    except Exception as e:
+        logger.error(f"Triage batch {batch_id} failed: {e}", exc_info=True)
+        batch.status = TriageBatch.STATUS_FAILED
+        batch.completed_at = timezone.now()
+        batch.save(update_fields=["status", "completed_at"])
+        return
+
+    batch.results = outcome["results"]
+    batch.stats = outcome["stats"]
+    batch.status = TriageBatch.STATUS_COMPLETED
+    batch.completed_at = timezone.now()
+    batch.save(update_fields=["results", "stats", "status", "completed_at"])
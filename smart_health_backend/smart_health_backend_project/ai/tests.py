@@ -1,3 +1,363 @@
-from django.test import TestCase
+import json
+import time as clock
+from unittest.mock import patch
+from datetime import time
 
-# Create your tests here.
+from django.urls import reverse
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from doctors.models import DoctorProfile, Availability
+from patients.models import PatientProfile
+from users.tokens import RoleRefreshToken
+from .gemini_utils import AI_UNAVAILABLE_MESSAGE, call_gemini, breaker
+from .resilience import CircuitBreaker, call_with_deadline
+from .recommendation import rank_doctors, score_specializations
+from .prompt_builder import deduplicate_entries, split_entries, summarize_medical_history
+from .models import PatientSummaryCache, TriageBatch, AIUsageRecord
+from .usage import flush_usage, percentile
+from .triage import triage_entries
+
+User = get_user_model()
+
+
+class SymptomScoringTests(APITestCase):
+    def test_cardiac_symptoms_rank_cardiology_first(self):
+        scores = score_specializations("Severe chest pain and palpitations")
+        self.assertEqual(next(iter(scores)), "cardiology")
+
+    def test_unknown_symptoms_fall_back_to_general(self):
+        scores = score_specializations("something feels off")
+        self.assertEqual(list(scores), ["general"])
+
+
+class DoctorRecommendationTests(APITestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(
+            username="patient1",
+            email="patient1@example.com",
+            password="securepassword",
+            role="patient",
+        )
+        self.client.force_authenticate(user=self.patient)
+        self.url = reverse("ai_api:v1_doctor_recommendation")
+
+        for username, specialization in (
+            ("cardio_doc", "Cardiology"),
+            ("skin_doc", "Dermatology"),
+            ("gp_doc", "General Practice"),
+        ):
+            user = User.objects.create_user(
+                username=username,
+                email=f"{username}@example.com",
+                password="password123",
+                role="doctor",
+            )
+            profile = user.doctor_profile
+            profile.specialization = specialization
+            profile.location = "Kigali"
+            profile.save()
+
+        Availability.objects.create(
+            doctor=DoctorProfile.objects.get(user__username="cardio_doc"),
+            day_of_week="Monday",
+            start_time=time(9, 0),
+            end_time=time(12, 0),
+        )
+
+    @patch("ai.views.call_gemini")
+    def test_prompt_contains_only_ranked_shortlist(self, mock_gemini):
+        mock_gemini.return_value = "See Dr. cardio_doc."
+
+        response = self.client.post(
+            self.url, {"symptoms": "chest pain", "location": "kigali"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["source"], "ai")
+        self.assertEqual(response.data["data"]["doctors"][0]["username"], "cardio_doc")
+        self.assertIn("cardio_doc", mock_gemini.call_args[0][0])
+
+    @patch("ai.views.call_gemini")
+    def test_local_fallback_when_model_unavailable(self, mock_gemini):
+        mock_gemini.return_value = AI_UNAVAILABLE_MESSAGE
+
+        response = self.client.post(
+            self.url, {"symptoms": "itchy rash", "location": "Kigali"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["source"], "local")
+        self.assertIn("skin_doc", response.data["data"]["recommendation"])
+
+    def test_aliases_match_whole_word_stems_only(self):
+        for username, specialization in (
+            ("neuro_doc", "Neurology"),
+            ("uro_doc", "Urology"),
+            ("ent_doc", "Ear, Nose & Throat"),
+            ("heart_doc", "Heart & Vascular"),
+        ):
+            profile = User.objects.create_user(
+                username=username, email=f"{username}@example.com", password="password123", role="doctor",
+            ).doctor_profile
+            profile.specialization = specialization
+            profile.save()
+
+        def match_scores(symptoms):
+            doctors, _ = rank_doctors(symptoms, DoctorProfile.objects.all(), top_k=10)
+            return {d.user.username: d.match_score for d in doctors}
+
+        # "urol" must not match Neurology
+        scores = match_scores("blood in urine")
+        self.assertGreater(scores["uro_doc"], 0)
+        self.assertEqual(scores["neuro_doc"], 0)
+
+        # "ear" must not match Heart
+        scores = match_scores("ear pain")
+        self.assertGreater(scores["ent_doc"], 0)
+        self.assertEqual(scores["heart_doc"], 0)
+        self.assertGreater(match_scores("palpitations")["heart_doc"], 0)
+
+    def test_no_doctors_in_location(self):
+        response = self.client.post(
+            self.url, {"symptoms": "cough", "location": "Musanze"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MedicalSummaryPromptTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_entries_are_dropped(self):
+        history = "Hypertension.\nOn amlodipine.\nhypertension\nOn amlodipine."
+        self.assertEqual(
+            deduplicate_entries(split_entries(history)),
+            ["Hypertension.", "On amlodipine."],
+        )
+
+    @patch("ai.prompt_builder.PROMPT_TOKEN_BUDGET", 50)
+    @patch("ai.prompt_builder.CHUNK_TOKENS", 40)
+    @patch("ai.prompt_builder.call_gemini")
+    def test_only_new_chunks_are_summarized(self, mock_gemini):
+        mock_gemini.side_effect = lambda prompt, **kwargs: f"summary {len(prompt)}"
+        entries = [f"Visit {i}: blood pressure check, medication adjusted." for i in range(12)]
+
+        first = summarize_medical_history("\n".join(entries))
+        self.assertGreater(first["usage"]["chunks"], 1)
+        self.assertEqual(first["usage"]["cached_chunks"], 0)
+
+        entries.append("Visit 12: new complaint of persistent cough.")
+        second = summarize_medical_history("\n".join(entries))
+
+        self.assertEqual(second["usage"]["chunks"], first["usage"]["chunks"] + 1)
+        self.assertEqual(second["usage"]["cached_chunks"], first["usage"]["chunks"])
+        self.assertLess(second["usage"]["prompt_tokens"], first["usage"]["prompt_tokens"])
+
+
+class PatientSummaryCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="patient2",
+            email="patient2@example.com",
+            password="securepassword",
+            role="patient",
+        )
+        self.profile = self.user.patient_profile
+        self.profile.medical_history = "Asthma since childhood."
+        self.profile.save()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("ai_api:v1_patient_summary")
+
+    @patch("ai.prompt_builder.call_gemini")
+    def test_second_request_is_served_from_cache(self, mock_gemini):
+        mock_gemini.return_value = "Asthmatic patient."
+
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertFalse(first.data["data"]["cached"])
+        self.assertTrue(second.data["data"]["cached"])
+        self.assertEqual(mock_gemini.call_count, 1)
+
+    def test_profile_deleted_after_token_issue_is_a_404(self):
+        access = str(RoleRefreshToken.for_user(self.user).access_token)
+        PatientProfile.objects.filter(pk=self.profile.pk).delete()
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch("ai.tasks.refresh_patient_summary_task.delay")
+    def test_history_update_invalidates_and_queues_refresh(self, mock_delay):
+        PatientSummaryCache.objects.create(
+            patient=self.profile, history_hash="outdated", summary="Old summary."
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("patient-profile"), {"medical_history": "Asthma. Now diabetic."}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_delay.assert_called_once_with(self.profile.id)
+
+
+class CircuitBreakerTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch("ai.gemini_utils._generate")
+    def test_opens_after_repeated_failures_and_fails_fast(self, mock_generate):
+        mock_generate.side_effect = RuntimeError("backend down")
+
+        for _ in range(breaker.failure_threshold):
+            self.assertEqual(call_gemini("hello"), AI_UNAVAILABLE_MESSAGE)
+
+        calls = mock_generate.call_count
+        self.assertEqual(breaker.state(), CircuitBreaker.OPEN)
+        self.assertEqual(call_gemini("hello"), AI_UNAVAILABLE_MESSAGE)
+        self.assertEqual(mock_generate.call_count, calls)
+
+    def test_half_open_allows_single_probe_then_closes(self):
+        probe = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0)
+        probe.record_failure()
+
+        self.assertTrue(probe.allow_request())
+        self.assertFalse(probe.allow_request())
+
+        probe.record_success()
+        self.assertEqual(probe.state(), CircuitBreaker.CLOSED)
+        self.assertEqual(probe.metrics()["transitions"]["closed"], 1)
+
+    def test_slow_call_is_hedged(self):
+        replies = iter([lambda: clock.sleep(1) or "slow", lambda: "fast"])
+        result = call_with_deadline(lambda: next(replies)(), deadline=2, hedge_after=0.05)
+        self.assertEqual(result, "fast")
+
+    def test_deadline_is_enforced(self):
+        started = clock.monotonic()
+        with self.assertRaises(TimeoutError):
+            call_with_deadline(lambda: clock.sleep(1), deadline=0.1, hedge_after=1, attempts=1)
+        self.assertLess(clock.monotonic() - started, 0.5)
+
+
+class BatchTriageTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="clinic",
+            email="clinic@example.com",
+            password="securepassword",
+            role="doctor",
+        )
+        self.client.force_authenticate(user=self.user)
+
+    @staticmethod
+    def fake_model(prompt, **kwargs):
+        count = sum(1 for line in prompt.splitlines() if line[:1].isdigit())
+        return "```json\n" + json.dumps([
+            {"id": i, "urgency": "routine", "analysis": f"item {i}"} for i in range(1, count + 1)
+        ]) + "\n```"
+
+    @patch("ai.triage.PACK_SIZE", 10)
+    @patch("ai.triage.call_gemini")
+    def test_entries_are_deduplicated_and_packed(self, mock_gemini):
+        mock_gemini.side_effect = self.fake_model
+        entries = [{"reference": str(i), "symptoms": f"Fever and cough {i % 15}"} for i in range(40)]
+
+        outcome = triage_entries(entries)
+
+        self.assertEqual(outcome["stats"]["unique"], 15)
+        self.assertEqual(mock_gemini.call_count, 2)
+        self.assertTrue(all(r["status"] == "ok" for r in outcome["results"]))
+        self.assertEqual([r["reference"] for r in outcome["results"]], [str(i) for i in range(40)])
+
+        triage_entries(entries)
+        self.assertEqual(mock_gemini.call_count, 2)
+
+    @patch("ai.triage.call_gemini")
+    def test_unparseable_response_marks_entries_failed(self, mock_gemini):
+        mock_gemini.return_value = "Sorry, I cannot help with that."
+        outcome = triage_entries([{"reference": "a", "symptoms": "headache"}])
+        self.assertEqual(outcome["results"][0]["status"], "error")
+
+    @patch("ai.views.run_triage_batch_task.delay")
+    def test_batch_endpoint_returns_handle(self, mock_delay):
+        response = self.client.post(
+            reverse("ai_api:v1_symptom_batch"),
+            {"entries": [{"reference": "p1", "symptoms": "chest pain"}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        batch_id = response.data["data"]["batch_id"]
+        mock_delay.assert_called_once_with(batch_id)
+
+        poll = self.client.get(reverse("ai_api:v1_symptom_batch_status", args=[batch_id]))
+        self.assertEqual(poll.status_code, status.HTTP_200_OK)
+        self.assertEqual(poll.data["status"], TriageBatch.STATUS_PENDING)
+
+
+class AIUsageAccountingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        flush_usage()
+        self.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin123"
+        )
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 95))
+
+    @patch("ai.gemini_utils._generate")
+    def test_calls_are_recorded_in_bulk_and_reported(self, mock_generate):
+        mock_generate.return_value.text = "Looks like a common cold."
+        for _ in range(3):
+            call_gemini("runny nose", endpoint="symptom_checker")
+        mock_generate.side_effect = RuntimeError("boom")
+        call_gemini("runny nose", endpoint="symptom_checker")
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse("ai_api:v1_usage_metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AIUsageRecord.objects.count(), 4)
+        row = response.data["endpoints"][0]
+        self.assertEqual(row["endpoint"], "symptom_checker")
+        self.assertEqual(row["calls"], 4)
+        self.assertEqual(row["errors"], 1)
+        self.assertIsNotNone(row["latency_ms"]["p95"])
+
+    def test_percentiles_are_read_in_the_database(self):
+        AIUsageRecord.objects.bulk_create(
+            [AIUsageRecord(endpoint="symptom_checker", latency_ms=ms) for ms in range(100, 0, -1)]
+            + [AIUsageRecord(endpoint="symptom_checker", latency_ms=5000, cache_hit=True)]
+            + [AIUsageRecord(endpoint="symptom_checker", latency_ms=0, error_class="CircuitOpen") for _ in range(50)]
+        )
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(reverse("ai_api:v1_usage_metrics"), {"hours": 100_000_000})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["hours"], 24 * 90)
+        row = response.data["endpoints"][0]
+        self.assertEqual((row["calls"], row["cache_hits"], row["errors"]), (151, 1, 50))
+        values = list(range(1, 101))
+        self.assertEqual(
+            row["latency_ms"], {f"p{pct}": percentile(values, pct) for pct in (50, 95, 99)}
+        )
+
+    def test_metrics_require_admin(self):
+        user = User.objects.create_user(
+            username="nobody", email="nobody@example.com", password="x", role="patient"
+        )
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse("ai_api:v1_usage_metrics"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,124 @@
+import re
+import json
+import hashlib
+import logging
+
+from django.conf import settings
+
+from users.caching import get_namespace
+
+from .gemini_utils import call_gemini, is_ai_fallback
+from .usage import record_ai_call
+
+logger = logging.getLogger("ai")
+
+PACK_SIZE = getattr(settings, "AI_TRIAGE_PACK_SIZE", 10)
+RESULT_TTL = 60 * 60 * 24
+URGENCY_LEVELS = ("emergency", "urgent", "routine", "self-care")
+ai_cache = get_namespace("ai")
+
+TRIAGE_PROMPT = (
+    "You are a medical triage assistant. For each numbered symptom description below, "
+    "return ONLY a JSON array with one object per item: "
+    '{{"id": <number>, "urgency": one of {levels}, "analysis": "<one or two sentences>"}}.\n'
+    "{items}"
+)
+
+
+def normalize_symptoms(text: str) -> str:
+    return " ".join(text.lower().split()).strip(" .,;")
+
+
+def _result_cache_key(normalized: str) -> str:
+    return "triage:" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def build_triage_prompt(pack: list) -> str:
+    items = "\n".join(f"{i}. {symptoms}" for i, symptoms in enumerate(pack, start=1))
+    return TRIAGE_PROMPT.format(levels=", ".join(URGENCY_LEVELS), items=items)
+
+
+def parse_triage_response(text: str, size: int) -> dict:
+    """
+    Extracts {position: {"urgency", "analysis"}} from the model output.
+    Tolerates prose or code fences around the JSON array; items with an
+    unknown id or urgency are dropped.
+    """
+    match = re.search(r"\[.*\]", text or "", re.DOTALL)
+    if not match:
+        return {}
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return {}
+
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            position = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        urgency = str(item.get("urgency", "")).lower()
+        if 1 <= position <= size and urgency in URGENCY_LEVELS:
+            parsed[position] = {"urgency": urgency, "analysis": str(item.get("analysis", "")).strip()}
+    return parsed
+
+
+def triage_entries(entries: list) -> dict:
+    """
+    Triages [{"reference", "symptoms"}, ...].
+
+    Identical symptom descriptions are analysed once, previously seen
+    ones come from the cache, and the rest are packed PACK_SIZE per
+    model call. Returns {"results": [...], "stats": {...}} with results
+    in input order.
+    """
+    unique = {}
+    for entry in entries:
+        unique.setdefault(normalize_symptoms(entry["symptoms"]), entry["symptoms"])
+
+    keys = {normalized: _result_cache_key(normalized) for normalized in unique}
+    cached = ai_cache.get_many(list(keys.values()))
+    analyses = {n: cached[k] for n, k in keys.items() if k in cached}
+    for _ in analyses:
+        record_ai_call("symptom_triage", cache_hit=True)
+
+    missing = [n for n in unique if n not in analyses]
+    model_calls = 0
+    for start in range(0, len(missing), PACK_SIZE):
+        pack = missing[start:start + PACK_SIZE]
+        response = call_gemini(build_triage_prompt([unique[n] for n in pack]), endpoint="symptom_triage")
+        model_calls += 1
+        if is_ai_fallback(response):
+            logger.warning(f"Triage pack of {len(pack)} failed: {response}")
+            continue
+
+        parsed = parse_triage_response(response, len(pack))
+        fresh = {}
+        for position, normalized in enumerate(pack, start=1):
+            if position in parsed:
+                analyses[normalized] = fresh[keys[normalized]] = parsed[position]
+        ai_cache.set_many(fresh, RESULT_TTL)
+
+    results = []
+    for entry in entries:
+        analysis = analyses.get(normalize_symptoms(entry["symptoms"]))
+        results.append({
+            "reference": entry.get("reference", ""),
+            "symptoms": entry["symptoms"],
+            "status": "ok" if analysis else "error",
+            "urgency": analysis["urgency"] if analysis else None,
+            "analysis": analysis["analysis"] if analysis else None,
+        })
+
+    stats = {
+        "entries": len(entries),
+        "unique": len(unique),
+        "cached": len(unique) - len(missing),
+        "model_calls": model_calls,
+        "failed": sum(1 for r in results if r["status"] == "error"),
+    }
+    logger.info(f"Batch triage: {stats}")
+    return {"results": results, "stats": stats}
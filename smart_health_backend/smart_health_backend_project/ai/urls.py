@@ -7,7 +7,11 @@ from drf_yasg import openapi
 from .views import (
     AISymptomCheckerView,
     AIMedicalSummaryView,
-    AIDoctorRecommendationView
+    AIPatientSummaryView,
+    AIDoctorRecommendationView,
+    AIBatchTriageView,
+    AIBatchTriageStatusView,
+    AIUsageMetricsView,
 )
 
 app_name = "ai_api"
@@ -32,8 +36,12 @@ schema_view = get_schema_view(
 # -----------------------------
 urlpatterns = [
     path("v1/symptoms/checker/", AISymptomCheckerView.as_view(), name="v1_symptom_checker"),
+    path("v1/symptoms/batch/", AIBatchTriageView.as_view(), name="v1_symptom_batch"),
+    path("v1/symptoms/batch/<int:pk>/", AIBatchTriageStatusView.as_view(), name="v1_symptom_batch_status"),
     path("v1/medical/summary/", AIMedicalSummaryView.as_view(), name="v1_medical_summary"),
+    path("v1/medical/summary/me/", AIPatientSummaryView.as_view(), name="v1_patient_summary"),
     path("v1/doctors/recommendation/", AIDoctorRecommendationView.as_view(), name="v1_doctor_recommendation"),
+    path("v1/metrics/usage/", AIUsageMetricsView.as_view(), name="v1_usage_metrics"),
 ]
 
 # -----------------------------
@@ -0,0 +1,154 @@
+import math
+import time
+import atexit
+import logging
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models import Count, Sum, Q
+
+from .models import AIUsageRecord
+
+logger = logging.getLogger("ai")
+
+FLUSH_SIZE = getattr(settings, "AI_USAGE_FLUSH_SIZE", 50)
+FLUSH_SECONDS = getattr(settings, "AI_USAGE_FLUSH_SECONDS", 10)
+# Longest reporting window; larger ones would overflow the date arithmetic
+MAX_HOURS = getattr(settings, "AI_USAGE_MAX_HOURS", 24 * 90)
+
+# Set by BaseAIView so call_gemini() can attribute calls without new arguments
+current_user_id = ContextVar("ai_current_user_id", default=None)
+
+_buffer = []
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local estimate (~4 characters per token for English text).
+    Good enough for budgeting; no tokenizer round trip needed.
+    """
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
+
+
+# -------------------------------------------------
+# Recording (buffered, written with bulk_create)
+# -------------------------------------------------
+def record_ai_call(endpoint, prompt="", response="", latency=0.0, cache_hit=False, error_class=""):
+    record = AIUsageRecord(
+        endpoint=endpoint,
+        user_id=current_user_id.get(),
+        prompt_tokens=estimate_tokens(prompt),
+        response_tokens=estimate_tokens(response),
+        latency_ms=int(latency * 1000),
+        cache_hit=cache_hit,
+        error_class=error_class,
+    )
+
+    with _lock:
+        _buffer.append(record)
+        due = len(_buffer) >= FLUSH_SIZE or time.monotonic() - _last_flush >= FLUSH_SECONDS
+
+    if due:
+        flush_usage()
+
+
+def flush_usage():
+    """
+    Writes buffered records in one INSERT. Accounting must never break
+    an AI request, so failures are logged and the batch is dropped.
+    """
+    global _last_flush
+
+    with _lock:
+        batch = _buffer[:]
+        _buffer.clear()
+        _last_flush = time.monotonic()
+
+    if not batch:
+        return 0
+
+    try:
+        AIUsageRecord.objects.bulk_create(batch)
+    except Exception as e:
+        logger.error(f"Failed to write {len(batch)} AI usage records: {e}")
+        return 0
+    return len(batch)
+
+
+atexit.register(flush_usage)
+
+
+# -------------------------------------------------
+# Reporting
+# -------------------------------------------------
+def nearest_rank(count: int, pct: float) -> int:
+    """1-based nearest-rank position of the pct-th percentile among `count` values."""
+    return max(math.ceil(pct / 100 * count), 1)
+
+
+def percentile(sorted_values: list, pct: float):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[nearest_rank(len(sorted_values), pct) - 1]
+
+
+def latency_percentiles(records, count: int, pcts=(50, 95, 99)) -> dict:
+    """
+    Nearest-rank latency percentiles of `count` records, each read as a
+    single row (ORDER BY latency_ms with an OFFSET) so the latencies are
+    never loaded into Python.
+    """
+    ordered = records.order_by("latency_ms").values_list("latency_ms", flat=True)
+    return {f"p{pct}": ordered[nearest_rank(count, pct) - 1] if count else None for pct in pcts}
+
+
+def usage_summary(since) -> list:
+    """
+    Per-endpoint call counts, cache hit/error counts, p50/p95/p99 latency
+    of successful model calls and estimated cost. Cache hits and failed
+    calls (open circuit, errors, empty replies) are left out of the
+    latencies, as most are recorded at 0 ms and would drag them down
+    during an outage.
+    """
+    prompt_cost = getattr(settings, "AI_COST_PER_1K_PROMPT_TOKENS", 0.0)
+    response_cost = getattr(settings, "AI_COST_PER_1K_RESPONSE_TOKENS", 0.0)
+
+    records = AIUsageRecord.objects.filter(created_at__gte=since)
+    totals = (
+        records.values("endpoint")
+        .annotate(
+            calls=Count("id"),
+            cache_hits=Count("id", filter=Q(cache_hit=True)),
+            errors=Count("id", filter=~Q(error_class="")),
+            model_calls=Count("id", filter=Q(cache_hit=False, error_class="")),
+            prompt_tokens=Sum("prompt_tokens"),
+            response_tokens=Sum("response_tokens"),
+        )
+        .order_by("endpoint")
+    )
+
+    summary = []
+    for row in totals:
+        model_calls = row.pop("model_calls")
+        prompt_tokens = row["prompt_tokens"] or 0
+        response_tokens = row["response_tokens"] or 0
+        summary.append({
+            **row,
+            "prompt_tokens": prompt_tokens,
+            "response_tokens": response_tokens,
+            "latency_ms": latency_percentiles(
+                records.filter(endpoint=row["endpoint"], cache_hit=False, error_class=""), model_calls
+            ),
+            "estimated_cost": round(
+                prompt_tokens / 1000 * prompt_cost + response_tokens / 1000 * response_cost, 6
+            ),
+        })
+    return summary
@@ -1,19 +1,42 @@
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.throttling import UserRateThrottle, ScopedRateThrottle
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from django.utils import timezone
+from datetime import timedelta
 import logging
 
 from .serializers import (
     SymptomCheckerSerializer,
     MedicalSummarySerializer,
     DoctorRecommendationSerializer,
+    BatchTriageSerializer,
+    TriageBatchSerializer,
 )
 from .gemini_utils import ( 
     call_gemini,  
+    is_ai_fallback,
+)
+from .prompt_builder import summarize_medical_history
+from .summaries import get_cached_summary, refresh_patient_summary
+from .models import TriageBatch
+from .tasks import run_triage_batch_task
+from .usage import MAX_HOURS as USAGE_MAX_HOURS, current_user_id, flush_usage, record_ai_call, usage_summary
+from .gemini_utils import breaker
+from .recommendation import (
+    rank_doctors,
+    build_recommendation_prompt,
+    local_recommendation,
+    serialize_candidates,
+    matched_labels,
 )
 from doctors.models import DoctorProfile  # ✅ Use DoctorProfile instead of Doctor
+from doctors.locations import filter_by_location
+from patients.models import PatientProfile
+from users.permissions import IsPatient
+from users.profiles import get_profile_id
+from users.throttling import SlidingScopedRateThrottle, SlidingUserRateThrottle
 
 logger = logging.getLogger("ai")
 
@@ -23,10 +46,21 @@ logger = logging.getLogger("ai")
 # --------------------------------------------------
 class BaseAIView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
-    throttle_classes = [UserRateThrottle, ScopedRateThrottle]
+    throttle_classes = [SlidingUserRateThrottle, SlidingScopedRateThrottle]
     throttle_scope = "ai"
     http_method_names = ["post"]
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Attribute AI usage records to the caller
+        self._usage_token = current_user_id.set(request.user.id)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_usage_token", None)
+        if token is not None:
+            current_user_id.reset(token)
+        return super().finalize_response(request, response, *args, **kwargs)
+
     def format_response(self, data=None, message="", status_type="success",
                         http_status=status.HTTP_200_OK):
         return Response(
@@ -51,7 +85,10 @@ class AISymptomCheckerView(BaseAIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        result = call_gemini(f"Analyze these symptoms: {serializer.validated_data['symptoms']}")
+        result = call_gemini(
+            f"Analyze these symptoms: {serializer.validated_data['symptoms']}",
+            endpoint="symptom_checker",
+        )
 
         return self.format_response(
             data={"analysis": result},
@@ -75,10 +112,59 @@ class AIMedicalSummaryView(BaseAIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        summary = call_gemini(f"Generate a medical summary: {serializer.validated_data['medical_history']}")
+        result = summarize_medical_history(serializer.validated_data["medical_history"])
+
+        return self.format_response(
+            data={"summary": result["summary"], "usage": result["usage"]},
+            message="Medical summary generated."
+        )
+
+
+# --------------------------------------------------
+# 2b. AI Medical Summary of the patient's own profile
+# --------------------------------------------------
+class AIPatientSummaryView(BaseAIView):
+    permission_classes = [permissions.IsAuthenticated, IsPatient]
+    http_method_names = ["get"]
+
+    @swagger_auto_schema(
+        operation_summary="AI Summary of My Medical History",
+        responses={200: "Medical summary result"}
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            patient = PatientProfile.objects.get(pk=get_profile_id(request, "patient"))
+        except PatientProfile.DoesNotExist:
+            raise NotFound("Patient profile not found")
+
+        if not (patient.medical_history or "").strip():
+            return self.format_response(
+                data=None,
+                message="No medical history to summarize.",
+                status_type="error",
+                http_status=status.HTTP_404_NOT_FOUND
+            )
+
+        cached = get_cached_summary(patient)
+        if cached:
+            record_ai_call("medical_summary", cache_hit=True)
+            return self.format_response(
+                data={"summary": cached.summary, "cached": True, "generated_at": cached.updated_at},
+                message="Medical summary retrieved."
+            )
+
+        logger.info(f"Medical summary cache miss for patient {patient.id}")
+        cached = refresh_patient_summary(patient)
+        if not cached:
+            return self.format_response(
+                data=None,
+                message="AI service unavailable. Please try again.",
+                status_type="error",
+                http_status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
 
         return self.format_response(
-            data={"summary": summary},
+            data={"summary": cached.summary, "cached": False, "generated_at": cached.updated_at},
             message="Medical summary generated."
         )
 
@@ -101,9 +187,12 @@ class AIDoctorRecommendationView(BaseAIView):
         symptoms = serializer.validated_data["symptoms"]
         location = serializer.validated_data["location"]
 
-        doctors = DoctorProfile.objects.filter(location__icontains=location)
+        doctors, scores = rank_doctors(
+            symptoms,
+            filter_by_location(DoctorProfile.objects.all(), location),
+        )
 
-        if not doctors.exists():
+        if not doctors:
             return self.format_response(
                 data=[],
                 message="No doctors available in this location.",
@@ -112,15 +201,108 @@ class AIDoctorRecommendationView(BaseAIView):
             )
 
         recommendation = call_gemini(
-            f"Recommend doctors for symptoms '{symptoms}' in location '{location}' from list: {[d.user.username for d in doctors]}"
+            build_recommendation_prompt(symptoms, location, doctors, scores),
+            endpoint="doctor_recommendation",
         )
+        source = "ai"
+
+        if is_ai_fallback(recommendation):
+            logger.warning(f"Doctor recommendation answered locally for user {request.user.id}")
+            recommendation = local_recommendation(doctors, scores)
+            source = "local"
 
         return self.format_response(
-            data={"recommendation": recommendation},
+            data={
+                "recommendation": recommendation,
+                "source": source,
+                "specializations": matched_labels(scores),
+                "doctors": serialize_candidates(doctors),
+            },
             message="Doctor recommendation generated."
         )
 
 
+# --------------------------------------------------
+# 4. AI Batch Symptom Triage
+# --------------------------------------------------
+class AIBatchTriageView(BaseAIView):
+    serializer_class = BatchTriageSerializer
+
+    @swagger_auto_schema(
+        operation_summary="AI Batch Symptom Triage",
+        request_body=BatchTriageSerializer,
+        responses={202: "Batch accepted; poll the returned batch_id"}
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        entries = serializer.validated_data["entries"]
+        batch = TriageBatch.objects.create(requested_by_id=request.user.id, entries=entries)
+        logger.info(f"Batch triage of {len(entries)} entries queued by user {request.user.id}")
+
+        try:
+            run_triage_batch_task.delay(batch.id)
+        except Exception as e:
+            logger.error(f"Failed to queue triage batch {batch.id}: {e}")
+            batch.status = TriageBatch.STATUS_FAILED
+            batch.save(update_fields=["status"])
+            return self.format_response(
+                data={"batch_id": batch.id, "batch_status": batch.status},
+                message="Batch triage could not be queued.",
+                status_type="error",
+                http_status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return self.format_response(
+            data={"batch_id": batch.id, "batch_status": batch.status},
+            message="Batch triage started.",
+            http_status=status.HTTP_202_ACCEPTED
+        )
+
+
+class AIBatchTriageStatusView(generics.RetrieveAPIView):
+    """
+    Poll a triage batch; results are filled in once it completes.
+    Not AI-throttled since it never calls the model.
+    """
+    serializer_class = TriageBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return TriageBatch.objects.filter(requested_by_id=self.request.user.id)
+
+
+# --------------------------------------------------
+# 5. AI Usage Metrics (admin only)
+# --------------------------------------------------
+class AIUsageMetricsView(generics.GenericAPIView):
+    """
+    Per-endpoint latency percentiles, cache hit/error counts and
+    estimated cost over the last `hours` (default 24, at most
+    AI_USAGE_MAX_HOURS).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            hours = min(max(int(request.query_params.get("hours", 24)), 1), USAGE_MAX_HOURS)
+        except ValueError:
+            return Response({"detail": "hours must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        flush_usage()
+        since = timezone.now() - timedelta(hours=hours)
+
+        return Response(
+            {
+                "hours": hours,
+                "endpoints": usage_summary(since),
+                "circuit_breaker": breaker.metrics(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 
 
 
@@ -5,6 +5,9 @@ class AppointmentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "appointments"
 
+    def ready(self):
+        import appointments.signals
+
 
 
 
@@ -0,0 +1,116 @@
+import logging
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from users.caching import invalidate_namespaces
+from doctors.models import DoctorProfile
+from .models import Appointment
+
+logger = logging.getLogger("appointments")
+
+# Backends whose INSERT supports ON CONFLICT DO NOTHING ... RETURNING
+ON_CONFLICT_VENDORS = ("postgresql", "sqlite")
+
+
+class SlotTaken(APIException):
+    """Another active appointment holds the doctor's or the patient's slot."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This time slot has just been booked, please pick another."
+    default_code = "slot_taken"
+
+
+def book_appointment(appointment):
+    """
+    Inserts a new appointment in a single statement that only writes
+    when neither the doctor nor the patient has an active appointment
+    overlapping [start, start + duration). Races are settled by the
+    database: SQLite runs the statement under its write lock, and on
+    PostgreSQL the range exclusion constraints (plus the unique
+    constraints on exact start times) reject all but one of any
+    concurrent bookings. Losers raise SlotTaken instead of an
+    IntegrityError.
+
+    The model's full_clean() is skipped on purpose; callers validate
+    the request (see CreateAppointmentSerializer) and the database
+    enforces the rest.
+    """
+    appointment.sync_range()
+    if connection.vendor in ON_CONFLICT_VENDORS:
+        inserted = _insert_on_conflict(appointment)
+    else:
+        inserted = _insert_in_savepoint(appointment)
+
+    if not inserted:
+        logger.info(
+            f"Booking conflict: doctor {appointment.doctor_id} on {appointment.date} at {appointment.time}"
+        )
+        raise _conflict(appointment)
+
+    # The raw INSERT sends no post_save signal
+    transaction.on_commit(lambda: invalidate_namespaces("appointments", "reports"))
+    return appointment
+
+
+def _insert_on_conflict(appointment) -> bool:
+    meta = Appointment._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    column = {name: quote(meta.get_field(name).column) for name in ("doctor", "patient", "date", "status", "start_minute", "end_minute")}
+
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    values = [field.get_db_prep_save(field.pre_save(appointment, True), connection) for field in fields]
+
+    overlap = (
+        f"SELECT 1 FROM {table} WHERE {{owner}} = %s AND {column['date']} = %s AND {column['status']} <> %s "
+        f"AND {column['start_minute']} < %s AND {column['end_minute']} > %s"
+    )
+    day = meta.get_field("date").get_db_prep_value(appointment.date, connection)
+    window = [Appointment.STATUS_CANCELLED, appointment.end_minute, appointment.start_minute]
+
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(field.column) for field in fields)}) "
+        f"SELECT {', '.join(['%s'] * len(fields))} "
+        f"WHERE NOT EXISTS ({overlap.format(owner=column['doctor'])}) "
+        f"AND NOT EXISTS ({overlap.format(owner=column['patient'])}) "
+        f"ON CONFLICT DO NOTHING RETURNING {quote(meta.pk.column)}"
+    )
+    params = [*values, appointment.doctor_id, day, *window, appointment.patient_id, day, *window]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+
+    if row is None:
+        return False
+    appointment.pk = row[0]
+    appointment._state.adding = False
+    appointment._state.db = connection.alias
+    return True
+
+
+def _insert_in_savepoint(appointment) -> bool:
+    try:
+        with transaction.atomic():
+            # No range constraint here: serialize bookings per doctor instead
+            DoctorProfile.objects.select_for_update().filter(pk=appointment.doctor_id).values_list("pk").first()
+            overlapping = Appointment.objects.overlapping(appointment.date, appointment.start_minute, appointment.end_minute)
+            if overlapping.filter(Q(doctor_id=appointment.doctor_id) | Q(patient_id=appointment.patient_id)).exists():
+                return False
+            appointment.save_base(force_insert=True)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _conflict(appointment):
+    # Only runs on the losing side of a race
+    own = (
+        Appointment.objects.overlapping(appointment.date, appointment.start_minute, appointment.end_minute)
+        .filter(patient_id=appointment.patient_id)
+        .exists()
+    )
+    if own:
+        return SlotTaken("You already have an appointment at this time.")
+    return SlotTaken()
@@ -0,0 +1,233 @@
+import logging
+from collections import defaultdict
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from doctors.models import DoctorProfile
+from doctors.slots import SLOT_MINUTES, SLOTS_PER_DAY, covering_bits, month_calendar
+from users.caching import invalidate_namespaces
+from .booking import SlotTaken
+from .models import Appointment
+from .serializers import UpdateAppointmentStatusSerializer
+
+logger = logging.getLogger("appointments")
+
+ALLOWED_TRANSITIONS = UpdateAppointmentStatusSerializer.ALLOWED_TRANSITIONS
+# Statuses patients hear about; the single-appointment endpoints notify the same ones
+NOTIFY_STATUSES = (Appointment.STATUS_CANCELLED,)
+
+ACTION_CANCEL = "cancel"
+ACTION_RESCHEDULE = "reschedule"
+RESCHEDULE_SEARCH_DAYS = getattr(settings, "APPOINTMENT_RESCHEDULE_SEARCH_DAYS", 14)
+
+
+class BulkTransitionError(APIException):
+    """Raised with every rejected id when a bulk change cannot apply to all of them; nothing is written."""
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = "invalid_transition"
+
+    def __init__(self, errors):
+        super().__init__()
+        # Kept as plain data so ids stay integers in the response
+        self.detail = {"detail": "Some appointments cannot be changed.", "errors": errors}
+
+
+def bulk_update_status(doctor_id, ids, new_status) -> dict:
+    """
+    Moves the doctor's appointments `ids` to `new_status`.
+
+    Current statuses are read in one query and checked against
+    ALLOWED_TRANSITIONS in memory; if any id is unknown or cannot make
+    the transition, nothing changes. Otherwise a single
+    UPDATE ... WHERE id IN (...) AND status IN (<allowed sources>)
+    applies them, so an appointment changed concurrently is skipped
+    rather than overwritten. Patient notifications go out as one
+    queued batch after commit.
+
+    Returns {"status", "updated", "skipped"}.
+    """
+    ids = list(dict.fromkeys(ids))
+    current = dict(Appointment.objects.filter(doctor_id=doctor_id, pk__in=ids).values_list("pk", "status"))
+
+    errors = []
+    for appointment_id in ids:
+        if appointment_id not in current:
+            errors.append({"id": appointment_id, "detail": "Appointment not found."})
+        elif new_status not in ALLOWED_TRANSITIONS.get(current[appointment_id], []):
+            errors.append({
+                "id": appointment_id,
+                "detail": f"Cannot change status from '{current[appointment_id]}' to '{new_status}'.",
+            })
+    if errors:
+        raise BulkTransitionError(errors)
+
+    sources = [source for source, targets in ALLOWED_TRANSITIONS.items() if new_status in targets]
+    with transaction.atomic():
+        updated = Appointment.objects.filter(doctor_id=doctor_id, pk__in=ids, status__in=sources).update(
+            status=new_status, updated_at=timezone.now()
+        )
+        skipped = []
+        if updated < len(ids):
+            # Lost a race with another change; report rather than overwrite
+            skipped = sorted(
+                Appointment.objects.filter(pk__in=ids).exclude(status=new_status).values_list("pk", flat=True)
+            )
+        changed = [appointment_id for appointment_id in ids if appointment_id not in skipped]
+
+        # update() sends no model signals
+        transaction.on_commit(lambda: invalidate_namespaces("appointments", "reports"))
+        if new_status in NOTIFY_STATUSES and changed:
+            transaction.on_commit(lambda: enqueue_status_notifications(changed, new_status))
+
+    logger.info(f"Doctor {doctor_id} moved {updated} appointments to '{new_status}' ({len(skipped)} skipped)")
+    return {"status": new_status, "updated": updated, "skipped": skipped}
+
+
+def enqueue_status_notifications(ids, new_status):
+    from .tasks import notify_status_changes_task
+
+    try:
+        notify_status_changes_task.delay(ids, new_status)
+    except Exception as e:
+        logger.error(f"Failed to queue notifications for {len(ids)} appointments: {e}")
+
+
+# -------------------------------------------------
+# Clearing a doctor's day
+# -------------------------------------------------
+def clear_doctor_day(doctor_id, day, action, first_day=None) -> dict:
+    """
+    Cancels, or moves to the doctor's next free times, every pending
+    or approved appointment the doctor has on `day`, in one
+    transaction. New times come from plan_reschedule(); appointments
+    with no free time within RESCHEDULE_SEARCH_DAYS are cancelled.
+    Patients are notified in one queued batch after commit.
+
+    Returns {"date", "action", "rescheduled", "cancelled"}.
+    """
+    try:
+        with transaction.atomic():
+            # Serializes with schedule edits and other day actions for this doctor
+            DoctorProfile.objects.select_for_update().filter(pk=doctor_id).values_list("pk").first()
+            appointments = list(
+                Appointment.objects.filter(
+                    doctor_id=doctor_id,
+                    date=day,
+                    status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_APPROVED],
+                ).order_by("time")
+            )
+
+            moves = {}
+            if action == ACTION_RESCHEDULE and appointments:
+                moves = plan_reschedule(doctor_id, appointments, first_day or day + timedelta(days=1))
+
+            now = timezone.now()
+            moved, previous = [], []
+            for appointment in appointments:
+                if appointment.pk not in moves:
+                    continue
+                previous.append([appointment.pk, appointment.date.isoformat(), appointment.time.isoformat()])
+                appointment.date, appointment.time = moves[appointment.pk]
+                # Linked slots are per weekday; the new time is checked against the calendar instead
+                appointment.availability = None
+                appointment.updated_at = now
+                appointment.sync_range()
+                moved.append(appointment)
+            cancelled = [appointment.pk for appointment in appointments if appointment.pk not in moves]
+
+            if moved:
+                Appointment.objects.bulk_update(
+                    moved, ["date", "time", "start_minute", "end_minute", "availability", "updated_at"]
+                )
+            if cancelled:
+                Appointment.objects.filter(pk__in=cancelled).update(status=Appointment.STATUS_CANCELLED, updated_at=now)
+
+            # bulk_update/update send no model signals
+            transaction.on_commit(lambda: invalidate_namespaces("appointments", "reports"))
+            if appointments:
+                transaction.on_commit(lambda: enqueue_day_notifications(cancelled, previous))
+    except IntegrityError:
+        # A booking took one of the planned times after they were computed
+        raise SlotTaken("A new booking took one of the planned times, please retry.")
+
+    logger.info(
+        f"Doctor {doctor_id} {action} on {day}: {len(moved)} rescheduled, {len(cancelled)} cancelled"
+    )
+    return {
+        "date": day,
+        "action": action,
+        "rescheduled": [
+            {"id": appointment.pk, "date": appointment.date, "time": appointment.time} for appointment in moved
+        ],
+        "cancelled": cancelled,
+    }
+
+
+def plan_reschedule(doctor_id, appointments, first_day) -> dict:
+    """
+    {appointment_id: (date, time)} for as many of `appointments` as fit,
+    computed in memory: the doctor's calendar bits for each candidate
+    day, minus the doctor's and each patient's other active appointments
+    (loaded in one query). Each appointment, in time order, takes its
+    original start time on the earliest day that has it free, otherwise
+    the earliest free time that day.
+    """
+    days = [first_day + timedelta(days=offset) for offset in range(RESCHEDULE_SEARCH_DAYS)]
+    calendars = {(d.year, d.month): None for d in days}
+    for year, month in calendars:
+        calendars[year, month] = month_calendar(doctor_id, year, month)
+    free = {d: calendars[d.year, d.month][d.day - 1] for d in days}
+
+    patient_ids = {appointment.patient_id for appointment in appointments}
+    busy = defaultdict(int)
+    taken = (
+        Appointment.objects.active()
+        .filter(date__range=(days[0], days[-1]))
+        .filter(Q(doctor_id=doctor_id) | Q(patient_id__in=patient_ids))
+        .exclude(pk__in=[appointment.pk for appointment in appointments])
+        .values_list("doctor_id", "patient_id", "date", "start_minute", "end_minute")
+    )
+    for other_doctor_id, patient_id, d, start_minute, end_minute in taken:
+        bits = covering_bits(start_minute, end_minute)
+        if other_doctor_id == doctor_id:
+            free[d] &= ~bits
+        if patient_id in patient_ids:
+            busy[patient_id, d] |= bits
+
+    moves = {}
+    for appointment in appointments:
+        for d in days:
+            start_minute = _first_fit(
+                free[d] & ~busy[appointment.patient_id, d], appointment.start_minute, appointment.duration_minutes
+            )
+            if start_minute is None:
+                continue
+            bits = covering_bits(start_minute, start_minute + appointment.duration_minutes)
+            free[d] &= ~bits
+            busy[appointment.patient_id, d] |= bits
+            moves[appointment.pk] = (d, time(start_minute // 60, start_minute % 60))
+            break
+    return moves
+
+
+def _first_fit(open_bits, preferred_minute, minutes):
+    for start_minute in (preferred_minute, *(index * SLOT_MINUTES for index in range(SLOTS_PER_DAY))):
+        needed = covering_bits(start_minute, start_minute + minutes)
+        if start_minute + minutes <= 24 * 60 and open_bits & needed == needed:
+            return start_minute
+    return None
+
+
+def enqueue_day_notifications(cancelled_ids, moves):
+    from .tasks import notify_day_changes_task
+
+    try:
+        notify_day_changes_task.delay(cancelled_ids, moves)
+    except Exception as e:
+        logger.error(f"Failed to queue notifications for {len(cancelled_ids) + len(moves)} appointments: {e}")
@@ -0,0 +1,255 @@
+import logging
+import secrets
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from doctors.models import DoctorProfile
+from doctors.slots import SLOT_MINUTES
+from .models import SlotHold
+
+logger = logging.getLogger("appointments")
+
+HOLD_MINUTES = getattr(settings, "SLOT_HOLD_MINUTES", 5)
+STAT_KINDS = ("placed", "converted", "released", "contended", "blocked")
+
+
+class SlotHeld(APIException):
+    """Another patient holds part of the requested time."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This time slot is being held by another patient, please pick another."
+    default_code = "slot_held"
+
+
+# -------------------------------------------------
+# Slot holds
+#
+# A hold reserves a doctor's time for one patient for HOLD_MINUTES while
+# they fill in the booking form. Every SLOT_MINUTES slot the visit
+# touches gets its own cache key, claimed with cache.add(), so two holds
+# overlap exactly when they share a key and the cache's own expiry ends
+# forgotten holds. While the cache is unreachable, holds fall back to
+# SlotHold rows. Holds are advisory: the booking insert
+# (appointments.booking) still decides conflicts.
+# -------------------------------------------------
+def _slot_key(doctor_id, day, index) -> str:
+    return f"hold:{doctor_id}:{day.isoformat()}:{index}"
+
+
+def _token_key(token) -> str:
+    return f"hold:token:{token}"
+
+
+def _slot_keys(doctor_id, day, start_minute, end_minute) -> list:
+    first, last = start_minute // SLOT_MINUTES, -(-end_minute // SLOT_MINUTES)
+    return [_slot_key(doctor_id, day, index) for index in range(first, last)]
+
+
+def visit_window(doctor, day, at) -> tuple:
+    """(doctor_id, day, start_minute, end_minute) of a visit with the doctor starting at `at`."""
+    start_minute = at.hour * 60 + at.minute
+    return doctor.id, day, start_minute, start_minute + doctor.visit_minutes
+
+
+def place_hold(doctor_id, day, start_minute, end_minute, patient_id) -> dict:
+    """
+    Holds [start_minute, end_minute) on `day` for the patient and returns
+    {"token", "expires_at"}. A patient's new hold replaces their own
+    overlapping ones; a hold by anyone else raises SlotHeld.
+    """
+    expires_at = timezone.now() + timedelta(minutes=HOLD_MINUTES)
+    hold = {
+        "token": secrets.token_hex(16),
+        "doctor_id": doctor_id,
+        "date": day.isoformat(),
+        "start_minute": start_minute,
+        "end_minute": end_minute,
+        "patient_id": patient_id,
+    }
+    try:
+        placed = _cache_place(hold)
+    except Exception as e:
+        logger.warning(f"Hold cache unavailable, using the database: {e}")
+        placed = _db_place(hold, expires_at)
+    if not placed:
+        record("contended")
+        raise SlotHeld()
+
+    record("placed")
+    return {"token": hold["token"], "expires_at": expires_at}
+
+
+def claim_slot(doctor_id, day, start_minute, end_minute, patient_id) -> bool:
+    """
+    Called before booking: raises SlotHeld when another patient holds
+    any of the time, and returns whether the patient held it themselves.
+    """
+    try:
+        holders = _cache_holders(doctor_id, day, start_minute, end_minute)
+    except Exception as e:
+        logger.warning(f"Hold cache unavailable, using the database: {e}")
+        holders = _db_holders(doctor_id, day, start_minute, end_minute)
+
+    if any(holder != patient_id for holder in holders):
+        record("blocked")
+        raise SlotHeld()
+    return bool(holders)
+
+
+def convert_hold(doctor_id, day, start_minute, end_minute, patient_id):
+    """Frees the patient's hold on a time they have just booked."""
+    try:
+        _cache_release_slots(_slot_keys(doctor_id, day, start_minute, end_minute), patient_id)
+    except Exception as e:
+        logger.warning(f"Hold cache unavailable, using the database: {e}")
+        _db_overlapping(doctor_id, day, start_minute, end_minute).filter(patient_id=patient_id).delete()
+    record("converted")
+
+
+def release_hold(token, patient_id):
+    """Gives up a hold before it expires; unknown or foreign tokens raise NotFound."""
+    try:
+        hold = cache.get(_token_key(token))
+    except Exception as e:
+        logger.warning(f"Hold cache unavailable, using the database: {e}")
+        hold = None
+
+    if hold is not None and hold["patient_id"] == patient_id:
+        day = date.fromisoformat(hold["date"])
+        _cache_release_slots(_slot_keys(hold["doctor_id"], day, hold["start_minute"], hold["end_minute"]), patient_id)
+        cache.delete(_token_key(token))
+    elif not SlotHold.objects.filter(token=token, patient_id=patient_id).delete()[0]:
+        raise NotFound("Hold not found.")
+    record("released")
+
+
+# -------------------------------------------------
+# Cache store
+# -------------------------------------------------
+def _cache_place(hold) -> bool:
+    day = date.fromisoformat(hold["date"])
+    keys = _slot_keys(hold["doctor_id"], day, hold["start_minute"], hold["end_minute"])
+    value = (hold["patient_id"], hold["token"])
+    timeout = HOLD_MINUTES * 60
+
+    added, moved = [], {}
+    for key in keys:
+        claimed, previous = _cache_claim(key, value, timeout)
+        if not claimed:
+            # Undo only what this call claimed; the patient's older holds stay
+            cache.delete_many(added)
+            if moved:
+                cache.set_many(moved, timeout)
+            return False
+        if previous is None:
+            added.append(key)
+        else:
+            moved[key] = previous
+
+    cache.set(_token_key(hold["token"]), hold, timeout)
+    return True
+
+
+def _cache_claim(key, value, timeout, attempts=3) -> tuple:
+    """
+    Takes one slot key for the patient in `value` and returns (claimed,
+    previous), `previous` being the patient's own earlier hold that the
+    key was moved from, if any. A key that expired between add() and
+    get() is claimed again with add(), never set(), so another patient's
+    hold made in that gap is not overwritten.
+    """
+    for _ in range(attempts):
+        if cache.add(key, value, timeout):
+            return True, None
+        current = cache.get(key)
+        if current is None:
+            continue
+        if current[0] != value[0]:
+            return False, None
+        # The patient's own earlier hold: move it to the new token
+        cache.set(key, value, timeout)
+        return True, current
+    return False, None
+
+
+def _cache_holders(doctor_id, day, start_minute, end_minute) -> set:
+    values = cache.get_many(_slot_keys(doctor_id, day, start_minute, end_minute))
+    return {patient_id for patient_id, _ in values.values()}
+
+
+def _cache_release_slots(keys, patient_id):
+    values = cache.get_many(keys)
+    cache.delete_many([key for key, (holder, _) in values.items() if holder == patient_id])
+
+
+# -------------------------------------------------
+# Database fallback
+# -------------------------------------------------
+def _db_overlapping(doctor_id, day, start_minute, end_minute):
+    return SlotHold.objects.filter(
+        doctor_id=doctor_id,
+        date=day,
+        start_minute__lt=end_minute,
+        end_minute__gt=start_minute,
+        expires_at__gt=timezone.now(),
+    )
+
+
+def _db_place(hold, expires_at) -> bool:
+    day = date.fromisoformat(hold["date"])
+    with transaction.atomic():
+        # Serializes holds on the same doctor, like schedule edits
+        DoctorProfile.objects.select_for_update().filter(pk=hold["doctor_id"]).values_list("pk").first()
+        SlotHold.objects.filter(expires_at__lte=timezone.now()).delete()
+
+        overlapping = _db_overlapping(hold["doctor_id"], day, hold["start_minute"], hold["end_minute"])
+        if overlapping.exclude(patient_id=hold["patient_id"]).exists():
+            return False
+        overlapping.delete()
+        SlotHold.objects.create(
+            token=hold["token"],
+            doctor_id=hold["doctor_id"],
+            patient_id=hold["patient_id"],
+            date=day,
+            start_minute=hold["start_minute"],
+            end_minute=hold["end_minute"],
+            expires_at=expires_at,
+        )
+    return True
+
+
+def _db_holders(doctor_id, day, start_minute, end_minute) -> set:
+    return set(_db_overlapping(doctor_id, day, start_minute, end_minute).values_list("patient_id", flat=True))
+
+
+# -------------------------------------------------
+# Metrics
+# -------------------------------------------------
+def _stat_key(kind) -> str:
+    return f"hold:stats:{kind}"
+
+
+def record(kind):
+    try:
+        cache.add(_stat_key(kind), 0, None)
+        cache.incr(_stat_key(kind))
+    except Exception:
+        # Metrics never fail a booking
+        pass
+
+
+def hold_stats() -> dict:
+    """Hold counters across all workers, with the share of holds that ended in a booking."""
+    totals = cache.get_many([_stat_key(kind) for kind in STAT_KINDS])
+    stats = {kind: totals.get(_stat_key(kind), 0) for kind in STAT_KINDS}
+    stats["conversion_rate"] = round(stats["converted"] / stats["placed"], 4) if stats["placed"] else None
+    return stats
+
+
+def reset_hold_stats():
+    cache.delete_many([_stat_key(kind) for kind in STAT_KINDS])
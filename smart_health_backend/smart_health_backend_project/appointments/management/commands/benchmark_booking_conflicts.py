@@ -0,0 +1,115 @@
+import random
+import time
+from datetime import date, time as dtime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ai.usage import percentile
+from appointments.models import Appointment
+from doctors.models import Availability, DoctorProfile
+from doctors.slots import free_slots
+from patients.models import PatientProfile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Times booking conflict checks for one busy doctor: the exact start-time "
+        "lookup against the overlap query on the range index, plus free_slots(). "
+        "All rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--per-day", type=int, default=24)
+        parser.add_argument("--patients", type=int, default=500)
+        parser.add_argument("--queries", type=int, default=500)
+
+    def handle(self, *args, **options):
+        queries = options["queries"]
+
+        with transaction.atomic():
+            doctor, days = self._seed(options["days"], options["per_day"], options["patients"])
+
+            probes = []
+            for _ in range(queries):
+                day = random.choice(days)
+                start_minute = 8 * 60 + random.randrange(0, 10 * 60, 5)
+                probes.append((day, start_minute, start_minute + doctor.visit_minutes))
+
+            exact = self._time(
+                lambda day, start, end: Appointment.objects.active()
+                .filter(doctor=doctor, date=day, time=dtime(start // 60, start % 60))
+                .exists(),
+                probes,
+            )
+            overlap = self._time(
+                lambda day, start, end: Appointment.objects.overlapping(day, start, end).filter(doctor=doctor).exists(),
+                probes,
+            )
+            slots = self._time(lambda day, start, end: free_slots([doctor.pk], day), probes)
+
+            total = Appointment.objects.filter(doctor=doctor).count()
+            self.stdout.write(f"Appointments: {total} over {len(days)} days, queries: {queries}")
+            for label, timings in (
+                ("exact start lookup", exact),
+                ("overlap (range idx)", overlap),
+                ("free_slots", slots),
+            ):
+                self.stdout.write(
+                    f"{label:<20}: p50 {percentile(timings, 50) * 1000:.2f} ms, "
+                    f"p99 {percentile(timings, 99) * 1000:.2f} ms"
+                )
+
+            transaction.set_rollback(True)
+
+    def _seed(self, total_days, per_day, total_patients):
+        run_id = int(time.time())
+        doctor_user = User.objects.create(
+            username=f"bench_busy_doc_{run_id}", email=f"bench_busy_doc_{run_id}@example.com", role=User.ROLE_DOCTOR
+        )
+        doctor, _ = DoctorProfile.objects.get_or_create(user=doctor_user)
+        week = [Availability(doctor=doctor, day_of_week=day, start_time=dtime(8), end_time=dtime(18)) for day in Availability.WEEKDAYS]
+        for slot in week:
+            slot.sync_compact()
+        Availability.objects.bulk_create(week)
+
+        users = User.objects.bulk_create([
+            User(
+                username=f"bench_patient_{run_id}_{i}",
+                email=f"bench_patient_{run_id}_{i}@example.com",
+                password="!",
+                role=User.ROLE_PATIENT,
+            )
+            for i in range(total_patients)
+        ])
+        patients = PatientProfile.objects.bulk_create([PatientProfile(user=user) for user in users])
+
+        first = date.today() + timedelta(days=1)
+        days = [first + timedelta(days=offset) for offset in range(total_days)]
+        step = max(10 * 60 // per_day, doctor.visit_minutes)
+        appointments = []
+        for day in days:
+            for start_minute in range(8 * 60, 18 * 60 - doctor.visit_minutes + 1, step)[:per_day]:
+                appointment = Appointment(
+                    doctor=doctor,
+                    patient=random.choice(patients),
+                    date=day,
+                    time=dtime(start_minute // 60, start_minute % 60),
+                    duration_minutes=doctor.visit_minutes,
+                )
+                appointment.sync_range()
+                appointments.append(appointment)
+        Appointment.objects.bulk_create(appointments, batch_size=5000)
+        return doctor, days
+
+    def _time(self, check, probes):
+        timings = []
+        for probe in probes:
+            started = time.perf_counter()
+            check(*probe)
+            timings.append(time.perf_counter() - started)
+        return sorted(timings)
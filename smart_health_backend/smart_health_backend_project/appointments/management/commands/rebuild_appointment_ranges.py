@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from appointments.models import Appointment
+from users.caching import invalidate_namespaces
+
+RANGE_FIELDS = ["start_minute", "end_minute"]
+
+
+class Command(BaseCommand):
+    help = "Recomputes Appointment.start_minute/end_minute (run once after adding the columns)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        batch, updated = [], 0
+
+        for appointment in Appointment.objects.only("id", "time", "duration_minutes", *RANGE_FIELDS).iterator(
+            chunk_size=batch_size
+        ):
+            before = [getattr(appointment, field) for field in RANGE_FIELDS]
+            appointment.sync_range()
+            if [getattr(appointment, field) for field in RANGE_FIELDS] == before:
+                continue
+            batch.append(appointment)
+
+            if len(batch) >= batch_size:
+                Appointment.objects.bulk_update(batch, RANGE_FIELDS)
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            Appointment.objects.bulk_update(batch, RANGE_FIELDS)
+            updated += len(batch)
+
+        # Cached free slots were built from the old values
+        invalidate_namespaces("appointments")
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} appointments."))
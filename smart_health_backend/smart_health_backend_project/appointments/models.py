@@ -1,10 +1,41 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from patients.models import PatientProfile
-from doctors.models import DoctorProfile, Availability
+from doctors.models import DEFAULT_VISIT_MINUTES, DoctorProfile, Availability
+
+
+
+def range_exclusion_constraints():
+    """
+    PostgreSQL-only: no two active appointments of one doctor (or one
+    patient) may overlap in time. Kept out of Appointment.Meta so the
+    model state is the same on every backend; appointments.signals adds
+    them after migrate, along with the btree_gist extension they need.
+    """
+    from django.contrib.postgres.constraints import ExclusionConstraint
+    from django.contrib.postgres.fields import RangeOperators
+
+    minutes = models.Func(models.F("start_minute"), models.F("end_minute"), function="int4range")
+    return [
+        ExclusionConstraint(
+            name=f"appointment_{owner}_no_overlap",
+            expressions=[(owner, RangeOperators.EQUAL), ("date", RangeOperators.EQUAL), (minutes, RangeOperators.OVERLAPS)],
+            condition=~models.Q(status="cancelled"),
+        )
+        for owner in ("doctor", "patient")
+    ]
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def active(self):
+        return self.exclude(status=Appointment.STATUS_CANCELLED)
+
+    def overlapping(self, day, start_minute, end_minute):
+        """Active appointments on `day` intersecting [start_minute, end_minute)."""
+        return self.active().filter(date=day, start_minute__lt=end_minute, end_minute__gt=start_minute)
 
 
 class Appointment(models.Model):
@@ -42,6 +73,11 @@ class Appointment(models.Model):
 
     date = models.DateField()
     time = models.TimeField()
+    duration_minutes = models.PositiveSmallIntegerField(default=DEFAULT_VISIT_MINUTES)
+    # [start_minute, end_minute) on `date`, derived by save(); overlap
+    # checks compare these instead of exact start times
+    start_minute = models.PositiveSmallIntegerField(default=0, editable=False)
+    end_minute = models.PositiveSmallIntegerField(default=0, editable=False)
     reason_for_visit = models.TextField(blank=True)
 
     status = models.CharField(
@@ -53,15 +89,29 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
-        unique_together = (
-            ("doctor", "date", "time"),
-            ("patient", "date", "time"),
-        )
+        # Races between bookings are settled by these, not by queries
+        # beforehand (see appointments.booking). Cancelled appointments
+        # free their slot.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["doctor", "date", "time"],
+                condition=~models.Q(status="cancelled"),
+                name="appointment_doctor_slot_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["patient", "date", "time"],
+                condition=~models.Q(status="cancelled"),
+                name="appointment_patient_slot_uniq",
+            ),
+        ]
         indexes = [
             models.Index(fields=["doctor", "date", "time"]),
             models.Index(fields=["patient", "date", "time"]),
+            models.Index(fields=["doctor", "date", "start_minute", "end_minute"], name="appointment_doctor_range_idx"),
         ]
 
     def __str__(self):
@@ -78,25 +128,23 @@ class Appointment(models.Model):
         if appointment_dt < timezone.now() and self.status != self.STATUS_COMPLETED:
             raise ValidationError("Cannot schedule an appointment in the past.")
 
-        if Appointment.objects.filter(
-            doctor=self.doctor,
-            date=self.date,
-            time=self.time
-        ).exclude(pk=self.pk).exists():
+        self.sync_range()
+        if self.end_minute > 24 * 60:
+            raise ValidationError("Appointment must end on the same day.")
+
+        overlapping = Appointment.objects.overlapping(self.date, self.start_minute, self.end_minute).exclude(pk=self.pk)
+
+        if overlapping.filter(doctor=self.doctor).exists():
             raise ValidationError("Doctor already has an appointment at this time.")
 
-        if Appointment.objects.filter(
-            patient=self.patient,
-            date=self.date,
-            time=self.time
-        ).exclude(pk=self.pk).exists():
+        if overlapping.filter(patient=self.patient).exists():
             raise ValidationError("You already have an appointment at this time.")
 
         if self.availability:
             if self.availability.doctor != self.doctor:
                 raise ValidationError("Availability does not belong to this doctor.")
 
-            if self.availability.day_of_week != self.date.strftime("%A"):
+            if self.availability.weekday != self.date.weekday():
                 raise ValidationError("Availability does not match appointment date.")
 
             if not (
@@ -104,11 +152,47 @@ class Appointment(models.Model):
             ):
                 raise ValidationError("Time is outside availability window.")
 
+    @property
+    def end_time(self):
+        return (datetime.combine(self.date, self.time) + timedelta(minutes=self.duration_minutes)).time()
+
+    def sync_range(self):
+        """Derives start_minute/end_minute; raw and bulk inserts must call this themselves."""
+        start = self._meta.get_field("time").to_python(self.time)
+        self.start_minute = start.hour * 60 + start.minute
+        self.end_minute = self.start_minute + self.duration_minutes
+
     def save(self, *args, **kwargs):
         self.full_clean()
+        self.sync_range()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"time", "duration_minutes"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "start_minute", "end_minute"}
         super().save(*args, **kwargs)
 
 
+class SlotHold(models.Model):
+    """
+    Database copy of a slot hold, used only while the cache is
+    unavailable (see appointments.holds). Rows past expires_at are
+    ignored and deleted by the next hold.
+    """
+    token = models.CharField(max_length=32, unique=True)
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name="slot_holds")
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name="slot_holds")
+    date = models.DateField()
+    start_minute = models.PositiveSmallIntegerField()
+    end_minute = models.PositiveSmallIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["doctor", "date", "expires_at"])]
+
+    def __str__(self):
+        return f"Hold {self.token} on doctor {self.doctor_id} {self.date} until {self.expires_at}"
+
+
 
 
 
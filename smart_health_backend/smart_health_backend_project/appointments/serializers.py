@@ -1,9 +1,15 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.utils import timezone
 from datetime import datetime
 
+from .booking import book_appointment
 from .models import Appointment
-from doctors.models import Availability
+from doctors.models import Availability, DoctorProfile
+from doctors.slots import doctor_is_available
+from users.profiles import get_profile_id
+
+BULK_MAX_APPOINTMENTS = getattr(settings, "APPOINTMENT_BULK_MAX", 200)
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -22,12 +28,15 @@ class AppointmentSerializer(serializers.ModelSerializer):
             "doctor", "doctor_name",
             "availability",
             "date", "time",
+            "duration_minutes", "end_time",
             "reason_for_visit",
             "status",
             "created_at", "updated_at",
         ]
         read_only_fields = [
             "id",
+            "duration_minutes",
+            "end_time",
             "patient",
             "patient_name",
             "doctor_name",
@@ -45,12 +54,12 @@ class CreateAppointmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = ["doctor", "availability", "date", "time", "reason_for_visit"]
+        # Slot uniqueness is enforced by the insert itself (appointments.booking)
+        validators = []
 
     def validate(self, data):
         request = self.context.get("request")
-        patient = getattr(request.user, "patient_profile", None)
-
-        if not patient:
+        if not get_profile_id(request, "patient"):
             raise serializers.ValidationError("Patient profile not found.")
 
         appointment_dt = datetime.combine(data["date"], data["time"])
@@ -61,6 +70,7 @@ class CreateAppointmentSerializer(serializers.ModelSerializer):
 
         doctor = data["doctor"]
         availability = data.get("availability")
+        minutes = doctor.visit_minutes
 
         if availability:
             if availability.doctor != doctor:
@@ -68,7 +78,7 @@ class CreateAppointmentSerializer(serializers.ModelSerializer):
                     "Selected availability does not belong to this doctor."
                 )
 
-            if availability.day_of_week != data["date"].strftime("%A"):
+            if availability.weekday != data["date"].weekday():
                 raise serializers.ValidationError(
                     "Availability does not match appointment date."
                 )
@@ -79,20 +89,31 @@ class CreateAppointmentSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     "Appointment time is outside availability range."
                 )
-        else:
-            day = data["date"].strftime("%A")
-            if not Availability.objects.filter(
-                doctor=doctor,
-                day_of_week=day,
-                start_time__lte=data["time"],
-                end_time__gt=data["time"]
-            ).exists():
+
+            if not doctor_is_available(doctor.id, data["date"], data["time"], minutes):
                 raise serializers.ValidationError(
-                    "Doctor is not available at this time."
+                    "Doctor is not available on this date."
                 )
+        elif not doctor_is_available(doctor.id, data["date"], data["time"], minutes):
+            raise serializers.ValidationError(
+                "Doctor is not available at this time."
+            )
 
         return data
 
+    def create(self, validated_data):
+        # The visit length is the doctor's, not the patient's choice
+        validated_data["duration_minutes"] = validated_data["doctor"].visit_minutes
+        return book_appointment(Appointment(**validated_data))
+
+
+class SlotHoldSerializer(CreateAppointmentSerializer):
+    """Same checks as booking, for the time a patient wants to hold."""
+    availability = None
+
+    class Meta(CreateAppointmentSerializer.Meta):
+        fields = ["doctor", "date", "time"]
+
 
 class UpdateAppointmentStatusSerializer(serializers.ModelSerializer):
     class Meta:
@@ -121,6 +142,34 @@ class UpdateAppointmentStatusSerializer(serializers.ModelSerializer):
         return value
 
 
+class BulkStatusUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), min_length=1, max_length=BULK_MAX_APPOINTMENTS
+    )
+    status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES)
+
+
+class DoctorDayActionSerializer(serializers.Serializer):
+    ACTIONS = ("cancel", "reschedule")
+
+    doctor = serializers.PrimaryKeyRelatedField(queryset=DoctorProfile.objects.all(), required=False)
+    date = serializers.DateField()
+    action = serializers.ChoiceField(choices=ACTIONS)
+    reschedule_from = serializers.DateField(required=False)
+
+    def validate(self, data):
+        today = timezone.localdate()
+        if data["date"] < today:
+            raise serializers.ValidationError("Cannot change a day in the past.")
+
+        first_day = data.get("reschedule_from")
+        if first_day is not None and (first_day <= today or first_day == data["date"]):
+            raise serializers.ValidationError(
+                "reschedule_from must be a later day than today and differ from the cleared date."
+            )
+        return data
+
+
 
 
 
@@ -0,0 +1,37 @@
+from django.db import connections
+from django.db.models.signals import post_migrate, pre_migrate
+from django.dispatch import receiver
+
+from .models import range_exclusion_constraints
+
+
+# The range exclusion constraints (appointments.models) compare the
+# doctor/patient and date columns with "=" inside a GiST index, which
+# needs btree_gist. Created before any migration can add them.
+@receiver(pre_migrate)
+def create_btree_gist(sender, using, **kwargs):
+    connection = connections[using]
+    if connection.vendor != "postgresql" or sender.name != "appointments":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+
+# PostgreSQL-only, so they are not part of the model state that
+# migrations are generated from; added here once the table exists.
+@receiver(post_migrate)
+def add_range_exclusion_constraints(sender, using, **kwargs):
+    connection = connections[using]
+    if connection.vendor != "postgresql" or sender.name != "appointments":
+        return
+    model = sender.get_model("Appointment")
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return
+        existing = connection.introspection.get_constraints(cursor, table)
+
+    with connection.schema_editor() as editor:
+        for constraint in range_exclusion_constraints():
+            if constraint.name not in existing:
+                editor.add_constraint(model, constraint)
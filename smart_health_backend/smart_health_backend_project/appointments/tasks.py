@@ -0,0 +1,51 @@
+from celery import shared_task
+from datetime import date, time
+from itertools import groupby
+import logging
+
+from notifications.utils import notify_schedule_changes
+from .models import Appointment
+from .utils import notify_appointment_cancelled
+
+logger = logging.getLogger("appointments")
+
+
+@shared_task(bind=True)
+def notify_status_changes_task(self, appointment_ids, status):
+    """One task per bulk change; patients are loaded together and notified in turn."""
+    appointments = Appointment.objects.filter(pk__in=appointment_ids, status=status).select_related("patient__user")
+
+    sent = 0
+    for appointment in appointments:
+        if status == Appointment.STATUS_CANCELLED:
+            sent += bool(notify_appointment_cancelled(patient=appointment.patient, appointment=appointment))
+    logger.info(f"Sent {sent} of {len(appointment_ids)} '{status}' notifications")
+
+
+@shared_task(bind=True)
+def notify_day_changes_task(self, cancelled_ids, moves):
+    """
+    One task per cleared doctor day. `moves` holds [id, old date, old
+    time] for rescheduled appointments; each patient gets a single
+    message covering all of their changes.
+    """
+    previous = {pk: (date.fromisoformat(old_date), time.fromisoformat(old_time)) for pk, old_date, old_time in moves}
+    appointments = (
+        Appointment.objects.filter(pk__in=[*cancelled_ids, *previous])
+        .select_related("patient__user", "doctor__user")
+        .order_by("patient_id", "date", "time")
+    )
+
+    patients = 0
+    for _, group in groupby(appointments, key=lambda appointment: appointment.patient_id):
+        group = list(group)
+        notify_schedule_changes(
+            patient=group[0].patient,
+            doctor=group[0].doctor,
+            cancelled=[appointment for appointment in group if appointment.pk not in previous],
+            rescheduled=[(*previous[appointment.pk], appointment) for appointment in group if appointment.pk in previous],
+        )
+        patients += 1
+    logger.info(
+        f"Notified {patients} patients of {len(previous)} rescheduled and {len(cancelled_ids)} cancelled appointments"
+    )
@@ -0,0 +1,462 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from doctors.models import Availability
+from appointments.booking import book_appointment
+from appointments.holds import SlotHeld, place_hold
+from appointments.models import Appointment, SlotHold
+
+
+class BookingConflictTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        doctor_user = User.objects.create_user(
+            username="race_doc", email="race_doc@example.com", password="test1234", role="doctor"
+        )
+        self.doctor = doctor_user.doctor_profile
+        self.day = timezone.localdate() + timedelta(days=3)
+        Availability.objects.create(
+            doctor=self.doctor, day_of_week=self.day.strftime("%A"), start_time=time(9), end_time=time(12)
+        )
+        self.patients = [
+            User.objects.create_user(
+                username=f"race_pat{i}", email=f"race_pat{i}@example.com", password="test1234", role="patient"
+            )
+            for i in range(2)
+        ]
+        self.payload = {"doctor": self.doctor.id, "date": str(self.day), "time": "10:00"}
+
+    def _book(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(reverse("patient-create"), self.payload, format="json")
+
+    @patch("appointments.views.notify_appointment_booked")
+    def test_taken_slot_is_a_409_and_cancelling_frees_it(self, mock_notify):
+        first = self._book(self.patients[0])
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        second = self._book(self.patients[1])
+        self.assertEqual(second.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(second.data["detail"].code, "slot_taken")
+        self.assertEqual(mock_notify.call_count, 1)
+
+        Appointment.objects.filter(doctor=self.doctor).update(status=Appointment.STATUS_CANCELLED)
+        self.assertEqual(self._book(self.patients[1]).status_code, status.HTTP_201_CREATED)
+
+    @patch("appointments.views.notify_appointment_booked")
+    def test_booking_is_a_single_insert(self, mock_notify):
+        appointment = Appointment(
+            patient=self.patients[0].patient_profile, doctor=self.doctor, date=self.day, time=time(10)
+        )
+        with self.assertNumQueries(1):
+            book_appointment(appointment)
+        self.assertIsNotNone(appointment.pk)
+        self.assertTrue(Appointment.objects.filter(pk=appointment.pk).exists())
+
+    @patch("appointments.views.notify_appointment_booked")
+    def test_overlapping_start_times_conflict(self, mock_notify):
+        self.assertEqual(self._book(self.patients[0]).status_code, status.HTTP_201_CREATED)
+        booked = Appointment.objects.get(doctor=self.doctor)
+        self.assertEqual((booked.duration_minutes, booked.end_time), (30, time(10, 30)))
+
+        self.payload["time"] = "10:15"
+        self.assertEqual(self._book(self.patients[1]).status_code, status.HTTP_409_CONFLICT)
+
+        self.payload["time"] = "10:30"
+        self.assertEqual(self._book(self.patients[1]).status_code, status.HTTP_201_CREATED)
+
+    @patch("appointments.views.notify_appointment_booked")
+    def test_visit_must_fit_and_uses_doctor_length(self, mock_notify):
+        self.doctor.visit_minutes = 45
+        self.doctor.save()
+
+        self.payload["time"] = "11:30"
+        self.assertEqual(self._book(self.patients[0]).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.payload["time"] = "11:15"
+        response = self._book(self.patients[0])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Appointment.objects.get(doctor=self.doctor).end_minute, 12 * 60)
+
+    def test_free_slots_clear_the_whole_visit(self):
+        from doctors.slots import free_slots
+
+        Appointment.objects.create(
+            patient=self.patients[0].patient_profile, doctor=self.doctor, date=self.day, time=time(10), duration_minutes=40
+        )
+        open_slots = free_slots([self.doctor.id], self.day)[self.doctor.id]
+        self.assertIn(time(9, 45), open_slots)
+        for taken in (time(10), time(10, 15), time(10, 30)):
+            self.assertNotIn(taken, open_slots)
+        self.assertIn(time(10, 45), open_slots)
+
+
+class SlotHoldTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        doctor_user = User.objects.create_user(
+            username="hold_doc", email="hold_doc@example.com", password="test1234", role="doctor"
+        )
+        self.doctor = doctor_user.doctor_profile
+        self.day = timezone.localdate() + timedelta(days=3)
+        Availability.objects.create(
+            doctor=self.doctor, day_of_week=self.day.strftime("%A"), start_time=time(9), end_time=time(12)
+        )
+        self.clients = []
+        for i in range(2):
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user(
+                username=f"hold_pat{i}", email=f"hold_pat{i}@example.com", password="test1234", role="patient"
+            ))
+            self.clients.append(client)
+
+    def _post(self, client, name, at):
+        payload = {"doctor": self.doctor.id, "date": str(self.day), "time": at}
+        return client.post(reverse(name), payload, format="json")
+
+    @patch("appointments.views.notify_appointment_booked")
+    def test_hold_blocks_others_until_converted(self, mock_notify):
+        first, second = self.clients
+        hold = self._post(first, "patient-hold", "10:00")
+        self.assertEqual(hold.status_code, status.HTTP_201_CREATED)
+        self.assertIn("token", hold.data)
+
+        # 10:15 overlaps the held 30-minute visit
+        self.assertEqual(self._post(second, "patient-hold", "10:15").status_code, status.HTTP_409_CONFLICT)
+        blocked = self._post(second, "patient-create", "10:00")
+        self.assertEqual(blocked.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(blocked.data["detail"].code, "slot_held")
+
+        self.assertEqual(self._post(first, "patient-create", "10:00").status_code, status.HTTP_201_CREATED)
+
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_superuser(
+            username="hold_admin", email="hold_admin@example.com", password="test1234"
+        ))
+        stats = admin.get(reverse("hold-stats")).data
+        self.assertEqual(
+            {kind: stats[kind] for kind in ("placed", "converted", "contended", "blocked")},
+            {"placed": 1, "converted": 1, "contended": 1, "blocked": 1},
+        )
+        self.assertEqual(stats["conversion_rate"], 1.0)
+
+    def test_failed_overlapping_hold_keeps_the_earlier_one(self):
+        first, second = self.clients
+        self.assertEqual(self._post(first, "patient-hold", "10:00").status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._post(second, "patient-hold", "10:30").status_code, status.HTTP_201_CREATED)
+
+        # Moves first's 10:15 key, then fails on second's 10:30
+        self.assertEqual(self._post(first, "patient-hold", "10:15").status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self._post(second, "patient-hold", "10:15").status_code, status.HTTP_409_CONFLICT)
+
+    def test_release_frees_the_slot_for_its_owner_only(self):
+        first, second = self.clients
+        token = self._post(first, "patient-hold", "10:00").data["token"]
+
+        url = reverse("patient-hold-release", args=[token])
+        self.assertEqual(second.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(first.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._post(second, "patient-hold", "10:00").status_code, status.HTTP_201_CREATED)
+
+    def test_holds_fall_back_to_the_database(self):
+        first, second = self.clients
+        broken = {f"{name}.side_effect": ConnectionError("cache down") for name in ("add", "get", "get_many", "set")}
+        with patch("appointments.holds.cache", **broken):
+            self.assertEqual(self._post(first, "patient-hold", "10:00").status_code, status.HTTP_201_CREATED)
+            self.assertEqual(SlotHold.objects.count(), 1)
+            self.assertEqual(self._post(second, "patient-hold", "10:15").status_code, status.HTTP_409_CONFLICT)
+
+            SlotHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(self._post(second, "patient-hold", "10:15").status_code, status.HTTP_201_CREATED)
+            self.assertEqual(SlotHold.objects.count(), 1)
+
+    def test_expired_key_is_reclaimed_without_overwriting_a_new_holder(self):
+        fake = MagicMock()
+        # Our add() fails, the key expires before get(), then another
+        # patient's add() wins before our retry
+        fake.add.side_effect = lambda key, *args: False
+        fake.get.side_effect = [None, (999, "other-token")]
+
+        with patch("appointments.holds.cache", fake), self.assertRaises(SlotHeld):
+            place_hold(self.doctor.id, self.day, 600, 615, patient_id=1)
+
+        claims = [call for call in fake.add.call_args_list if not call.args[0].startswith("hold:stats:")]
+        self.assertEqual(len(claims), 2)
+        fake.set.assert_not_called()
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        doctor = User.objects.create_user(
+            username="idem_doc", email="idem_doc@example.com", password="test1234", role="doctor"
+        ).doctor_profile
+        day = timezone.localdate() + timedelta(days=3)
+        Availability.objects.create(doctor=doctor, day_of_week=day.strftime("%A"), start_time=time(9), end_time=time(12))
+        self.patient = User.objects.create_user(
+            username="idem_pat", email="idem_pat@example.com", password="test1234", role="patient"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+        self.payload = {"doctor": doctor.id, "date": str(day), "time": "10:00"}
+
+    def _create(self, key, **changes):
+        return self.client.post(
+            reverse("patient-create"), {**self.payload, **changes}, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    @patch("appointments.views.notify_appointment_booked")
+    def test_retried_create_is_replayed(self, mock_notify):
+        first = self._create("retry-1")
+        retry = self._create("retry-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Appointment.objects.filter(patient=self.patient.patient_profile).count(), 1)
+        self.assertEqual(mock_notify.call_count, 1)
+
+        # Same key, different request
+        self.assertEqual(self._create("retry-1", time="11:00").status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    @patch("appointments.views.notify_appointment_cancelled")
+    @patch("appointments.views.notify_appointment_booked")
+    def test_retried_cancel_notifies_once(self, mock_booked, mock_cancelled):
+        self._create("book-1")
+        appointment = Appointment.objects.get(patient=self.patient.patient_profile)
+        url = reverse("patient-cancel", args=[appointment.pk])
+
+        for _ in range(2):
+            response = self.client.patch(url, {}, format="json", HTTP_IDEMPOTENCY_KEY="cancel-1")
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(mock_cancelled.call_count, 1)
+
+    @patch("appointments.views.notify_appointment_booked")
+    def test_in_flight_key_is_a_409(self, mock_notify):
+        from users.idempotency import _storage_key
+
+        request = type("Request", (), {"user": self.patient, "method": "POST", "path": reverse("patient-create")})
+        cache.add(f"{_storage_key(request, 'busy-1')}:lock", "x", 60)
+        response = self._create("busy-1")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["detail"].code, "idempotency_key_in_use")
+        mock_notify.assert_not_called()
+
+
+class BulkStatusUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        doctor_user = User.objects.create_user(
+            username="bulk_doc", email="bulk_doc@example.com", password="test1234", role="doctor"
+        )
+        self.doctor = doctor_user.doctor_profile
+        self.client = APIClient()
+        self.client.force_authenticate(doctor_user)
+
+        day = timezone.localdate() + timedelta(days=3)
+        self.appointments = [
+            Appointment.objects.create(
+                patient=User.objects.create_user(
+                    username=f"bulk_pat{i}", email=f"bulk_pat{i}@example.com", password="test1234", role="patient"
+                ).patient_profile,
+                doctor=self.doctor,
+                date=day,
+                time=time(9 + i),
+            )
+            for i in range(3)
+        ]
+        self.ids = [appointment.pk for appointment in self.appointments]
+
+    def _bulk(self, ids, new_status):
+        return self.client.post(reverse("doctor-bulk-update-status"), {"ids": ids, "status": new_status}, format="json")
+
+    def test_transitions_apply_to_every_id(self):
+        response = self._bulk(self.ids, Appointment.STATUS_APPROVED)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"status": "approved", "updated": 3, "skipped": []})
+
+        self.assertEqual(self._bulk(self.ids, Appointment.STATUS_COMPLETED).data["updated"], 3)
+        self.assertEqual(
+            set(Appointment.objects.filter(pk__in=self.ids).values_list("status", flat=True)), {"completed"}
+        )
+
+    def test_any_invalid_id_rejects_the_whole_batch(self):
+        Appointment.objects.filter(pk=self.ids[0]).update(status=Appointment.STATUS_COMPLETED)
+
+        response = self._bulk([*self.ids, 999999], Appointment.STATUS_APPROVED)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error["id"] for error in response.data["errors"]], [self.ids[0], 999999])
+        self.assertEqual(Appointment.objects.filter(status=Appointment.STATUS_APPROVED).count(), 0)
+
+    @patch("appointments.tasks.notify_status_changes_task.delay")
+    def test_cancellations_are_notified_in_one_batch(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._bulk(self.ids, Appointment.STATUS_CANCELLED)
+        self.assertEqual(response.data["updated"], 3)
+        mock_delay.assert_called_once_with(self.ids, Appointment.STATUS_CANCELLED)
+
+
+class DoctorDayActionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        doctor_user = User.objects.create_user(
+            username="day_doc", email="day_doc@example.com", password="test1234", role="doctor"
+        )
+        self.doctor = doctor_user.doctor_profile
+        for weekday in Availability.WEEKDAYS:
+            Availability.objects.create(doctor=self.doctor, day_of_week=weekday, start_time=time(9), end_time=time(12))
+        self.client = APIClient()
+        self.client.force_authenticate(doctor_user)
+
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.next_day = self.day + timedelta(days=1)
+        patients = [
+            User.objects.create_user(
+                username=f"day_pat{i}", email=f"day_pat{i}@example.com", password="test1234", role="patient"
+            ).patient_profile
+            for i in range(3)
+        ]
+        self.early, self.late = (
+            Appointment.objects.create(patient=patients[i], doctor=self.doctor, date=self.day, time=time(9 + i))
+            for i in range(2)
+        )
+        # Already booked on the next day, so the 10:00 visit cannot keep its time
+        Appointment.objects.create(patient=patients[2], doctor=self.doctor, date=self.next_day, time=time(10))
+
+    def _act(self, action, **extra):
+        payload = {"date": str(self.day), "action": action, **extra}
+        return self.client.post(reverse("doctor-day-action"), payload, format="json")
+
+    @patch("appointments.tasks.notify_schedule_changes")
+    @patch("appointments.tasks.notify_day_changes_task.delay")
+    def test_reschedule_moves_to_next_free_times(self, mock_delay, mock_notify):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._act("reschedule")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["cancelled"], [])
+
+        self.early.refresh_from_db()
+        self.late.refresh_from_db()
+        self.assertEqual((self.early.date, self.early.time), (self.next_day, time(9)))
+        self.assertEqual((self.late.date, self.late.time), (self.next_day, time(9, 30)))
+
+        mock_delay.assert_called_once()
+        cancelled, moves = mock_delay.call_args.args
+        self.assertEqual([move[0] for move in moves], [self.early.pk, self.late.pk])
+
+        from appointments.tasks import notify_day_changes_task
+
+        notify_day_changes_task(cancelled, moves)
+        self.assertEqual(mock_notify.call_count, 2)
+        old_date, old_time, moved = mock_notify.call_args_list[1].kwargs["rescheduled"][0]
+        self.assertEqual((old_date, old_time, moved.pk), (self.day, time(10), self.late.pk))
+
+    @patch("appointments.tasks.notify_schedule_changes")
+    @patch("appointments.tasks.notify_day_changes_task.delay")
+    def test_each_patient_gets_one_message(self, mock_delay, mock_notify):
+        extra = Appointment.objects.create(
+            patient=self.early.patient, doctor=self.doctor, date=self.day, time=time(11)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self._act("cancel")
+
+        from appointments.tasks import notify_day_changes_task
+
+        notify_day_changes_task(*mock_delay.call_args.args)
+        self.assertEqual(mock_notify.call_count, 2)
+        first = mock_notify.call_args_list[0].kwargs
+        self.assertEqual([appointment.pk for appointment in first["cancelled"]], [self.early.pk, extra.pk])
+        self.assertEqual(first["rescheduled"], [])
+
+    def test_doctors_cannot_name_another_doctor(self):
+        other = User.objects.create_user(
+            username="day_doc2", email="day_doc2@example.com", password="test1234", role="doctor"
+        ).doctor_profile
+        response = self._act("cancel", doctor=other.id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Appointment.objects.filter(status=Appointment.STATUS_CANCELLED).count(), 0)
+
+    @patch("appointments.tasks.notify_day_changes_task.delay")
+    def test_cancel_clears_the_day(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._act("cancel")
+        self.assertEqual(response.data["cancelled"], [self.early.pk, self.late.pk])
+        self.assertEqual(
+            Appointment.objects.filter(date=self.day).exclude(status=Appointment.STATUS_CANCELLED).count(), 0
+        )
+        mock_delay.assert_called_once_with([self.early.pk, self.late.pk], [])
+
+    def test_admins_must_name_the_doctor(self):
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_superuser(
+            username="day_admin", email="day_admin@example.com", password="test1234"
+        ))
+        payload = {"date": str(self.day), "action": "cancel"}
+        self.assertEqual(admin.post(reverse("doctor-day-action"), payload, format="json").status_code, 400)
+
+        payload["doctor"] = self.doctor.id
+        self.assertEqual(admin.post(reverse("doctor-day-action"), payload, format="json").status_code, 200)
+
+
+class RangeConstraintStateTests(TestCase):
+    def test_model_state_does_not_depend_on_the_backend(self):
+        names = {constraint.name for constraint in Appointment._meta.constraints}
+        self.assertFalse(names & {"appointment_doctor_no_overlap", "appointment_patient_no_overlap"})
+
+    @skipUnless(connection.vendor == "postgresql", "exclusion constraints are PostgreSQL-only")
+    def test_migrate_adds_exclusion_constraints(self):
+        with connection.cursor() as cursor:
+            existing = connection.introspection.get_constraints(cursor, Appointment._meta.db_table)
+        self.assertIn("appointment_doctor_no_overlap", existing)
+        self.assertIn("appointment_patient_no_overlap", existing)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs a database with concurrent writers")
+class BookingRaceTests(TransactionTestCase):
+    BOOKERS = 200
+
+    @patch("appointments.views.notify_appointment_booked")
+    def test_parallel_bookers_get_one_success_and_clean_conflicts(self, mock_notify):
+        doctor = User.objects.create_user(
+            username="storm_doc", email="storm_doc@example.com", password="test1234", role="doctor"
+        ).doctor_profile
+        day = timezone.localdate() + timedelta(days=3)
+        Availability.objects.create(doctor=doctor, day_of_week=day.strftime("%A"), start_time=time(9), end_time=time(12))
+        patients = [
+            User.objects.create_user(
+                username=f"storm{i}", email=f"storm{i}@example.com", password="test1234", role="patient"
+            )
+            for i in range(self.BOOKERS)
+        ]
+        payload = {"doctor": doctor.id, "date": str(day), "time": "10:00"}
+        start = threading.Barrier(self.BOOKERS)
+
+        def book(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            start.wait()
+            try:
+                return client.post(reverse("patient-create"), payload, format="json").status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.BOOKERS) as pool:
+            codes = list(pool.map(book, patients))
+
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(codes.count(status.HTTP_409_CONFLICT), self.BOOKERS - 1)
+        self.assertEqual(Appointment.objects.filter(doctor=doctor).count(), 1)
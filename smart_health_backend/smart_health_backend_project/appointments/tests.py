@@ -77,7 +77,7 @@ class AppointmentTests(TestCase):
         mock_notify.assert_called_once()
 
         response2 = self.client.post(self.create_url, payload, format="json")
-        self.assertEqual(response2.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response2.status_code, status.HTTP_409_CONFLICT)
 
     # 2️⃣ Patient cancels appointment
     @patch("appointments.views.notify_appointment_cancelled")
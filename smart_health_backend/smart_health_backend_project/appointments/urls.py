@@ -5,18 +5,28 @@ from .views import (
     PatientCancelAppointmentView,
     DoctorAppointmentsView,
     DoctorUpdateAppointmentStatusView,
+    DoctorBulkUpdateAppointmentStatusView,
+    DoctorDayActionView,
     AdminAllAppointmentsView,
+    PatientSlotHoldView,
+    PatientReleaseSlotHoldView,
+    SlotHoldStatsView,
 )
 
 urlpatterns = [
     path("patient/create/", PatientCreateAppointmentView.as_view(), name="patient-create"),
     path("patient/list/", PatientAppointmentsView.as_view(), name="patient-list"),
     path("patient/cancel/<int:pk>/", PatientCancelAppointmentView.as_view(), name="patient-cancel"),
+    path("patient/holds/", PatientSlotHoldView.as_view(), name="patient-hold"),
+    path("patient/holds/<str:token>/", PatientReleaseSlotHoldView.as_view(), name="patient-hold-release"),
 
     path("doctor/list/", DoctorAppointmentsView.as_view(), name="doctor-list"),
     path("doctor/update-status/<int:pk>/", DoctorUpdateAppointmentStatusView.as_view(), name="doctor-update-status"),
+    path("doctor/bulk-update-status/", DoctorBulkUpdateAppointmentStatusView.as_view(), name="doctor-bulk-update-status"),
+    path("doctor/day-action/", DoctorDayActionView.as_view(), name="doctor-day-action"),
 
     path("admin/all/", AdminAllAppointmentsView.as_view(), name="admin-all"),
+    path("admin/holds/stats/", SlotHoldStatsView.as_view(), name="hold-stats"),
 ]
 
 
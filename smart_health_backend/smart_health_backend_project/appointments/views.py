@@ -1,13 +1,21 @@
 from rest_framework import generics, permissions, filters, status
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
-from users.permissions import IsPatient, IsDoctor
+from users.idempotency import IdempotentMixin
+from users.permissions import IsAdmin, IsPatient, IsDoctor
+from users.profiles import get_profile_id
+from .booking import SlotTaken
+from .bulk import bulk_update_status, clear_doctor_day
+from .holds import claim_slot, convert_hold, hold_stats, place_hold, release_hold, reset_hold_stats, visit_window
 from .models import Appointment
 from .serializers import (
     AppointmentSerializer,
+    BulkStatusUpdateSerializer,
     CreateAppointmentSerializer,
+    DoctorDayActionSerializer,
+    SlotHoldSerializer,
     UpdateAppointmentStatusSerializer,
 )
 from .utils import (
@@ -22,7 +30,7 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class PatientCreateAppointmentView(generics.CreateAPIView):
+class PatientCreateAppointmentView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = CreateAppointmentSerializer
     permission_classes = [permissions.IsAuthenticated, IsPatient]
 
@@ -32,11 +40,18 @@ class PatientCreateAppointmentView(generics.CreateAPIView):
         return context
 
     def perform_create(self, serializer):
-        patient = getattr(self.request.user, "patient_profile", None)
-        if not patient:
+        patient_id = get_profile_id(self.request, "patient")
+        if not patient_id:
             raise NotFound("Patient profile not found.")
 
-        appointment = serializer.save(patient=patient)
+        data = serializer.validated_data
+        window = visit_window(data["doctor"], data["date"], data["time"])
+        # Another patient's hold wins over a booking that skipped holding
+        held = claim_slot(*window, patient_id)
+
+        appointment = serializer.save(patient_id=patient_id)
+        if held:
+            convert_hold(*window, patient_id)
         notify_appointment_booked(
             patient=appointment.patient,
             doctor=appointment.doctor,
@@ -44,6 +59,59 @@ class PatientCreateAppointmentView(generics.CreateAPIView):
         )
 
 
+class PatientSlotHoldView(generics.CreateAPIView):
+    """
+    Reserves a time for the patient for SLOT_HOLD_MINUTES while they
+    finish booking; other patients get a 409 for it until then.
+    """
+    serializer_class = SlotHoldSerializer
+    permission_classes = [permissions.IsAuthenticated, IsPatient]
+
+    def create(self, request, *args, **kwargs):
+        patient_id = get_profile_id(request, "patient")
+        if not patient_id:
+            raise NotFound("Patient profile not found.")
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        doctor_id, day, start_minute, end_minute = visit_window(data["doctor"], data["date"], data["time"])
+
+        if Appointment.objects.overlapping(day, start_minute, end_minute).filter(doctor_id=doctor_id).exists():
+            raise SlotTaken()
+
+        hold = place_hold(doctor_id, day, start_minute, end_minute, patient_id)
+        return Response(
+            {**serializer.data, "token": hold["token"], "expires_at": hold["expires_at"]},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class PatientReleaseSlotHoldView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated, IsPatient]
+
+    def delete(self, request, token):
+        patient_id = get_profile_id(request, "patient")
+        if not patient_id:
+            raise NotFound("Patient profile not found.")
+        release_hold(token, patient_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SlotHoldStatsView(generics.GenericAPIView):
+    """
+    Hold counts and conversion rate, summed over all workers.
+    `?reset=1` zeroes the counters after reading them.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        stats = hold_stats()
+        if request.query_params.get("reset") in ("1", "true"):
+            reset_hold_stats()
+        return Response(stats, status=status.HTTP_200_OK)
+
+
 class PatientAppointmentsView(generics.ListAPIView):
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated, IsPatient]
@@ -53,21 +121,21 @@ class PatientAppointmentsView(generics.ListAPIView):
     ordering_fields = ["date", "created_at"]
 
     def get_queryset(self):
-        patient = getattr(self.request.user, "patient_profile", None)
-        if not patient:
+        patient_id = get_profile_id(self.request, "patient")
+        if not patient_id:
             raise NotFound("Patient profile not found.")
-        return Appointment.objects.filter(patient=patient)
+        return Appointment.objects.filter(patient_id=patient_id)
 
 
-class PatientCancelAppointmentView(generics.UpdateAPIView):
+class PatientCancelAppointmentView(IdempotentMixin, generics.UpdateAPIView):
     serializer_class = UpdateAppointmentStatusSerializer
     permission_classes = [permissions.IsAuthenticated, IsPatient]
 
     def get_queryset(self):
-        patient = getattr(self.request.user, "patient_profile", None)
-        if not patient:
+        patient_id = get_profile_id(self.request, "patient")
+        if not patient_id:
             raise NotFound("Patient profile not found.")
-        return Appointment.objects.filter(patient=patient)
+        return Appointment.objects.filter(patient_id=patient_id)
 
     def patch(self, request, *args, **kwargs):
         appointment = self.get_object()
@@ -91,10 +159,10 @@ class DoctorAppointmentsView(generics.ListAPIView):
     pagination_class = StandardResultsSetPagination
 
     def get_queryset(self):
-        doctor = getattr(self.request.user, "doctor_profile", None)
-        if not doctor:
+        doctor_id = get_profile_id(self.request, "doctor")
+        if not doctor_id:
             raise NotFound("Doctor profile not found.")
-        return Appointment.objects.filter(doctor=doctor)
+        return Appointment.objects.filter(doctor_id=doctor_id)
 
 
 class DoctorUpdateAppointmentStatusView(generics.UpdateAPIView):
@@ -102,10 +170,57 @@ class DoctorUpdateAppointmentStatusView(generics.UpdateAPIView):
     permission_classes = [permissions.IsAuthenticated, IsDoctor]
 
     def get_queryset(self):
-        doctor = getattr(self.request.user, "doctor_profile", None)
-        if not doctor:
+        doctor_id = get_profile_id(self.request, "doctor")
+        if not doctor_id:
+            raise NotFound("Doctor profile not found.")
+        return Appointment.objects.filter(doctor_id=doctor_id)
+
+
+class DoctorBulkUpdateAppointmentStatusView(IdempotentMixin, generics.GenericAPIView):
+    """
+    Moves many of the doctor's appointments to one status in a single
+    UPDATE, e.g. marking a clinic day completed. All-or-nothing: any
+    invalid id or transition rejects the whole request.
+    """
+    serializer_class = BulkStatusUpdateSerializer
+    permission_classes = [permissions.IsAuthenticated, IsDoctor]
+
+    def post(self, request):
+        doctor_id = get_profile_id(request, "doctor")
+        if not doctor_id:
             raise NotFound("Doctor profile not found.")
-        return Appointment.objects.filter(doctor=doctor)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = bulk_update_status(doctor_id, serializer.validated_data["ids"], serializer.validated_data["status"])
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class DoctorDayActionView(IdempotentMixin, generics.GenericAPIView):
+    """
+    Cancels, or moves to the next free times, all of a doctor's
+    pending/approved appointments on one date. Doctors act on their own
+    day; admins name the doctor.
+    """
+    serializer_class = DoctorDayActionSerializer
+    permission_classes = [permissions.IsAuthenticated, IsDoctor | IsAdmin]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        doctor_id = get_profile_id(request, "doctor")
+        if doctor_id:
+            if "doctor" in data and data["doctor"].id != doctor_id:
+                raise ValidationError({"doctor": "Doctors can only change their own day."})
+        elif "doctor" not in data:
+            raise ValidationError({"doctor": "This field is required."})
+        else:
+            doctor_id = data["doctor"].id
+
+        result = clear_doctor_day(doctor_id, data["date"], data["action"], data.get("reschedule_from"))
+        return Response(result, status=status.HTTP_200_OK)
 
 
 class AdminAllAppointmentsView(generics.ListAPIView):
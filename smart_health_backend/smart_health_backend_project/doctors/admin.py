@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DoctorProfile, Availability
+from .models import DoctorProfile, Availability, AvailabilityOverride
 
 
 @admin.register(DoctorProfile)
@@ -12,3 +12,9 @@ class DoctorProfileAdmin(admin.ModelAdmin):
 class AvailabilityAdmin(admin.ModelAdmin):
     list_display = ("doctor", "day_of_week", "start_time", "end_time")
     list_filter = ("day_of_week",)
+
+
+@admin.register(AvailabilityOverride)
+class AvailabilityOverrideAdmin(admin.ModelAdmin):
+    list_display = ("doctor", "date", "kind", "start_time", "end_time", "reason")
+    list_filter = ("kind",)
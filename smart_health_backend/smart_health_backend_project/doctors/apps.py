@@ -5,8 +5,6 @@ class DoctorsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "doctors"
 
-    def ready(self):
-        import doctors.signals
 
 
 
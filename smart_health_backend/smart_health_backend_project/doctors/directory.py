@@ -0,0 +1,57 @@
+import json
+import hashlib
+
+from django.conf import settings
+from django.db.models import F
+
+from users.caching import get_namespace
+from users.models import User
+from .locations import filter_by_location, normalize_location
+from .models import DoctorProfile
+
+DIRECTORY_TTL = getattr(settings, "DOCTOR_DIRECTORY_CACHE_SECONDS", 60 * 60)
+DIRECTORY_FIELDS = ("id", "username", "specialization", "location", "years_of_experience")
+
+doctors_cache = get_namespace("doctors")
+
+
+# -------------------------------------------------
+# Read model
+# -------------------------------------------------
+def directory_key(specialization="", location=""):
+    """Cache key for a filter combination, on normalized inputs so spellings share an entry."""
+    specialization = " ".join(specialization.split()).casefold()
+    location = normalize_location(location) if location else ""
+    digest = hashlib.sha1(f"{specialization}|{location}".encode("utf-8")).hexdigest()
+    return f"directory:{digest}"
+
+
+def build_directory(specialization="", location=""):
+    """
+    Flat rows for active doctors matching the filters, read in one query
+    with the username joined in.
+    """
+    queryset = DoctorProfile.objects.filter(user__is_active=True, user__role=User.ROLE_DOCTOR)
+    if specialization:
+        queryset = queryset.filter(specialization__iexact=" ".join(specialization.split()))
+    if location:
+        queryset = filter_by_location(queryset, location)
+    return list(
+        queryset.annotate(username=F("user__username"))
+        .order_by("specialization", "username", "id")
+        .values(*DIRECTORY_FIELDS)
+    )
+
+
+def get_directory(specialization="", location=""):
+    """
+    {"etag", "results"} for the filters, cached in the doctors namespace
+    until a doctor profile changes. The ETag is a hash of the rows
+    themselves, so it only changes when the response body would.
+    """
+    def compute():
+        results = build_directory(specialization, location)
+        body = json.dumps(results, sort_keys=True, separators=(",", ":"), default=str)
+        return {"etag": f'"{hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]}"', "results": results}
+
+    return doctors_cache.get_or_set(directory_key(specialization, location), compute, DIRECTORY_TTL)
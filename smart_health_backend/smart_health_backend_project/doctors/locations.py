@@ -0,0 +1,68 @@
+import re
+import unicodedata
+
+# -------------------------------------------------
+# Canonical location keys
+# -------------------------------------------------
+# Keys are hierarchical ("city/district") so that a prefix lookup on
+# DoctorProfile.location_key finds a city together with its districts.
+CANONICAL_LOCATIONS = {
+    "kigali": ["kigali", "kgl", "kigali city", "umujyi wa kigali", "city of kigali"],
+    "kigali/gasabo": ["gasabo", "remera", "kacyiru", "kimironko", "kibagabaga"],
+    "kigali/kicukiro": ["kicukiro", "kanombe", "gikondo", "niboye"],
+    "kigali/nyarugenge": ["nyarugenge", "nyamirambo", "muhima", "kiyovu"],
+    "huye": ["huye", "butare"],
+    "musanze": ["musanze", "ruhengeri"],
+    "rubavu": ["rubavu", "gisenyi"],
+    "rusizi": ["rusizi", "cyangugu", "kamembe"],
+    "muhanga": ["muhanga", "gitarama"],
+    "karongi": ["karongi", "kibuye"],
+    "nyagatare": ["nyagatare"],
+    "rwamagana": ["rwamagana"],
+    "nyanza": ["nyanza"],
+    "kayonza": ["kayonza"],
+}
+
+ALIASES = {
+    alias: key
+    for key, aliases in CANONICAL_LOCATIONS.items()
+    for alias in aliases
+}
+
+
+def _clean(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def normalize_location(text: str) -> str:
+    """
+    Maps free-text location to its canonical key.
+
+    The whole text is tried first, then each comma-separated part; the
+    most specific known match wins ("Remera, Kigali" -> "kigali/gasabo").
+    Unknown locations fall back to their cleaned text so they remain
+    searchable by exact or prefix match.
+    """
+    cleaned = _clean(text)
+    if cleaned in ALIASES:
+        return ALIASES[cleaned]
+
+    matches = [ALIASES[part] for part in map(_clean, (text or "").split(",")) if part in ALIASES]
+    if matches:
+        return max(matches, key=lambda key: key.count("/"))
+
+    return cleaned
+
+
+def filter_by_location(queryset, location: str):
+    """
+    Index-friendly replacement for location__icontains.
+
+    Uses a prefix match on the normalized key so both the city and
+    its districts are returned.
+    """
+    key = normalize_location(location)
+    if not key:
+        return queryset.none()
+    return queryset.filter(location_key__startswith=key)
@@ -0,0 +1,78 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from doctors.models import DoctorProfile
+from doctors.locations import CANONICAL_LOCATIONS, normalize_location, filter_by_location
+
+User = get_user_model()
+
+SAMPLE_LOCATIONS = [aliases[0].title() for aliases in CANONICAL_LOCATIONS.values()] + [
+    "Remera, Kigali",
+    "KGL",
+    "Butare",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares location__icontains with the normalized location_key lookup "
+        "on a synthetic set of doctor profiles. All rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        total = options["doctors"]
+        queries = options["queries"]
+        batch_size = options["batch_size"]
+
+        with transaction.atomic():
+            self._seed(total, batch_size)
+
+            searches = [random.choice(["Kigali", "kgl", "Gasabo", "Huye", "Musanze"]) for _ in range(queries)]
+
+            legacy = self._time(lambda term: DoctorProfile.objects.filter(location__icontains=term), searches)
+            indexed = self._time(lambda term: filter_by_location(DoctorProfile.objects.all(), term), searches)
+
+            self.stdout.write(f"Doctors: {total}, queries: {queries}")
+            self.stdout.write(f"location__icontains : {legacy * 1000:.2f} ms/query")
+            self.stdout.write(f"location_key prefix : {indexed * 1000:.2f} ms/query")
+
+            transaction.set_rollback(True)
+
+    def _seed(self, total, batch_size):
+        run_id = int(time.time())
+        for start in range(0, total, batch_size):
+            size = min(batch_size, total - start)
+            users = User.objects.bulk_create([
+                User(
+                    username=f"bench_doc_{run_id}_{start + i}",
+                    email=f"bench_doc_{run_id}_{start + i}@example.com",
+                    password="!",
+                    role=User.ROLE_DOCTOR,
+                )
+                for i in range(size)
+            ])
+            profiles = []
+            for user in users:
+                location = random.choice(SAMPLE_LOCATIONS)
+                profiles.append(DoctorProfile(
+                    user=user,
+                    specialization="General Practice",
+                    location=location,
+                    location_key=normalize_location(location),
+                ))
+            DoctorProfile.objects.bulk_create(profiles)
+
+    def _time(self, build_queryset, searches):
+        started = time.perf_counter()
+        for term in searches:
+            build_queryset(term).count()
+        return (time.perf_counter() - started) / len(searches)
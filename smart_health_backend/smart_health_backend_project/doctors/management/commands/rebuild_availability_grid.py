@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from doctors.models import Availability
+from users.caching import invalidate_namespaces
+
+COMPACT_FIELDS = ["weekday", "start_minute", "end_minute"]
+
+
+class Command(BaseCommand):
+    help = "Recomputes Availability.weekday/start_minute/end_minute (run once after adding the columns)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        batch, updated = [], 0
+
+        for slot in Availability.objects.only("id", "day_of_week", "start_time", "end_time", *COMPACT_FIELDS).iterator(
+            chunk_size=batch_size
+        ):
+            before = [getattr(slot, field) for field in COMPACT_FIELDS]
+            slot.sync_compact()
+            if [getattr(slot, field) for field in COMPACT_FIELDS] == before:
+                continue
+            batch.append(slot)
+
+            if len(batch) >= batch_size:
+                Availability.objects.bulk_update(batch, COMPACT_FIELDS)
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            Availability.objects.bulk_update(batch, COMPACT_FIELDS)
+            updated += len(batch)
+
+        # Cached week bitmaps were built from the old values
+        invalidate_namespaces("doctors", "appointments")
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} availability slots."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from doctors.models import DoctorProfile
+from doctors.locations import normalize_location
+
+
+class Command(BaseCommand):
+    help = "Recomputes DoctorProfile.location_key for every doctor (run after changing location aliases)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        batch, updated = [], 0
+
+        for doctor in DoctorProfile.objects.only("id", "location", "location_key").iterator(chunk_size=batch_size):
+            key = normalize_location(doctor.location)
+            if key == doctor.location_key:
+                continue
+            doctor.location_key = key
+            batch.append(doctor)
+
+            if len(batch) >= batch_size:
+                DoctorProfile.objects.bulk_update(batch, ["location_key"])
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            DoctorProfile.objects.bulk_update(batch, ["location_key"])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} doctor location keys."))
@@ -2,6 +2,10 @@ from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
+from .locations import normalize_location
+
+DEFAULT_VISIT_MINUTES = getattr(settings, "APPOINTMENT_DEFAULT_MINUTES", 30)
+
 
 class DoctorProfile(models.Model):
     user = models.OneToOneField(
@@ -11,11 +15,32 @@ class DoctorProfile(models.Model):
     )
     specialization = models.CharField(max_length=100)
     location = models.CharField(max_length=100)
+    # Canonical key derived from `location`, see doctors.locations
+    location_key = models.CharField(max_length=100, blank=True, editable=False)
     years_of_experience = models.PositiveIntegerField(default=0)
+    # Default length of an appointment with this doctor
+    visit_minutes = models.PositiveSmallIntegerField(default=DEFAULT_VISIT_MINUTES)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # varchar_pattern_ops lets PostgreSQL serve LIKE 'key%' from the index
+            models.Index(
+                fields=["location_key"],
+                name="doctor_location_key_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.location_key = normalize_location(self.location)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "location" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "location_key"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Doctor: {self.user.username} ({self.specialization})"
 
@@ -31,6 +56,9 @@ class Availability(models.Model):
         ("Sunday", "Sunday"),
     )
 
+    # Index of each day in DAYS matches date.weekday()
+    WEEKDAYS = tuple(day for day, _ in DAYS)
+
     doctor = models.ForeignKey(
         DoctorProfile,
         on_delete=models.CASCADE,
@@ -39,20 +67,44 @@ class Availability(models.Model):
     day_of_week = models.CharField(max_length=10, choices=DAYS)
     start_time = models.TimeField()
     end_time = models.TimeField()
+    # Compact copy of the three fields above (0 = Monday, minutes since
+    # midnight), kept in sync by save(); see doctors.slots
+    weekday = models.PositiveSmallIntegerField(default=0, editable=False)
+    start_minute = models.PositiveSmallIntegerField(default=0, editable=False)
+    end_minute = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
-        ordering = ["day_of_week", "start_time"]
+        ordering = ["weekday", "start_minute"]
         unique_together = ("doctor", "day_of_week", "start_time", "end_time")
+        indexes = [
+            models.Index(fields=["doctor", "weekday", "start_minute"], name="availability_doctor_week_idx"),
+        ]
+
+    def sync_compact(self):
+        """Derives weekday/start_minute/end_minute; bulk writes must call this themselves."""
+        start = self._meta.get_field("start_time").to_python(self.start_time)
+        end = self._meta.get_field("end_time").to_python(self.end_time)
+        self.weekday = self.WEEKDAYS.index(self.day_of_week)
+        self.start_minute = start.hour * 60 + start.minute
+        self.end_minute = end.hour * 60 + end.minute
+
+    def save(self, *args, **kwargs):
+        self.sync_compact()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"day_of_week", "start_time", "end_time"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "weekday", "start_minute", "end_minute"}
+        super().save(*args, **kwargs)
 
     def clean(self):
         if self.start_time >= self.end_time:
             raise ValidationError("Start time must be earlier than end time.")
 
+        self.sync_compact()
         overlapping = Availability.objects.filter(
             doctor=self.doctor,
-            day_of_week=self.day_of_week,
-            start_time__lt=self.end_time,
-            end_time__gt=self.start_time,
+            weekday=self.weekday,
+            start_minute__lt=self.end_minute,
+            end_minute__gt=self.start_minute,
         ).exclude(id=self.id)
 
         if overlapping.exists():
@@ -62,6 +114,51 @@ class Availability(models.Model):
         return f"{self.doctor.user.username} - {self.day_of_week} ({self.start_time}-{self.end_time})"
 
 
+class AvailabilityOverride(models.Model):
+    """
+    A date-specific change to the weekly pattern: a closure (the whole
+    day when no times are given) or extra hours.
+    """
+    KIND_CLOSED = "closed"
+    KIND_EXTRA = "extra"
+
+    KIND_CHOICES = (
+        (KIND_CLOSED, "Closed"),
+        (KIND_EXTRA, "Extra hours"),
+    )
+
+    doctor = models.ForeignKey(
+        DoctorProfile,
+        on_delete=models.CASCADE,
+        related_name="availability_overrides"
+    )
+    date = models.DateField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=KIND_CLOSED)
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=255, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["date", "start_time"]
+        indexes = [
+            models.Index(fields=["doctor", "date"]),
+        ]
+
+    def clean(self):
+        if (self.start_time is None) != (self.end_time is None):
+            raise ValidationError("Give both start and end time, or neither for the whole day.")
+        if self.start_time is not None and self.start_time >= self.end_time:
+            raise ValidationError("Start time must be earlier than end time.")
+        if self.kind == self.KIND_EXTRA and self.start_time is None:
+            raise ValidationError("Extra hours need a start and end time.")
+
+    def __str__(self):
+        hours = f" ({self.start_time}-{self.end_time})" if self.start_time else ""
+        return f"{self.doctor_id} - {self.kind} on {self.date}{hours}"
+
+
 
 
 
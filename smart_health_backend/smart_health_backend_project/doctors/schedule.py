@@ -0,0 +1,205 @@
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import ProtectedError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from users.caching import invalidate_namespaces
+from .models import Availability, DoctorProfile
+
+logger = logging.getLogger("doctors")
+
+MODE_REPLACE = "replace"
+MODE_UPSERT = "upsert"
+
+
+class ScheduleConflict(APIException):
+    """Raised with every overlapping pair when an edit would double-book time; nothing is written."""
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = "schedule_conflict"
+
+    def __init__(self, conflicts):
+        super().__init__()
+        # Kept as plain data so slot ids stay integers in the response
+        self.detail = {"detail": "Availability slots overlap.", "conflicts": conflicts}
+
+
+class SlotInUse(APIException):
+    """Raised when an edit would delete or move slots that appointments are booked against."""
+    status_code = status.HTTP_409_CONFLICT
+    default_code = "slot_in_use"
+
+    def __init__(self, slots):
+        super().__init__()
+        self.detail = {"detail": "Slots with appointments cannot be removed or changed.", "slots": slots}
+
+
+def describe_slot(slot) -> dict:
+    return {
+        "id": slot.pk,
+        "day_of_week": slot.day_of_week,
+        "start_time": slot.start_time.strftime("%H:%M"),
+        "end_time": slot.end_time.strftime("%H:%M"),
+    }
+
+
+# -------------------------------------------------
+# Overlap detection
+# -------------------------------------------------
+def find_overlaps(slots) -> list:
+    """
+    Sorted sweep over (day, start): each slot is compared with the
+    slot reaching furthest so far that day, so every overlapping slot is
+    reported with one slot it actually overlaps, in O(n log n) and
+    without touching the database. Touching slots (09-10, 10-11) are fine.
+    """
+    conflicts = []
+    reach = None
+    for slot in sorted(slots, key=lambda s: (s.weekday, s.start_minute, s.end_minute)):
+        same_day = reach is not None and reach.weekday == slot.weekday
+        if same_day and slot.start_minute < reach.end_minute:
+            conflicts.append((reach, slot))
+        if not same_day or slot.end_minute > reach.end_minute:
+            reach = slot
+    return conflicts
+
+
+def check_schedule(slots):
+    conflicts = find_overlaps(slots)
+    if conflicts:
+        raise ScheduleConflict([{"first": describe_slot(a), "second": describe_slot(b)} for a, b in conflicts])
+
+
+# -------------------------------------------------
+# Bulk edits
+# -------------------------------------------------
+def save_schedule(doctor_id, entries, mode=MODE_REPLACE) -> dict:
+    """
+    Applies a batch of slots (dicts with day_of_week, start_time,
+    end_time and, for upserts, an optional id) to a doctor's weekly
+    availability in one transaction.
+
+    replace: the entries become the whole schedule. Slots already
+        present with the same day and times are kept as they are, so
+        appointments linked to them stay valid; the rest are deleted.
+    upsert: entries with an id update that slot, the others are added,
+        and slots not mentioned are left alone.
+
+    The resulting schedule is validated in memory before anything is
+    written. Returns {"created", "updated", "deleted", "availability"}.
+    """
+    with transaction.atomic():
+        # Serializes concurrent edits of the same doctor's schedule
+        DoctorProfile.objects.select_for_update().filter(pk=doctor_id).values_list("pk").first()
+        current = {slot.pk: slot for slot in Availability.objects.filter(doctor_id=doctor_id)}
+
+        if mode == MODE_REPLACE:
+            to_create, to_update, to_delete, final = _plan_replace(doctor_id, current, entries)
+        else:
+            to_create, to_update, to_delete, final = _plan_upsert(doctor_id, current, entries)
+
+        check_schedule(final)
+        # Same rule for both modes: only active appointments pin a slot
+        _check_not_booked(current, [slot.pk for slot in [*to_update, *to_delete]])
+
+        if to_delete:
+            deleted_ids = [slot.pk for slot in to_delete]
+            # Cancelled visits keep their date and time; only the link goes
+            apps.get_model("appointments", "Appointment").objects.filter(
+                availability_id__in=deleted_ids
+            ).update(availability=None)
+            try:
+                Availability.objects.filter(pk__in=deleted_ids).delete()
+            except ProtectedError as e:
+                # An appointment linked to the slot since the check above
+                booked = {appointment.availability_id for appointment in e.protected_objects}
+                raise SlotInUse([describe_slot(current[pk]) for pk in sorted(booked)])
+        if to_update:
+            Availability.objects.bulk_update(
+                to_update, ["day_of_week", "start_time", "end_time", "weekday", "start_minute", "end_minute"]
+            )
+        if to_create:
+            Availability.objects.bulk_create(to_create)
+
+        # bulk_create/bulk_update send no model signals
+        transaction.on_commit(lambda: invalidate_namespaces("doctors", "appointments"))
+
+    logger.info(
+        f"Doctor {doctor_id} schedule {mode}: {len(to_create)} created, "
+        f"{len(to_update)} updated, {len(to_delete)} deleted"
+    )
+    return {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "deleted": len(to_delete),
+        "availability": Availability.objects.filter(doctor_id=doctor_id),
+    }
+
+
+def _check_not_booked(current, slot_ids):
+    """
+    Deleting or moving a slot would leave its active appointments
+    outside any window; refuse, describing the slots as stored.
+    """
+    if not slot_ids:
+        return
+    Appointment = apps.get_model("appointments", "Appointment")
+    booked = set(
+        Appointment.objects.active().filter(availability_id__in=slot_ids).values_list("availability_id", flat=True)
+    )
+    if booked:
+        raise SlotInUse([describe_slot(current[pk]) for pk in sorted(booked)])
+
+
+def _slot_key(slot):
+    return (slot.weekday, slot.start_minute, slot.end_minute)
+
+
+def _plan_replace(doctor_id, current, entries):
+    existing = {_slot_key(slot): slot for slot in current.values()}
+    final, to_create = [], []
+    for entry in entries:
+        slot = _slot(entry, doctor_id=doctor_id)
+        kept = existing.pop(_slot_key(slot), None)
+        if kept is not None:
+            final.append(kept)
+        else:
+            final.append(slot)
+            to_create.append(slot)
+    return to_create, [], list(existing.values()), final
+
+
+def _plan_upsert(doctor_id, current, entries):
+    # `current` keeps the stored slots for error messages
+    final = dict(current)
+    to_create, to_update, unknown = [], [], []
+    for entry in entries:
+        slot_id = entry.get("id")
+        if slot_id is None:
+            to_create.append(_slot(entry, doctor_id=doctor_id))
+            continue
+        slot = current.get(slot_id)
+        if slot is None:
+            unknown.append(slot_id)
+            continue
+        changed = _slot(entry, pk=slot_id, doctor_id=doctor_id)
+        if _slot_key(changed) != _slot_key(slot):
+            final[slot_id] = changed
+            to_update.append(changed)
+
+    if unknown:
+        raise ValidationError({"slots": f"Unknown availability ids: {', '.join(map(str, unknown))}."})
+    return to_create, to_update, [], [*final.values(), *to_create]
+
+
+def _slot(entry, **kwargs):
+    slot = Availability(
+        day_of_week=entry["day_of_week"],
+        start_time=entry["start_time"],
+        end_time=entry["end_time"],
+        **kwargs,
+    )
+    slot.sync_compact()
+    return slot
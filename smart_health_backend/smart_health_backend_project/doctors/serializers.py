@@ -1,5 +1,23 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from .models import DoctorProfile, Availability
+from .models import DoctorProfile, Availability, AvailabilityOverride
+from .slots import SLOT_MINUTES
+
+
+def check_slot_boundaries(data):
+    """
+    Bookable time is counted in whole SLOT_MINUTES slots, so windows that
+    open time must start and end on slot boundaries or part of them
+    could never be booked.
+    """
+    errors = {
+        field: f"Must be on a {SLOT_MINUTES}-minute boundary."
+        for field in ("start_time", "end_time")
+        if data.get(field) is not None
+        and (data[field].second or data[field].microsecond or data[field].minute % SLOT_MINUTES)
+    }
+    if errors:
+        raise serializers.ValidationError(errors)
 
 
 class DoctorSerializer(serializers.ModelSerializer):
@@ -26,9 +44,51 @@ class AvailabilitySerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
     def validate(self, data):
-        doctor = self.context.get("doctor")
-        if not doctor:
+        if not self.context.get("doctor_id"):
             raise serializers.ValidationError("Doctor profile is required.")
+        check_slot_boundaries(data)
+        return data
+
+
+class ScheduleSlotSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    day_of_week = serializers.ChoiceField(choices=Availability.DAYS)
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+
+    def validate(self, data):
+        if data["start_time"] >= data["end_time"]:
+            raise serializers.ValidationError("Start time must be earlier than end time.")
+        check_slot_boundaries(data)
+        return data
+
+
+class ScheduleSerializer(serializers.Serializer):
+    """A batch of weekly slots; overlaps are checked by doctors.schedule."""
+    slots = ScheduleSlotSerializer(many=True, max_length=500)
+
+    def validate_slots(self, slots):
+        ids = [slot["id"] for slot in slots if "id" in slot]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each availability id can appear only once.")
+        return slots
+
+
+class AvailabilityOverrideSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AvailabilityOverride
+        fields = ["id", "date", "kind", "start_time", "end_time", "reason"]
+        read_only_fields = ["id"]
+
+    def validate(self, data):
+        instance = AvailabilityOverride(**data)
+        try:
+            instance.clean()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+        # Closed hours may be partial: they block every slot they touch
+        if data.get("kind") == AvailabilityOverride.KIND_EXTRA:
+            check_slot_boundaries(data)
         return data
 
 
@@ -0,0 +1,207 @@
+import calendar
+from datetime import date, time
+
+from django.apps import apps
+from django.conf import settings
+
+from users.caching import get_namespace
+from .models import Availability, AvailabilityOverride
+
+SLOT_MINUTES = getattr(settings, "AVAILABILITY_SLOT_MINUTES", 15)
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+BITMAP_TTL = getattr(settings, "AVAILABILITY_BITMAP_CACHE_SECONDS", 60 * 60)
+CALENDAR_TTL = getattr(settings, "AVAILABILITY_CALENDAR_CACHE_SECONDS", 60 * 60 * 6)
+
+doctors_cache = get_namespace("doctors")
+
+
+# -------------------------------------------------
+# Weekly bitmaps
+#
+# A doctor's week is one integer of 7 * SLOTS_PER_DAY bits: bit
+# weekday * SLOTS_PER_DAY + slot is set when that whole slot lies inside
+# an availability window. "Available at T" is a shift and a mask, and a
+# day's free slots for many doctors are a few integer operations each.
+# -------------------------------------------------
+def range_bits(start_minute, end_minute) -> int:
+    """Bits of the slots fully covered by [start_minute, end_minute)."""
+    first = -(-start_minute // SLOT_MINUTES)
+    last = end_minute // SLOT_MINUTES
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def covering_bits(start_minute, end_minute) -> int:
+    """Bits of every slot [start_minute, end_minute) touches, even partly."""
+    first = start_minute // SLOT_MINUTES
+    last = -(-end_minute // SLOT_MINUTES)
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def build_bitmap(windows) -> int:
+    """Week bitmap from (weekday, start_minute, end_minute) rows."""
+    bitmap = 0
+    for weekday, start_minute, end_minute in windows:
+        bitmap |= range_bits(start_minute, end_minute) << (weekday * SLOTS_PER_DAY)
+    return bitmap
+
+
+def slot_index(value: time) -> int:
+    return (value.hour * 60 + value.minute) // SLOT_MINUTES
+
+
+def slot_time(index: int) -> time:
+    minutes = index * SLOT_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+def day_bits(bitmap: int, day) -> int:
+    return (bitmap >> (day.weekday() * SLOTS_PER_DAY)) & DAY_MASK
+
+
+def is_available(bitmap: int, day, at: time) -> bool:
+    return bool(day_bits(bitmap, day) >> slot_index(at) & 1)
+
+
+def _bitmap_key(doctor_id) -> str:
+    return f"week_bitmap:{doctor_id}"
+
+
+def week_bitmaps(doctor_ids) -> dict:
+    """
+    {doctor_id: bitmap} from the doctors cache namespace (invalidated on
+    availability changes), loading all misses in one query.
+    """
+    keys = {_bitmap_key(doctor_id): doctor_id for doctor_id in doctor_ids}
+    cached = doctors_cache.get_many(list(keys))
+    bitmaps = {keys[key]: bitmap for key, bitmap in cached.items()}
+
+    missing = [doctor_id for doctor_id in keys.values() if doctor_id not in bitmaps]
+    if missing:
+        windows = {doctor_id: [] for doctor_id in missing}
+        rows = Availability.objects.filter(doctor_id__in=missing).values_list(
+            "doctor_id", "weekday", "start_minute", "end_minute"
+        )
+        for doctor_id, *window in rows:
+            windows[doctor_id].append(window)
+        fresh = {doctor_id: build_bitmap(w) for doctor_id, w in windows.items()}
+        doctors_cache.set_many({_bitmap_key(d): bitmap for d, bitmap in fresh.items()}, BITMAP_TTL)
+        bitmaps.update(fresh)
+
+    return bitmaps
+
+
+def week_bitmap(doctor_id) -> int:
+    return week_bitmaps([doctor_id])[doctor_id]
+
+
+# -------------------------------------------------
+# Monthly calendars
+#
+# The weekly pattern merged with date overrides, expanded to one day
+# bitmap per day of the month and cached per doctor and month, so
+# booking checks never expand rules per request.
+# -------------------------------------------------
+def _minutes(value: time, default: int) -> int:
+    return default if value is None else value.hour * 60 + value.minute
+
+
+def apply_overrides(bits: int, overrides) -> int:
+    """
+    Applies (kind, start_time, end_time) overrides to a day's bits.
+    Closures go first, so "closed, but 14:00-16:00" can be expressed;
+    a closure also blocks slots it only partly covers.
+    """
+    for kind, start, end in sorted(overrides, key=lambda o: o[0] != AvailabilityOverride.KIND_CLOSED):
+        start_minute, end_minute = _minutes(start, 0), _minutes(end, 24 * 60)
+        if kind == AvailabilityOverride.KIND_CLOSED:
+            bits &= ~covering_bits(start_minute, end_minute)
+        else:
+            bits |= range_bits(start_minute, end_minute)
+    return bits
+
+
+def build_month(bitmap: int, year: int, month: int, overrides) -> list:
+    """Day bits for each day of the month; `overrides` maps day number to override rows."""
+    return [
+        apply_overrides(day_bits(bitmap, date(year, month, day)), overrides.get(day, ()))
+        for day in range(1, calendar.monthrange(year, month)[1] + 1)
+    ]
+
+
+def _calendar_key(doctor_id, year, month) -> str:
+    return f"calendar:{doctor_id}:{year}-{month:02d}"
+
+
+def month_calendars(doctor_ids, year, month) -> dict:
+    """{doctor_id: [day bits]} for the month, building all misses with one overrides query."""
+    keys = {_calendar_key(doctor_id, year, month): doctor_id for doctor_id in doctor_ids}
+    cached = doctors_cache.get_many(list(keys))
+    calendars = {keys[key]: days for key, days in cached.items()}
+
+    missing = [doctor_id for doctor_id in keys.values() if doctor_id not in calendars]
+    if missing:
+        overrides = {doctor_id: {} for doctor_id in missing}
+        last_day = calendar.monthrange(year, month)[1]
+        rows = AvailabilityOverride.objects.filter(
+            doctor_id__in=missing, date__range=(date(year, month, 1), date(year, month, last_day))
+        ).values_list("doctor_id", "date", "kind", "start_time", "end_time")
+        for doctor_id, day, *override in rows:
+            overrides[doctor_id].setdefault(day.day, []).append(override)
+
+        bitmaps = week_bitmaps(missing)
+        fresh = {d: build_month(bitmaps[d], year, month, overrides[d]) for d in missing}
+        doctors_cache.set_many({_calendar_key(d, year, month): days for d, days in fresh.items()}, CALENDAR_TTL)
+        calendars.update(fresh)
+
+    return calendars
+
+
+def month_calendar(doctor_id, year, month) -> list:
+    return month_calendars([doctor_id], year, month)[doctor_id]
+
+
+def doctor_is_available(doctor_id, day, at: time, minutes=None) -> bool:
+    """
+    Weekly hours and date overrides, answered from the cached month
+    calendar. With `minutes`, every slot the visit touches must be open.
+    """
+    bits = month_calendar(doctor_id, day.year, day.month)[day.day - 1]
+    if not minutes:
+        return bool(bits >> slot_index(at) & 1)
+    start_minute = at.hour * 60 + at.minute
+    needed = covering_bits(start_minute, start_minute + minutes)
+    return needed <= DAY_MASK and bits & needed == needed
+
+
+# -------------------------------------------------
+# Free slots
+# -------------------------------------------------
+def free_slots(doctor_ids, day) -> dict:
+    """
+    {doctor_id: [slot start times]} still open on `day`: each doctor's
+    calendar day with every slot a non-cancelled appointment touches
+    cleared.
+    """
+    Appointment = apps.get_model("appointments", "Appointment")
+    calendars = month_calendars(doctor_ids, day.year, day.month)
+    days = {doctor_id: month[day.day - 1] for doctor_id, month in calendars.items()}
+
+    booked = (
+        Appointment.objects.filter(doctor_id__in=[d for d, bits in days.items() if bits], date=day)
+        .exclude(status=Appointment.STATUS_CANCELLED)
+        .values_list("doctor_id", "start_minute", "end_minute")
+    )
+    for doctor_id, start_minute, end_minute in booked:
+        days[doctor_id] &= ~covering_bits(start_minute, end_minute)
+
+    return {doctor_id: _slot_times(bits) for doctor_id, bits in days.items()}
+
+
+def _slot_times(bits) -> list:
+    times = []
+    while bits:
+        lowest = bits & -bits
+        times.append(slot_time(lowest.bit_length() - 1))
+        bits ^= lowest
+    return times
@@ -1,8 +1,15 @@
+from datetime import date, time, timedelta
+
 from rest_framework.test import APITestCase
+from django.core.cache import cache
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework import status
 from doctors.models import DoctorProfile, Availability
+from doctors.locations import normalize_location, filter_by_location
+from appointments.models import Appointment
+from doctors import slots
+from doctors.schedule import find_overlaps
 
 User = get_user_model()
 
@@ -42,3 +49,285 @@ class AvailabilityTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Availability.objects.count(), 1)
+
+    def test_times_off_slot_boundaries_are_rejected(self):
+        payload = {"day_of_week": "Monday", "start_time": "09:00", "end_time": "09:10"}
+        response = self.client.post(reverse("doctor-availability"), payload)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("end_time", response.data)
+
+        schedule = {"slots": [{"day_of_week": "Monday", "start_time": "09:00", "end_time": "10:50"}]}
+        response = self.client.put(reverse("doctor-availability-bulk"), schedule, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Availability.objects.exists())
+
+
+class AvailabilityBulkTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="doctor_bulk",
+            email="doctor_bulk@example.com",
+            password="password123",
+            role="doctor"
+        )
+        self.doctor = self.user.doctor_profile
+        self.client.force_authenticate(self.user)
+        self.url = reverse("doctor-availability-bulk")
+
+    def test_overlap_detection_reports_exact_pairs(self):
+        slots = [
+            Availability(day_of_week="Monday", start_time=time(9), end_time=time(12)),
+            Availability(day_of_week="Monday", start_time=time(12), end_time=time(13)),
+            Availability(day_of_week="Monday", start_time=time(11), end_time=time(14)),
+            Availability(day_of_week="Tuesday", start_time=time(9), end_time=time(10)),
+        ]
+        for slot in slots:
+            slot.sync_compact()
+        pairs = [(a.start_time.hour, b.start_time.hour) for a, b in find_overlaps(slots)]
+        self.assertEqual(pairs, [(9, 11), (11, 12)])
+
+    def test_replace_keeps_matching_rows_and_validates_in_memory(self):
+        kept = Availability.objects.create(doctor=self.doctor, day_of_week="Monday", start_time="09:00", end_time="12:00")
+        Availability.objects.create(doctor=self.doctor, day_of_week="Friday", start_time="09:00", end_time="12:00")
+
+        payload = {"slots": [
+            {"day_of_week": "Monday", "start_time": "09:00", "end_time": "12:00"},
+            {"day_of_week": "Monday", "start_time": "13:00", "end_time": "17:00"},
+            {"day_of_week": "Tuesday", "start_time": "09:00", "end_time": "12:00"},
+        ]}
+        response = self.client.put(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["created"], response.data["deleted"]), (2, 1))
+        self.assertTrue(Availability.objects.filter(pk=kept.pk).exists())
+        self.assertEqual(Availability.objects.filter(doctor=self.doctor).count(), 3)
+
+    def test_conflicts_are_reported_and_nothing_is_written(self):
+        existing = Availability.objects.create(doctor=self.doctor, day_of_week="Monday", start_time="09:00", end_time="12:00")
+
+        payload = {"slots": [{"day_of_week": "Monday", "start_time": "11:00", "end_time": "13:00"}]}
+        response = self.client.patch(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        conflict = response.data["conflicts"][0]
+        self.assertEqual(conflict["first"]["id"], existing.pk)
+        self.assertEqual((conflict["second"]["start_time"], conflict["second"]["end_time"]), ("11:00", "13:00"))
+        self.assertEqual(Availability.objects.filter(doctor=self.doctor).count(), 1)
+
+        # Moving the existing slot out of the way in the same batch is fine
+        payload["slots"].append({"id": existing.pk, "day_of_week": "Monday", "start_time": "08:00", "end_time": "11:00"})
+        response = self.client.patch(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["created"], response.data["updated"]), (1, 1))
+
+    def test_upsert_cannot_move_booked_slots(self):
+        booked = Availability.objects.create(doctor=self.doctor, day_of_week="Monday", start_time=time(9), end_time=time(12))
+        patient = User.objects.create_user(
+            username="patient_bulk", email="patient_bulk@example.com", password="password123", role="patient"
+        ).patient_profile
+        monday = date.today() + timedelta(days=7 - date.today().weekday())
+        Appointment.objects.create(patient=patient, doctor=self.doctor, availability=booked, date=monday, time=time(10))
+
+        payload = {"slots": [{"id": booked.pk, "day_of_week": "Tuesday", "start_time": "09:00", "end_time": "12:00"}]}
+        response = self.client.patch(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        # Described as stored, not as requested
+        self.assertEqual(response.data["slots"][0], {
+            "id": booked.pk, "day_of_week": "Monday", "start_time": "09:00", "end_time": "12:00",
+        })
+        booked.refresh_from_db()
+        self.assertEqual(booked.day_of_week, "Monday")
+
+        Appointment.objects.update(status=Appointment.STATUS_CANCELLED)
+        self.assertEqual(self.client.patch(self.url, payload, format="json").status_code, status.HTTP_200_OK)
+
+    def test_replace_frees_slots_whose_appointments_are_cancelled(self):
+        booked = Availability.objects.create(doctor=self.doctor, day_of_week="Monday", start_time=time(9), end_time=time(12))
+        patient = User.objects.create_user(
+            username="patient_replace", email="patient_replace@example.com", password="password123", role="patient"
+        ).patient_profile
+        monday = date.today() + timedelta(days=7 - date.today().weekday())
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=self.doctor, availability=booked, date=monday, time=time(10)
+        )
+
+        payload = {"slots": [{"day_of_week": "Tuesday", "start_time": "09:00", "end_time": "12:00"}]}
+        self.assertEqual(self.client.put(self.url, payload, format="json").status_code, status.HTTP_409_CONFLICT)
+
+        Appointment.objects.update(status=Appointment.STATUS_CANCELLED)
+        response = self.client.put(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Availability.objects.filter(pk=booked.pk).exists())
+        appointment.refresh_from_db()
+        self.assertIsNone(appointment.availability_id)
+
+
+class AvailabilityGridTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create_user(
+            username="doctor_grid", email="doctor_grid@example.com", password="password123", role="doctor"
+        ).doctor_profile
+        self.slot = Availability.objects.create(
+            doctor=self.doctor, day_of_week="Wednesday", start_time="09:00", end_time="10:10"
+        )
+        today = date.today()
+        self.wednesday = today + timedelta(days=(2 - today.weekday()) % 7 or 7)
+
+    def test_compact_fields_follow_the_readable_ones(self):
+        self.assertEqual((self.slot.weekday, self.slot.start_minute, self.slot.end_minute), (2, 540, 610))
+
+        self.slot.day_of_week = "Friday"
+        self.slot.save(update_fields=["day_of_week"])
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.weekday, 4)
+
+    def test_availability_is_a_cached_bit_test(self):
+        self.assertEqual(slots.range_bits(540, 610), 0b1111 << 36)
+        self.assertTrue(slots.doctor_is_available(self.doctor.id, self.wednesday, time(9, 45)))
+
+        with self.assertNumQueries(0):
+            # The 10:00 slot is only partly covered
+            self.assertFalse(slots.doctor_is_available(self.doctor.id, self.wednesday, time(10)))
+            self.assertFalse(slots.doctor_is_available(self.doctor.id, self.wednesday + timedelta(days=1), time(9)))
+
+    def test_free_slots_skip_booked_times(self):
+        patient = User.objects.create_user(
+            username="patient_grid", email="patient_grid@example.com", password="password123", role="patient"
+        ).patient_profile
+        Appointment.objects.create(
+            patient=patient, doctor=self.doctor, date=self.wednesday, time=time(9, 15), duration_minutes=15
+        )
+
+        free = slots.free_slots([self.doctor.id], self.wednesday)
+        self.assertEqual(free[self.doctor.id], [time(9), time(9, 30), time(9, 45)])
+
+
+class AvailabilityOverrideTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="doctor_leave", email="doctor_leave@example.com", password="password123", role="doctor"
+        )
+        self.doctor = self.user.doctor_profile
+        Availability.objects.create(doctor=self.doctor, day_of_week="Monday", start_time="09:00", end_time="10:00")
+        today = date.today()
+        self.monday = today + timedelta(days=(7 - today.weekday()) % 7 or 7)
+        self.client.force_authenticate(self.user)
+
+    def _override(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("doctor-availability-overrides"), fields, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+    def test_overrides_merge_into_cached_month_calendar(self):
+        self.assertTrue(slots.doctor_is_available(self.doctor.id, self.monday, time(9)))
+
+        self._override(date=str(self.monday), kind="closed", reason="Conference")
+        self._override(date=str(self.monday), kind="extra", start_time="14:00", end_time="14:30")
+
+        self.assertFalse(slots.doctor_is_available(self.doctor.id, self.monday, time(9)))
+        with self.assertNumQueries(0):
+            self.assertTrue(slots.doctor_is_available(self.doctor.id, self.monday, time(14, 15)))
+            self.assertFalse(slots.doctor_is_available(self.doctor.id, self.monday, time(14, 30)))
+
+    def test_partial_closure_blocks_touched_slots(self):
+        bits = slots.range_bits(540, 660)
+        closed = slots.apply_overrides(bits, [("closed", time(9, 20), time(10))])
+        # 09:00-09:15 is untouched; 09:15-10:00 overlaps the closure
+        self.assertEqual(closed, slots.range_bits(540, 555) | slots.range_bits(600, 660))
+
+    def test_extra_hours_need_times_and_calendar_lists_slots(self):
+        response = self.client.post(
+            reverse("doctor-availability-overrides"), {"date": str(self.monday), "kind": "extra"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            reverse("doctor-calendar", args=[self.doctor.id]), {"month": self.monday.strftime("%Y-%m")}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["days"][str(self.monday.day)], ["09:00", "09:15", "09:30", "09:45"])
+
+
+class LocationSearchTests(APITestCase):
+    def setUp(self):
+        for username, location in (
+            ("doc_city", "Kigali"),
+            ("doc_district", "Remera, Kigali"),
+            ("doc_huye", "Butare"),
+        ):
+            user = User.objects.create_user(
+                username=username,
+                email=f"{username}@example.com",
+                password="password123",
+                role="doctor",
+            )
+            user.doctor_profile.location = location
+            user.doctor_profile.save()
+
+    def test_aliases_resolve_to_canonical_key(self):
+        self.assertEqual(normalize_location("KGL"), "kigali")
+        self.assertEqual(normalize_location(" Kigali  City "), "kigali")
+        self.assertEqual(normalize_location("Remera, Kigali"), "kigali/gasabo")
+        self.assertEqual(normalize_location("Butare"), "huye")
+
+    def test_city_search_includes_districts(self):
+        doctors = filter_by_location(DoctorProfile.objects.all(), "kgl")
+        self.assertEqual(
+            set(doctors.values_list("user__username", flat=True)),
+            {"doc_city", "doc_district"},
+        )
+
+
+class DoctorDirectoryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        for username, specialization, location in (
+            ("dir_cardio", "Cardiology", "Remera, Kigali"),
+            ("dir_derm", "Dermatology", "Kigali"),
+            ("dir_huye", "Cardiology", "Butare"),
+        ):
+            profile = User.objects.create_user(
+                username=username,
+                email=f"{username}@example.com",
+                password="password123",
+                role="doctor",
+            ).doctor_profile
+            profile.specialization = specialization
+            profile.location = location
+            profile.save()
+        self.url = reverse("doctor-directory")
+
+    def test_filters_and_flat_rows(self):
+        response = self.client.get(self.url, {"specialization": "cardiology", "location": "kgl"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["username"] for row in response.data["results"]], ["dir_cardio"])
+        self.assertNotIn("email", response.data["results"][0])
+
+    def test_cached_read_and_conditional_get(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.data["count"], 3)
+        etag = first["ETag"]
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = DoctorProfile.objects.get(user__username="dir_derm")
+            profile.years_of_experience = 12
+            profile.save()
+
+        third = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(third["ETag"], etag)
+
+    def test_username_change_refreshes_directory(self):
+        self.client.get(self.url)
+        user = User.objects.get(username="dir_huye")
+        user.username = "dir_butare"
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=["username"])
+
+        usernames = {row["username"] for row in self.client.get(self.url).data["results"]}
+        self.assertIn("dir_butare", usernames)
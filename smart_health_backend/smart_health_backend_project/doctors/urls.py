@@ -1,14 +1,24 @@
 from django.urls import path
 from .views import (
     DoctorProfileView,
+    DoctorDirectoryView,
     AvailabilityListCreateView,
+    AvailabilityBulkView,
     AvailabilityDetailView,
+    AvailabilityOverrideListCreateView,
+    AvailabilityOverrideDetailView,
+    DoctorCalendarView,
 )
 
 urlpatterns = [
     path("profile/", DoctorProfileView.as_view(), name="doctor-profile"),
+    path("directory/", DoctorDirectoryView.as_view(), name="doctor-directory"),
     path("availability/", AvailabilityListCreateView.as_view(), name="doctor-availability"),
+    path("availability/bulk/", AvailabilityBulkView.as_view(), name="doctor-availability-bulk"),
     path("availability/<int:pk>/", AvailabilityDetailView.as_view(), name="doctor-availability-detail"),
+    path("overrides/", AvailabilityOverrideListCreateView.as_view(), name="doctor-availability-overrides"),
+    path("overrides/<int:pk>/", AvailabilityOverrideDetailView.as_view(), name="doctor-availability-override-detail"),
+    path("<int:doctor_id>/calendar/", DoctorCalendarView.as_view(), name="doctor-calendar"),
 ]
 
 
@@ -1,8 +1,21 @@
-from rest_framework import generics, permissions
-from rest_framework.exceptions import NotFound
-from .models import DoctorProfile, Availability
-from .serializers import DoctorSerializer, AvailabilitySerializer
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from .directory import get_directory
+from .models import DoctorProfile, Availability, AvailabilityOverride
+from .schedule import MODE_REPLACE, MODE_UPSERT, save_schedule
+from .serializers import (
+    DoctorSerializer,
+    AvailabilitySerializer,
+    AvailabilityOverrideSerializer,
+    ScheduleSerializer,
+)
+from .slots import month_calendar, slot_time
 from users.permissions import IsDoctor
+from users.profiles import get_profile_id
 
 
 class DoctorProfileView(generics.RetrieveUpdateAPIView):
@@ -13,32 +26,97 @@ class DoctorProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated, IsDoctor]
 
     def get_object(self):
-        doctor = getattr(self.request.user, "doctor_profile", None)
+        doctor_id = get_profile_id(self.request, "doctor")
+        doctor = DoctorProfile.objects.select_related("user").filter(pk=doctor_id).first()
         if not doctor:
             raise NotFound("Doctor profile not found")
         return doctor
 
 
+class DoctorDirectoryView(generics.GenericAPIView):
+    """
+    Public doctor directory, optionally filtered by `specialization`
+    (exact, case-insensitive) and `location` (city or district).
+
+    Served from a cached read model with a strong ETag; clients that
+    send it back in If-None-Match get 304 Not Modified until a doctor
+    profile changes.
+    """
+    permission_classes = [permissions.AllowAny]
+    max_filter_length = 100
+
+    def get(self, request, *args, **kwargs):
+        specialization = request.query_params.get("specialization", "").strip()
+        location = request.query_params.get("location", "").strip()
+        if len(specialization) > self.max_filter_length or len(location) > self.max_filter_length:
+            return Response({"detail": "Filter values are too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        directory = get_directory(specialization, location)
+        response = get_conditional_response(request, etag=directory["etag"])
+        if response is None:
+            response = Response(
+                {"count": len(directory["results"]), "results": directory["results"]},
+                status=status.HTTP_200_OK,
+            )
+        response["ETag"] = directory["etag"]
+        # Always revalidate; a matching ETag makes that a bodiless 304
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+
 class AvailabilityListCreateView(generics.ListCreateAPIView):
     serializer_class = AvailabilitySerializer
     permission_classes = [permissions.IsAuthenticated, IsDoctor]
 
     def get_queryset(self):
-        doctor = getattr(self.request.user, "doctor_profile", None)
-        if not doctor:
+        doctor_id = get_profile_id(self.request, "doctor")
+        if not doctor_id:
             raise NotFound("Doctor profile not found")
-        return Availability.objects.filter(doctor=doctor)
+        return Availability.objects.filter(doctor_id=doctor_id)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        context["doctor"] = getattr(self.request.user, "doctor_profile", None)
+        context["doctor_id"] = get_profile_id(self.request, "doctor")
         return context
 
     def perform_create(self, serializer):
-        doctor = getattr(self.request.user, "doctor_profile", None)
-        instance = serializer.save(doctor=doctor)
-        instance.full_clean()
+        # Validate before the single INSERT instead of saving twice
+        instance = Availability(doctor_id=get_profile_id(self.request, "doctor"), **serializer.validated_data)
+        try:
+            instance.full_clean()
+        except DjangoValidationError as e:
+            raise ValidationError(e.messages)
         instance.save()
+        serializer.instance = instance
+
+
+class AvailabilityBulkView(generics.GenericAPIView):
+    """
+    Bulk edit of the doctor's weekly schedule in one transaction.
+    PUT replaces the whole schedule with `slots`; PATCH updates slots
+    that carry an `id` and adds the rest. Overlaps are reported as
+    pairs and nothing is saved.
+    """
+    serializer_class = ScheduleSerializer
+    permission_classes = [permissions.IsAuthenticated, IsDoctor]
+    http_method_names = ["put", "patch"]
+
+    def put(self, request, *args, **kwargs):
+        return self._save(request, MODE_REPLACE)
+
+    def patch(self, request, *args, **kwargs):
+        return self._save(request, MODE_UPSERT)
+
+    def _save(self, request, mode):
+        doctor_id = get_profile_id(request, "doctor")
+        if not doctor_id:
+            raise NotFound("Doctor profile not found")
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = save_schedule(doctor_id, serializer.validated_data["slots"], mode)
+        result["availability"] = AvailabilitySerializer(result["availability"], many=True).data
+        return Response(result, status=status.HTTP_200_OK)
 
 
 class AvailabilityDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -46,47 +124,77 @@ class AvailabilityDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated, IsDoctor]
 
     def get_queryset(self):
-        doctor = getattr(self.request.user, "doctor_profile", None)
-        if not doctor:
+        doctor_id = get_profile_id(self.request, "doctor")
+        if not doctor_id:
             raise NotFound("Doctor profile not found")
-        return Availability.objects.filter(doctor=doctor)
+        return Availability.objects.filter(doctor_id=doctor_id)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        context["doctor"] = getattr(self.request.user, "doctor_profile", None)
+        context["doctor_id"] = get_profile_id(self.request, "doctor")
         return context
 
 
+class AvailabilityOverrideListCreateView(generics.ListCreateAPIView):
+    """
+    The doctor's date overrides from today on: closures (leave,
+    holidays) and extra hours on top of the weekly schedule.
+    """
+    serializer_class = AvailabilityOverrideSerializer
+    permission_classes = [permissions.IsAuthenticated, IsDoctor]
 
+    def get_queryset(self):
+        doctor_id = get_profile_id(self.request, "doctor")
+        if not doctor_id:
+            raise NotFound("Doctor profile not found")
+        return AvailabilityOverride.objects.filter(doctor_id=doctor_id, date__gte=timezone.localdate())
 
+    def perform_create(self, serializer):
+        serializer.save(doctor_id=get_profile_id(self.request, "doctor"))
 
 
+class AvailabilityOverrideDetailView(generics.RetrieveDestroyAPIView):
+    serializer_class = AvailabilityOverrideSerializer
+    permission_classes = [permissions.IsAuthenticated, IsDoctor]
 
+    def get_queryset(self):
+        doctor_id = get_profile_id(self.request, "doctor")
+        if not doctor_id:
+            raise NotFound("Doctor profile not found")
+        return AvailabilityOverride.objects.filter(doctor_id=doctor_id)
 
 
+class DoctorCalendarView(generics.GenericAPIView):
+    """
+    A doctor's bookable slot start times for each day of `month`
+    (YYYY-MM, default the current month), weekly hours merged with
+    date overrides. Served from the cached month calendar.
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
+    def get(self, request, doctor_id, *args, **kwargs):
+        if not DoctorProfile.objects.filter(pk=doctor_id).exists():
+            raise NotFound("Doctor profile not found")
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        month = request.query_params.get("month")
+        try:
+            year, month = map(int, month.split("-")) if month else timezone.localdate().timetuple()[:2]
+            days = month_calendar(doctor_id, year, month)
+        except ValueError:
+            return Response({"detail": "month must look like YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "doctor": doctor_id,
+                "month": f"{year}-{month:02d}",
+                "days": {
+                    str(day): [slot_time(i).strftime("%H:%M") for i in range(bits.bit_length()) if bits >> i & 1]
+                    for day, bits in enumerate(days, start=1)
+                    if bits
+                },
+            },
+            status=status.HTTP_200_OK,
+        )
 
 # from rest_framework import generics, permissions
 # from rest_framework.exceptions import NotFound
@@ -46,6 +46,7 @@ def safe_send_sms(phone_number, message):
 TEMPLATE_ID_BOOKED = "d-6b56dc983e194751a2d6d4ec8f97a599"
 TEMPLATE_ID_CANCELLED = "d-1234567890abcdef1234567890abcdef"  # replace with actual
 TEMPLATE_ID_RESCHEDULED = "d-abcdef1234567890abcdef1234567890"  # replace with actual
+TEMPLATE_ID_SCHEDULE_CHANGES = "d-0f1e2d3c4b5a69788796a5b4c3d2e1f0"  # replace with actual
 
 # --------------------------------------------
 # APPOINTMENT BOOKED NOTIFICATION
@@ -114,13 +115,47 @@ def notify_appointment_rescheduled(patient, doctor, old_appointment, new_appoint
     )
 
     sms_status = safe_send_sms(
-        phone_number=patient.phone,
+        phone_number=patient.user.phone,
         message=f"Your appointment has been rescheduled to "
                 f"{new_appointment.date} at {new_appointment.time}."
     )
 
     return {"sg_email_sent": sg_email_status, "sms_sent": sms_status}
 
+# --------------------------------------------
+# SCHEDULE CHANGES NOTIFICATION (one per patient)
+# --------------------------------------------
+def notify_schedule_changes(patient, doctor, cancelled, rescheduled):
+    """
+    One email and one SMS covering all of a patient's changed
+    appointments with the doctor. `rescheduled` holds
+    (old_date, old_time, new_appointment) tuples.
+    """
+    changes = [
+        f"{old_date} at {old_time} moved to {appointment.date} at {appointment.time}"
+        for old_date, old_time, appointment in rescheduled
+    ] + [f"{appointment.date} at {appointment.time} cancelled" for appointment in cancelled]
+
+    dynamic_data = {
+        "patient_name": patient.user.get_full_name(),
+        "doctor_name": doctor.user.get_full_name(),
+        "changes": changes,
+    }
+
+    sg_email_status = safe_sendgrid_email(
+        to_email=patient.user.email,
+        template_id=TEMPLATE_ID_SCHEDULE_CHANGES,
+        dynamic_data=dynamic_data
+    )
+
+    sms_status = safe_send_sms(
+        phone_number=patient.user.phone,
+        message=f"Your appointments with Dr. {doctor.user.last_name} have changed: "
+                + "; ".join(changes) + "."
+    )
+
+    return {"sg_email_sent": sg_email_status, "sms_sent": sms_status}
+
 
 
 
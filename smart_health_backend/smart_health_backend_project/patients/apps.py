@@ -5,8 +5,6 @@ class PatientsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "patients"
 
-    def ready(self):
-        import patients.signals  # noqa
 
 
 
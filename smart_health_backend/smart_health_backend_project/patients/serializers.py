@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import PatientProfile
+from ai.summaries import schedule_summary_refresh
 
 
 class PatientSerializer(serializers.ModelSerializer):
@@ -29,6 +30,16 @@ class UpdatePatientSerializer(serializers.ModelSerializer):
         model = PatientProfile
         fields = ("age", "gender", "medical_history")
 
+    def update(self, instance, validated_data):
+        previous_history = instance.medical_history
+        instance = super().update(instance, validated_data)
+
+        # Precompute the AI summary so the summary endpoint can serve it instantly
+        if instance.medical_history != previous_history:
+            schedule_summary_refresh(instance.id)
+
+        return instance
+
 
 
 
@@ -12,7 +12,7 @@ class PatientProfileView(generics.RetrieveUpdateAPIView):
 
     def get_object(self):
         try:
-            return PatientProfile.objects.get(user=self.request.user)
+            return PatientProfile.objects.get(user_id=self.request.user.id)
         except PatientProfile.DoesNotExist:
             raise NotFound("Patient profile not found")
 
@@ -37,7 +37,7 @@ class GenerateReportView(generics.CreateAPIView):
         except ValueError:
             raise ValidationError({"detail": "Invalid date format. Use YYYY-MM-DD."})
 
-        report = serializer.save(generated_by=request.user)
+        report = serializer.save(generated_by_id=request.user.id)
 
         try:
             # Trigger Celery task asynchronously
@@ -9,6 +9,8 @@ from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv 
 import dj_database_url
+from corsheaders.defaults import default_headers
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
 
 # -----------------------
 # Load environment variables
@@ -175,18 +177,76 @@ AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.NumericPasswordValidator"},
 ]
 
-AUTHENTICATION_BACKENDS = ["django.contrib.auth.backends.ModelBackend"]
+AUTHENTICATION_BACKENDS = ["users.backends.PooledHashingBackend"]
+
+# Django's default hashing cost everywhere unless overridden; hashes are
+# never re-hashed to a lower count (users.hashing)
+PASSWORD_HASHERS = [
+    "users.hashing.ConfigurablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv("PASSWORD_PBKDF2_ITERATIONS", PBKDF2PasswordHasher.iterations))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 32))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 5))
+
+# -----------------------
+# Cache
+# -----------------------
+# Redis shared by all workers, fronted by a short-lived per-process L1
+# (see users.caching). Without REDIS_URL everything stays in local memory.
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_L1_SECONDS = int(os.getenv("CACHE_L1_SECONDS", 5))
+CACHE_STATS_FLUSH_EVERY = int(os.getenv("CACHE_STATS_FLUSH_EVERY", 100))
+DOCTOR_DIRECTORY_CACHE_SECONDS = int(os.getenv("DOCTOR_DIRECTORY_CACHE_SECONDS", 60 * 60))
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", 60 * 60 * 24))
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "smart_health",
+            "TIMEOUT": int(os.getenv("CACHE_DEFAULT_TIMEOUT", 300)),
+        },
+        "local": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "smart-health-l1",
+            "TIMEOUT": CACHE_L1_SECONDS,
+            "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_L1_MAX_ENTRIES", 10000))},
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "smart-health",
+        },
+    }
+
+# -----------------------
+# Appointments
+# -----------------------
+# Visit length for doctors who have not set their own (DoctorProfile.visit_minutes)
+APPOINTMENT_DEFAULT_MINUTES = int(os.getenv("APPOINTMENT_DEFAULT_MINUTES", 30))
+# How long a slot hold (appointments.holds) keeps a time for one patient
+SLOT_HOLD_MINUTES = int(os.getenv("SLOT_HOLD_MINUTES", 5))
+# Most appointments one bulk status change may touch
+APPOINTMENT_BULK_MAX = int(os.getenv("APPOINTMENT_BULK_MAX", 200))
+# How many days ahead a cleared doctor day looks for new times
+APPOINTMENT_RESCHEDULE_SEARCH_DAYS = int(os.getenv("APPOINTMENT_RESCHEDULE_SEARCH_DAYS", 14))
 
 # -----------------------
 # REST Framework
 # -----------------------
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework_simplejwt.authentication.JWTAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("users.authentication.ClaimsJWTAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_THROTTLE_CLASSES": (
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
-        "rest_framework.throttling.ScopedRateThrottle",
+        "users.throttling.SlidingAnonRateThrottle",
+        "users.throttling.SlidingUserRateThrottle",
+        "users.throttling.SlidingScopedRateThrottle",
     ),
     "DEFAULT_THROTTLE_RATES": {
         "anon": "20/min",
@@ -198,6 +258,9 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": int(os.getenv("PAGE_SIZE", 10)),
 }
 
+# Shared sliding-window throttle state (users.throttling); unset falls back to per-process counters
+THROTTLE_REDIS_URL = os.getenv("THROTTLE_REDIS_URL", REDIS_URL)
+
 # -----------------------
 # JWT
 # -----------------------
@@ -206,8 +269,17 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=int(os.getenv("REFRESH_TOKEN_DAYS", 7))),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_USER_CLASS": "users.authentication.ClaimsUser",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.RoleTokenRefreshSerializer",
 }
 
+AUTH_VERSION_CACHE_SECONDS = int(os.getenv("AUTH_VERSION_CACHE_SECONDS", 3600))
+# Used instead when the cache is per-process (no REDIS_URL)
+AUTH_VERSION_LOCAL_CACHE_SECONDS = int(os.getenv("AUTH_VERSION_LOCAL_CACHE_SECONDS", 5))
+PROFILE_CACHE_SECONDS = int(os.getenv("PROFILE_CACHE_SECONDS", 3600))
+TOKEN_PRUNE_BATCH_SIZE = int(os.getenv("TOKEN_PRUNE_BATCH_SIZE", 10_000))
+USER_IMPORT_MAX_ROWS = int(os.getenv("USER_IMPORT_MAX_ROWS", 5000))
+
 # -----------------------
 # Security
 # -----------------------
@@ -236,6 +308,9 @@ else:
     CORS_ALLOW_ALL_ORIGINS = False
     CORS_ALLOWED_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ALLOWED_ORIGINS", "").split(",") if origin]
 
+# Clients send Idempotency-Key on retried writes (users.idempotency)
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+
 CSRF_TRUSTED_ORIGINS = [origin.strip() for origin in os.getenv("CSRF_TRUSTED_ORIGINS", "").split(",") if origin]
 
 # -----------------------
@@ -244,6 +319,39 @@ CSRF_TRUSTED_ORIGINS = [origin.strip() for origin in os.getenv("CSRF_TRUSTED_ORI
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
+CELERY_BEAT_SCHEDULE = {
+    "prune-expired-tokens": {
+        "task": "users.tasks.prune_expired_tokens_task",
+        "schedule": int(os.getenv("TOKEN_PRUNE_INTERVAL_SECONDS", 60 * 60 * 6)),
+    },
+}
+
+# -----------------------
+# AI
+# -----------------------
+AI_RECOMMENDATION_TOP_K = int(os.getenv("AI_RECOMMENDATION_TOP_K", 5))
+AI_PROMPT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", 3000))
+AI_SUMMARY_CHUNK_TOKENS = int(os.getenv("AI_SUMMARY_CHUNK_TOKENS", 1500))
+
+# Seconds each AI endpoint may spend on the model before failing fast
+AI_ENDPOINT_DEADLINES = {
+    "symptom_checker": float(os.getenv("AI_DEADLINE_SYMPTOM_CHECKER", 8)),
+    "medical_summary": float(os.getenv("AI_DEADLINE_MEDICAL_SUMMARY", 15)),
+    "doctor_recommendation": float(os.getenv("AI_DEADLINE_DOCTOR_RECOMMENDATION", 8)),
+    "symptom_triage": float(os.getenv("AI_DEADLINE_SYMPTOM_TRIAGE", 30)),
+}
+AI_TRIAGE_PACK_SIZE = int(os.getenv("AI_TRIAGE_PACK_SIZE", 10))
+
+# Usage accounting (ai.usage): buffered bulk writes and cost estimates
+AI_USAGE_FLUSH_SIZE = int(os.getenv("AI_USAGE_FLUSH_SIZE", 50))
+AI_USAGE_FLUSH_SECONDS = int(os.getenv("AI_USAGE_FLUSH_SECONDS", 10))
+AI_USAGE_MAX_HOURS = int(os.getenv("AI_USAGE_MAX_HOURS", 24 * 90))
+AI_COST_PER_1K_PROMPT_TOKENS = float(os.getenv("AI_COST_PER_1K_PROMPT_TOKENS", 0.000075))
+AI_COST_PER_1K_RESPONSE_TOKENS = float(os.getenv("AI_COST_PER_1K_RESPONSE_TOKENS", 0.0003))
+AI_MAX_CONCURRENT_CALLS = int(os.getenv("AI_MAX_CONCURRENT_CALLS", 8))
+AI_HEDGE_ATTEMPTS = int(os.getenv("AI_HEDGE_ATTEMPTS", 2))
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", 5))
+AI_BREAKER_RECOVERY_SECONDS = int(os.getenv("AI_BREAKER_RECOVERY_SECONDS", 30))
 
 # -----------------------
 # Static files
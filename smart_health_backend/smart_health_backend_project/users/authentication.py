@@ -0,0 +1,91 @@
+from django.apps import apps
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import get_auth_version
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from access token claims.
+
+    Identity, role and profile IDs come straight from the token. The
+    profiles themselves are loaded lazily, and raise AttributeError when
+    the claim is empty so hasattr()/getattr() checks keep working.
+    """
+
+    # Loaded by the properties below, never read from the token
+    PROFILE_ATTRIBUTES = ("patient_profile", "doctor_profile")
+
+    def __getattr__(self, attr):
+        # TokenUser falls back to token.get(attr), which would turn a
+        # missing profile into None and make hasattr() report True
+        if attr in self.PROFILE_ATTRIBUTES:
+            raise AttributeError(f"User {self.id} has no {attr}")
+        return super().__getattr__(attr)
+
+    @cached_property
+    def id(self):
+        # simplejwt serializes the claim as a string; keep integer pk semantics
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def role(self):
+        return self.token.get("role", "")
+
+    @cached_property
+    def email(self):
+        return self.token.get("email", "")
+
+    @cached_property
+    def patient_profile_id(self):
+        return self.token.get("patient_profile_id")
+
+    @cached_property
+    def doctor_profile_id(self):
+        return self.token.get("doctor_profile_id")
+
+    @cached_property
+    def patient_profile(self):
+        return self._load_profile("patients", "PatientProfile", self.patient_profile_id)
+
+    @cached_property
+    def doctor_profile(self):
+        return self._load_profile("doctors", "DoctorProfile", self.doctor_profile_id)
+
+    @cached_property
+    def user(self):
+        """The full User row, for the rare code path that needs it."""
+        return apps.get_model("users", "User").objects.get(pk=self.id)
+
+    def _load_profile(self, app_label, model_name, profile_id):
+        if profile_id is None:
+            raise AttributeError(f"User {self.id} has no {model_name}")
+        model = apps.get_model(app_label, model_name)
+        try:
+            return model.objects.get(pk=profile_id)
+        except model.DoesNotExist:
+            raise AttributeError(f"{model_name} {profile_id} no longer exists")
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the token claims instead of loading
+    the user. The only per-request lookup is the user's auth version,
+    which lives in the cache; a mismatch means the token was revoked.
+
+    Tokens issued before auth_version was embedded fall back to the
+    regular database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if "auth_version" not in validated_token:
+            return super().get_user(validated_token)
+
+        user = ClaimsUser(validated_token)
+        if get_auth_version(user.id) != validated_token["auth_version"]:
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+        return user
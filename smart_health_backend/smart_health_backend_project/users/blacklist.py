@@ -0,0 +1,91 @@
+import time
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .caching import cache_is_shared
+
+logger = logging.getLogger("users")
+
+PRUNE_BATCH_SIZE = getattr(settings, "TOKEN_PRUNE_BATCH_SIZE", 10_000)
+
+
+# -------------------------------------------------
+# Cache-fronted blacklist state
+#
+# Only used with a shared cache: a per-process one would keep a token
+# "clean" in every worker but the one that blacklisted it.
+# -------------------------------------------------
+def _jti_key(jti) -> str:
+    return f"auth:jti:{jti}"
+
+
+def _ttl(exp) -> int:
+    # No point remembering a token past its own expiry
+    return max(int(exp - time.time()), 1)
+
+
+def mark_blacklisted(jti, exp):
+    if cache_is_shared():
+        cache.set(_jti_key(jti), 1, _ttl(exp))
+
+
+def mark_clean(jti, exp):
+    """Freshly minted tokens can't be blacklisted yet; skip their first lookup."""
+    if cache_is_shared():
+        cache.add(_jti_key(jti), 0, _ttl(exp))
+
+
+def is_blacklisted(jti, exp) -> bool:
+    """
+    Cached per JTI in both directions. Blacklisting overwrites the entry
+    (mark_blacklisted via the BlacklistedToken signal) and the clean
+    state is only ever written with add(), so a cache hit is always
+    authoritative; a miss falls back to the indexed jti lookup, as does
+    every check without a shared cache.
+    """
+    if not cache_is_shared():
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    key = _jti_key(jti)
+    state = cache.get(key)
+    if state is None:
+        state = int(BlacklistedToken.objects.filter(token__jti=jti).exists())
+        cache.add(key, state, _ttl(exp))
+    return bool(state)
+
+
+# -------------------------------------------------
+# Pruning
+# -------------------------------------------------
+def prune_expired_tokens(batch_size=None) -> int:
+    """
+    Deletes expired outstanding tokens (and their blacklist rows) in
+    primary-key batches.
+
+    Tokens are created with a fixed lifetime, so expired rows sit at the
+    low end of the id range: walking the pk index in order reaches them
+    first without needing an index on expires_at, and each batch is a
+    short transaction instead of one huge cascading DELETE.
+    """
+    batch_size = batch_size or PRUNE_BATCH_SIZE
+    cutoff = timezone.now()
+    total = 0
+
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=cutoff)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+
+    logger.info(f"Pruned {total} expired outstanding tokens")
+    return total
@@ -0,0 +1,190 @@
+import time
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+logger = logging.getLogger("users")
+
+NAMESPACES = ("doctors", "appointments", "ai", "reports")
+L1_TTL = getattr(settings, "CACHE_L1_SECONDS", 5)
+STATS_FLUSH_EVERY = getattr(settings, "CACHE_STATS_FLUSH_EVERY", 100)
+STAT_KINDS = ("l1_hits", "hits", "misses", "invalidations")
+
+_MISSING = object()
+
+
+# Backends whose entries live in one process; other workers never see them
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared(alias="default") -> bool:
+    """Whether every worker reads and writes the same `alias` cache."""
+    return settings.CACHES[alias]["BACKEND"] not in PROCESS_LOCAL_BACKENDS
+
+
+def _l1():
+    # Only worth having in front of a remote cache
+    return caches["local"] if "local" in settings.CACHES else None
+
+
+class Namespace:
+    """
+    A per-app slice of the cache. Keys are stored under Django's cache
+    versioning with the namespace's current version, so invalidate()
+    retires every key at once by moving to a new version; stale entries
+    simply expire.
+
+    With a "local" cache configured, values and the version are also
+    kept in process memory for CACHE_L1_SECONDS, so other workers see an
+    invalidation at most that late.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.version_key = f"cache:{name}:version"
+        self._pending = Counter()
+        self._lock = threading.Lock()
+
+    def _key(self, key) -> str:
+        return f"{self.name}:{key}"
+
+    def _version(self):
+        l1 = _l1()
+        version = l1.get(self.version_key) if l1 else None
+        if version is None:
+            version = cache.get(self.version_key)
+            if version is None:
+                cache.add(self.version_key, time.time_ns(), None)
+                version = cache.get(self.version_key)
+            if l1:
+                l1.set(self.version_key, version, L1_TTL)
+        return version
+
+    # -------------------------------------------------
+    # Reads and writes
+    # -------------------------------------------------
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        version = self._version()
+        full_keys = {self._key(key): key for key in keys}
+        found = {}
+
+        l1 = _l1()
+        if l1:
+            found = l1.get_many(list(full_keys), version=version)
+            self._record("l1_hits", len(found))
+
+        remaining = [k for k in full_keys if k not in found]
+        if remaining:
+            fetched = cache.get_many(remaining, version=version)
+            self._record("hits", len(fetched))
+            self._record("misses", len(remaining) - len(fetched))
+            if l1 and fetched:
+                l1.set_many(fetched, L1_TTL, version=version)
+            found.update(fetched)
+
+        return {full_keys[k]: value for k, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.set_many({key: value}, timeout)
+
+    def set_many(self, mapping, timeout=DEFAULT_TIMEOUT):
+        version = self._version()
+        values = {self._key(key): value for key, value in mapping.items()}
+        cache.set_many(values, timeout, version=version)
+        l1 = _l1()
+        if l1:
+            l1.set_many(values, L1_TTL, version=version)
+
+    def get_or_set(self, key, compute, timeout=DEFAULT_TIMEOUT):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value, timeout)
+        return value
+
+    def delete(self, key):
+        version = self._version()
+        cache.delete(self._key(key), version=version)
+        l1 = _l1()
+        if l1:
+            l1.delete(self._key(key), version=version)
+
+    def invalidate(self):
+        """Drops every key in the namespace (from other workers' L1 within CACHE_L1_SECONDS)."""
+        cache.set(self.version_key, time.time_ns(), None)
+        l1 = _l1()
+        if l1:
+            l1.delete(self.version_key)
+        self._record("invalidations")
+        logger.debug(f"Cache namespace '{self.name}' invalidated")
+
+    # -------------------------------------------------
+    # Stats
+    # -------------------------------------------------
+    def _stat_key(self, kind) -> str:
+        return f"cache:{self.name}:stats:{kind}"
+
+    def _record(self, kind, count=1):
+        if not count:
+            return
+        with self._lock:
+            self._pending[kind] += count
+            flush = sum(self._pending.values()) >= STATS_FLUSH_EVERY
+        if flush:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Adds this process's buffered counters to the shared totals."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        for kind, count in pending.items():
+            key = self._stat_key(kind)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                # Evicted between add and incr
+                cache.set(key, count, None)
+
+    def stats(self):
+        self.flush_stats()
+        totals = cache.get_many([self._stat_key(kind) for kind in STAT_KINDS])
+        stats = {kind: totals.get(self._stat_key(kind), 0) for kind in STAT_KINDS}
+        lookups = stats["l1_hits"] + stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["l1_hits"] + stats["hits"]) / lookups, 4) if lookups else None
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._pending.clear()
+        cache.delete_many([self._stat_key(kind) for kind in STAT_KINDS])
+
+
+_namespaces = {name: Namespace(name) for name in NAMESPACES}
+
+
+def get_namespace(name) -> Namespace:
+    try:
+        return _namespaces[name]
+    except KeyError:
+        raise ValueError(f"Unknown cache namespace '{name}', expected one of {', '.join(NAMESPACES)}")
+
+
+def invalidate_namespaces(*names):
+    for name in names:
+        get_namespace(name).invalidate()
+
+
+def cache_stats():
+    """{namespace: {l1_hits, hits, misses, invalidations, hit_ratio}} across all workers."""
+    return {name: namespace.stats() for name, namespace in _namespaces.items()}
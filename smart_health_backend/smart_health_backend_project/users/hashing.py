@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password, verify_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger("users")
+
+HASH_WORKERS = getattr(settings, "PASSWORD_HASH_WORKERS", 2)
+# Hashing jobs allowed to wait for a worker before new ones are refused
+HASH_QUEUE_SIZE = getattr(settings, "PASSWORD_HASH_QUEUE_SIZE", 32)
+HASH_QUEUE_TIMEOUT = getattr(settings, "PASSWORD_HASH_QUEUE_TIMEOUT", 5)
+
+# hashlib releases the GIL while deriving keys, so a few threads give real
+# parallelism while capping how many cores a login storm can take.
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_SIZE)
+
+
+class HashingBusy(APIException):
+    """Raised when the hashing queue stays full for HASH_QUEUE_TIMEOUT."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many concurrent sign-ins, please retry shortly."
+    default_code = "hashing_busy"
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the iteration count taken from settings.
+    Shares Django's algorithm name: existing hashes stay valid and are
+    upgraded on the next successful login, but never re-hashed down to a
+    lower count than they already have.
+    """
+    iterations = getattr(settings, "PASSWORD_PBKDF2_ITERATIONS", PBKDF2PasswordHasher.iterations)
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        return decoded["iterations"] < self.iterations
+
+
+# -------------------------------------------------
+# Bounded execution
+# -------------------------------------------------
+def _submit(fn, *args):
+    if not _slots.acquire(timeout=HASH_QUEUE_TIMEOUT):
+        logger.warning("Password hashing queue full; refusing request")
+        raise HashingBusy()
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def run_hashing(fn, *args):
+    """Runs a CPU-bound hashing call in the pool and waits for its result."""
+    return _submit(fn, *args).result()
+
+
+async def arun_hashing(fn, *args):
+    """Awaitable variant for async views; the event loop is never blocked."""
+    future = await asyncio.to_thread(_submit, fn, *args)
+    return await asyncio.wrap_future(future)
+
+
+# -------------------------------------------------
+# Password helpers
+# -------------------------------------------------
+def hash_password(raw_password):
+    return run_hashing(make_password, raw_password)
+
+
+def check_user_password(user, raw_password):
+    """
+    Verifies in the pool; a hash made with outdated parameters is
+    re-hashed there too, but saved from the calling thread so the
+    write uses the request's database connection.
+    """
+    is_correct, must_update = run_hashing(verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = hash_password(raw_password)
+        user.save(update_fields=["password"])
+    return is_correct
+
+
+async def ahash_password(raw_password):
+    return await arun_hashing(make_password, raw_password)
+
+
+async def acheck_user_password(user, raw_password):
+    is_correct, must_update = await arun_hashing(verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = await ahash_password(raw_password)
+        await user.asave(update_fields=["password"])
+    return is_correct
+
+
+# -------------------------------------------------
+# Bulk hashing (imports)
+# -------------------------------------------------
+def _init_hash_worker():
+    # Spawned workers start from a fresh interpreter
+    django.setup()
+
+
+def hashing_process_pool(processes=None):
+    """
+    Process pool for offline bulk hashing (the import_users command).
+    Workers are spawned rather than forked, since forking a process that
+    runs threads can deadlock; create one per import and reuse it.
+    """
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_hash_worker,
+    )
+
+
+def hash_if_changed(raw_password, encoded=None):
+    """New hash for raw_password, or None when `encoded` already matches it."""
+    if encoded and check_password(raw_password, encoded):
+        return None
+    return make_password(raw_password)
+
+
+def hash_many(raw_passwords, current_hashes, pool=None, chunksize=32):
+    """
+    hash_if_changed() over many passwords, for bulk imports that would
+    otherwise hash one row at a time. Runs in `pool` (see
+    hashing_process_pool) when given, otherwise in the bounded thread
+    pool shared with logins, so web requests never fork. Results keep
+    input order.
+    """
+    if not raw_passwords:
+        return []
+    if pool is not None:
+        return list(pool.map(hash_if_changed, raw_passwords, current_hashes, chunksize=chunksize))
+    futures = [_submit(hash_if_changed, raw, encoded) for raw, encoded in zip(raw_passwords, current_hashes)]
+    return [future.result() for future in futures]
+
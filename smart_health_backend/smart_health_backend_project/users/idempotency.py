@@ -0,0 +1,134 @@
+import json
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+logger = logging.getLogger("users")
+
+HEADER = "Idempotency-Key"
+KEY_TTL = getattr(settings, "IDEMPOTENCY_KEY_TTL_SECONDS", 60 * 60 * 24)
+LOCK_TTL = getattr(settings, "IDEMPOTENCY_LOCK_SECONDS", 60)
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyInUse(APIException):
+    """The first request with this key is still being processed."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is already in progress, retry shortly."
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyReused(APIException):
+    """The key was first used with a different request."""
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request."
+    default_code = "idempotency_key_reused"
+
+
+class _Replay(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+# -------------------------------------------------
+# Idempotent views
+#
+# The first response for a (user, method, path, key) is stored for
+# IDEMPOTENCY_KEY_TTL_SECONDS and replayed as-is on retries, so the view
+# (and its side effects, like notifications) runs once. A short lock
+# taken with cache.add() makes a retry that overtakes the original wait
+# with a 409 instead of running twice. 5xx responses are not stored so
+# they can be retried. If the cache is down, requests run normally.
+# -------------------------------------------------
+class IdempotentMixin:
+    """Honours the Idempotency-Key header on a DRF view's mutating methods."""
+    idempotent_methods = ("POST", "PUT", "PATCH", "DELETE")
+
+    _idempotency_key = None
+    _idempotency_lock = None
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # Also reached when the view raised an unhandled error (no finalize_response)
+            self._release_idempotency_lock()
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication, permissions and throttles still apply to retries
+        super().initial(request, *args, **kwargs)
+
+        key = request.headers.get(HEADER)
+        if not key or request.method not in self.idempotent_methods:
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: f"Must be at most {MAX_KEY_LENGTH} characters."})
+
+        storage_key = _storage_key(request, key)
+        fingerprint = _fingerprint(request)
+        try:
+            stored = cache.get(storage_key)
+            if stored is None and not cache.add(f"{storage_key}:lock", fingerprint, LOCK_TTL):
+                raise IdempotencyKeyInUse()
+        except APIException:
+            raise
+        except Exception as e:
+            logger.error(f"Idempotency store unavailable, processing request normally: {e}")
+            return
+
+        if stored is not None:
+            if stored["fingerprint"] != fingerprint:
+                raise IdempotencyKeyReused()
+            response = Response(stored["data"], status=stored["status"])
+            response["Idempotent-Replayed"] = "true"
+            raise _Replay(response)
+
+        self._idempotency_key = (storage_key, fingerprint)
+        self._idempotency_lock = f"{storage_key}:lock"
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self._idempotency_key is None or response.status_code >= 500:
+            return response
+
+        storage_key, fingerprint = self._idempotency_key
+        self._idempotency_key = None
+        try:
+            cache.set(
+                storage_key,
+                {"fingerprint": fingerprint, "status": response.status_code, "data": response.data},
+                KEY_TTL,
+            )
+        except Exception as e:
+            logger.error(f"Could not store idempotent response for {request.path}: {e}")
+        return response
+
+    def _release_idempotency_lock(self):
+        lock, self._idempotency_lock = self._idempotency_lock, None
+        if lock is None:
+            return
+        try:
+            cache.delete(lock)
+        except Exception as e:
+            logger.error(f"Could not release idempotency lock: {e}")
+
+
+def _storage_key(request, key) -> str:
+    user = request.user.pk if request.user and request.user.is_authenticated else "anon"
+    scope = f"{user}|{request.method}|{request.path}|{key}"
+    return f"idempotency:{hashlib.sha256(scope.encode('utf-8')).hexdigest()}"
+
+
+def _fingerprint(request) -> str:
+    body = json.dumps(request.data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
@@ -0,0 +1,285 @@
+import csv
+import json
+import time
+import logging
+from contextlib import nullcontext
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from doctors.locations import normalize_location
+from .hashing import hash_many, hashing_process_pool
+from .models import User
+from .profiles import invalidate_profiles
+from .registration import bulk_register_users, profile_model_for
+from .tokens import cache_auth_version
+
+logger = logging.getLogger("users")
+
+FORMATS = ("csv", "jsonl")
+USER_FIELDS = ("username", "role", "phone", "address")
+PROFILE_FIELDS = {
+    User.ROLE_PATIENT: ("age", "gender", "medical_history"),
+    User.ROLE_DOCTOR: ("specialization", "location", "years_of_experience"),
+}
+INTEGER_FIELDS = ("age", "years_of_experience")
+ALL_PROFILE_FIELDS = {field for fields in PROFILE_FIELDS.values() for field in fields}
+ROLES = dict(User.ROLE_CHOICES)
+
+
+# -------------------------------------------------
+# Parsing
+# -------------------------------------------------
+def read_rows(stream, fmt):
+    """Yields (line_number, row_dict) from a text stream of CSV or JSONL."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else {"__invalid__": True}
+    else:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+
+def clean_row(raw):
+    """
+    Returns (email, user_fields, profile_fields, password) with only the
+    columns the row actually provides, or raises ValueError.
+    """
+    if raw.get("__invalid__"):
+        raise ValueError("Line is not a JSON object")
+
+    values = {k.strip(): str(v).strip() for k, v in raw.items() if k and v not in (None, "")}
+
+    email = User.objects.normalize_email(values.get("email", ""))
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError(f"Invalid email '{email}'")
+
+    role = values.get("role")
+    if role is not None and role not in ROLES:
+        raise ValueError(f"Invalid role '{role}'")
+
+    user_fields = {f: values[f] for f in USER_FIELDS if f in values}
+    profile_fields = {}
+    for field in ALL_PROFILE_FIELDS:
+        if field not in values:
+            continue
+        value = values[field]
+        if field in INTEGER_FIELDS:
+            try:
+                value = int(value)
+            except ValueError:
+                raise ValueError(f"{field} must be a whole number")
+            if value < 0:
+                raise ValueError(f"{field} cannot be negative")
+        profile_fields[field] = value
+
+    return email, user_fields, profile_fields, values.get("password")
+
+
+def profile_values(role, profile_fields):
+    """The row's profile columns that apply to `role`'s profile model."""
+    values = {f: v for f, v in profile_fields.items() if f in PROFILE_FIELDS.get(role, ())}
+    if "location" in values:
+        # bulk_create/bulk_update skip DoctorProfile.save()
+        values["location_key"] = normalize_location(values["location"])
+    return values
+
+
+# -------------------------------------------------
+# Import
+# -------------------------------------------------
+def import_users(rows, chunk_size=1000, processes=None):
+    """
+    Upserts users (matched on email) and their profiles from
+    (line_number, row) pairs, chunk_size rows per transaction.
+
+    New users are bulk-created with their profiles; existing ones only
+    get the columns that differ, so re-running the same file is a no-op.
+    Passwords are hashed in one pool of `processes` worker processes for
+    the whole import (the command's case) or, with processes=None, in the
+    bounded hashing thread pool; a password that already matches is left
+    alone.
+    """
+    started = time.perf_counter()
+    report = {"rows": 0, "created": 0, "updated": 0, "unchanged": 0, "errors": []}
+    seen_emails, seen_usernames = set(), set()
+    chunk = []
+
+    with (hashing_process_pool(processes) if processes else nullcontext()) as pool:
+        for line_number, raw in rows:
+            report["rows"] += 1
+            try:
+                row = clean_row(raw)
+                email, user_fields = row[0], row[1]
+                if email in seen_emails:
+                    raise ValueError(f"Duplicate email '{email}' in file")
+                username = user_fields.get("username")
+                if username and username in seen_usernames:
+                    raise ValueError(f"Duplicate username '{username}' in file")
+            except ValueError as e:
+                report["errors"].append({"line": line_number, "error": str(e)})
+                continue
+
+            seen_emails.add(email)
+            if username:
+                seen_usernames.add(username)
+            chunk.append((line_number, *row))
+
+            if len(chunk) >= chunk_size:
+                _import_chunk(chunk, report, pool)
+                chunk = []
+
+        if chunk:
+            _import_chunk(chunk, report, pool)
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed else None
+    logger.info(
+        f"User import: {report['rows']} rows, {report['created']} created, "
+        f"{report['updated']} updated, {len(report['errors'])} errors in {elapsed:.2f}s"
+    )
+    return report
+
+
+def _import_chunk(chunk, report, pool):
+    existing = {u.email: u for u in User.objects.filter(email__in=[row[1] for row in chunk])}
+
+    # New or changed usernames must not belong to someone else already
+    wanted = {}
+    for row in chunk:
+        user = existing.get(row[1])
+        username = row[2].get("username") or (None if user else row[1])
+        if username and (user is None or user.username != username):
+            wanted[username] = row
+    taken = set(User.objects.filter(username__in=list(wanted)).values_list("username", flat=True))
+    for username in taken:
+        report["errors"].append({"line": wanted[username][0], "error": f"Username '{username}' is taken"})
+    rejected = {id(wanted[username]) for username in taken}
+    chunk = [row for row in chunk if id(row) not in rejected]
+
+    with_password = [row for row in chunk if row[4] is not None]
+    hashes = hash_many(
+        [row[4] for row in with_password],
+        [existing[row[1]].password if row[1] in existing else None for row in with_password],
+        pool=pool,
+    )
+    new_hashes = {row[1]: hashed for row, hashed in zip(with_password, hashes)}
+
+    with transaction.atomic():
+        created = _create_users([row for row in chunk if row[1] not in existing], new_hashes)
+        updated, revoked, moved = _update_users([row for row in chunk if row[1] in existing], existing, new_hashes)
+
+        def refresh_caches():
+            for user in revoked:
+                cache_auth_version(user.pk, user.auth_version)
+            for user_id in moved:
+                invalidate_profiles(user_id)
+
+        transaction.on_commit(refresh_caches)
+
+    report["created"] += created
+    report["updated"] += updated
+    report["unchanged"] += len(chunk) - created - updated
+
+
+def _create_users(rows, new_hashes):
+    users, profiles = [], []
+    for _, email, user_fields, profile_fields, _ in rows:
+        fields = {"role": User.ROLE_PATIENT, "username": email, **user_fields}
+        fields["username"] = User.normalize_username(fields["username"])
+        users.append(User(email=email, password=new_hashes.get(email) or make_password(None), **fields))
+        profiles.append(profile_values(fields["role"], profile_fields))
+    bulk_register_users(users, profile_fields=profiles)
+    return len(users)
+
+
+def _update_users(rows, existing, new_hashes):
+    """
+    Applies changed columns with one bulk_update per model. Password or
+    claim field changes bump auth_version, as User.save() would.
+    Returns (updated_count, revoked_users, user_ids_with_new_profiles).
+    """
+    users = [existing[row[1]] for row in rows]
+    profiles = _existing_profiles(users)
+
+    changed_users, changed_fields = [], set()
+    profile_updates, new_profiles = {}, {}
+    revoked, moved = [], []
+    updated = 0
+
+    for _, email, user_fields, profile_fields, _ in rows:
+        user = existing[email]
+        fields = {f for f, value in user_fields.items() if getattr(user, f) != value}
+        for field in fields:
+            setattr(user, field, user_fields[field])
+
+        if new_hashes.get(email):
+            user.password = new_hashes[email]
+            fields.add("password")
+        if {"password", *User.CLAIM_FIELDS} & fields:
+            user.auth_version += 1
+            fields.add("auth_version")
+            revoked.append(user)
+        if "role" in fields:
+            moved.append(user.pk)
+        if fields:
+            changed_users.append(user)
+            changed_fields |= fields
+
+        model = profile_model_for(user.role)
+        profile_fields = profile_values(user.role, profile_fields)
+        profile_changed = False
+        if model is not None:
+            profile = profiles.get((model, user.pk))
+            if profile is None:
+                new_profiles.setdefault(model, []).append(model(user=user, **profile_fields))
+                moved.append(user.pk)
+                profile_changed = True
+            else:
+                diff = {f for f, value in profile_fields.items() if getattr(profile, f) != value}
+                for field in diff:
+                    setattr(profile, field, profile_fields[field])
+                if diff:
+                    instances, all_fields = profile_updates.setdefault(model, ([], set()))
+                    instances.append(profile)
+                    all_fields |= diff
+                    profile_changed = True
+
+        updated += bool(fields or profile_changed)
+
+    if changed_users:
+        User.objects.bulk_update(changed_users, sorted(changed_fields))
+    for model, (instances, fields) in profile_updates.items():
+        model.objects.bulk_update(instances, sorted(fields))
+    for model, instances in new_profiles.items():
+        model.objects.bulk_create(instances)
+
+    return updated, revoked, moved
+
+
+def _existing_profiles(users):
+    """{(profile_model, user_id): profile} for the users' current roles, one query per model."""
+    by_model = {}
+    for user in users:
+        model = profile_model_for(user.role)
+        if model is not None:
+            by_model.setdefault(model, []).append(user.pk)
+    return {
+        (model, profile.user_id): profile
+        for model, ids in by_model.items()
+        for profile in model.objects.filter(user_id__in=ids)
+    }
@@ -0,0 +1,95 @@
+import itertools
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from ai.usage import percentile
+from users.models import User
+from users.registration import register_user
+
+
+class Command(BaseCommand):
+    help = (
+        "Floods the login endpoint from concurrent clients and measures "
+        "logins/sec plus the latency of an unrelated endpoint during the "
+        "storm. The benchmark user is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--probes", type=int, default=100)
+
+    def handle(self, *args, **options):
+        username = f"bench_login_{int(time.time())}"
+        password = secrets.token_urlsafe(16)
+        user = register_user(
+            username=username, email=f"{username}@example.com", password=password, role=User.ROLE_PATIENT
+        )
+        self.login_url = reverse("users:login")
+        self.credentials = {"username": username, "password": password}
+        # Distinct client addresses so the anon throttle doesn't cut the storm short
+        self.addresses = (f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in itertools.count(1))
+        self.address_lock = threading.Lock()
+
+        try:
+            access = self._login()[1]
+            probe_url = reverse("patient-profile")
+            probe_headers = {"HTTP_AUTHORIZATION": f"Bearer {access}"}
+
+            baseline = self._probe(probe_url, probe_headers, options["probes"], threading.Event())
+
+            done = threading.Event()
+            with ThreadPoolExecutor(max_workers=1) as prober:
+                during = prober.submit(self._probe, probe_url, probe_headers, options["probes"], done)
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                    statuses = list(pool.map(lambda _: self._login()[0], range(options["logins"])))
+                elapsed = time.perf_counter() - started
+                done.set()
+                storm = during.result()
+        finally:
+            user.delete()
+
+        succeeded = statuses.count(200)
+        self.stdout.write(f"Logins: {len(statuses)} ({succeeded} ok, {statuses.count(503)} shed) in {elapsed:.2f}s")
+        self.stdout.write(f"Logins/sec          : {succeeded / elapsed:.1f}")
+        self.stdout.write(f"Unrelated p50/p99   : {self._fmt(baseline, 50)} / {self._fmt(baseline, 99)} ms (idle)")
+        self.stdout.write(f"Unrelated p50/p99   : {self._fmt(storm, 50)} / {self._fmt(storm, 99)} ms (storm)")
+
+    def _login(self):
+        with self.address_lock:
+            address = next(self.addresses)
+        try:
+            response = Client(REMOTE_ADDR=address).post(
+                self.login_url, self.credentials, content_type="application/json"
+            )
+            access = response.json().get("access") if response.status_code == 200 else None
+            return response.status_code, access
+        finally:
+            connection.close()
+
+    def _probe(self, url, headers, count, stop):
+        """Latencies (ms) of `count` requests, or until `stop` is set."""
+        client = Client()
+        latencies = []
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                client.get(url, **headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if stop.is_set():
+                    break
+        finally:
+            connection.close()
+        return sorted(latencies)
+
+    def _fmt(self, latencies, pct):
+        value = percentile(latencies, pct)
+        return f"{value:.1f}" if value is not None else "-"
@@ -0,0 +1,89 @@
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ai.usage import percentile
+from users.blacklist import prune_expired_tokens
+from users.registration import register_user
+from users.serializers import RoleTokenRefreshSerializer
+from users.tokens import RoleRefreshToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a large outstanding/blacklisted token history and measures "
+        "blacklist checks, full refresh latency and pruning. All rows are "
+        "rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tokens", type=int, default=10_000_000)
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument("--refreshes", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            username = f"bench_refresh_{int(time.time())}"
+            user = register_user(username=username, email=f"{username}@example.com", password=uuid4().hex)
+
+            started = time.perf_counter()
+            self._seed(user, options["tokens"], options["batch_size"])
+            self.stdout.write(f"Seeded {options['tokens']} tokens in {time.perf_counter() - started:.1f}s")
+
+            tokens = [RoleRefreshToken.for_user(user) for _ in range(options["refreshes"])]
+            stock = self._time(lambda token: RefreshToken.check_blacklist(token), tokens)
+            cached = self._time(lambda token: token.check_blacklist(), tokens)
+
+            current = str(RoleRefreshToken.for_user(user))
+            refresh_latencies = []
+            for _ in range(options["refreshes"]):
+                serializer = RoleTokenRefreshSerializer(data={"refresh": current})
+                started = time.perf_counter()
+                serializer.is_valid(raise_exception=True)
+                refresh_latencies.append((time.perf_counter() - started) * 1000)
+                current = serializer.validated_data["refresh"]
+
+            started = time.perf_counter()
+            pruned = prune_expired_tokens()
+            prune_seconds = time.perf_counter() - started
+
+            self.stdout.write(f"Blacklist check (DB)     : p50 {self._fmt(stock, 50)} / p99 {self._fmt(stock, 99)} ms")
+            self.stdout.write(f"Blacklist check (cached) : p50 {self._fmt(cached, 50)} / p99 {self._fmt(cached, 99)} ms")
+            refresh_latencies.sort()
+            self.stdout.write(
+                f"Full refresh             : p50 {self._fmt(refresh_latencies, 50)} / "
+                f"p99 {self._fmt(refresh_latencies, 99)} ms"
+            )
+            self.stdout.write(f"Pruned {pruned} expired tokens in {prune_seconds:.1f}s")
+
+            transaction.set_rollback(True)
+
+    def _seed(self, user, total, batch_size):
+        """Half of the history is expired, and every other token is blacklisted."""
+        now = timezone.now()
+        for start in range(0, total, batch_size):
+            size = min(batch_size, total - start)
+            expires_at = now - timedelta(days=1) if start < total // 2 else now + timedelta(days=7)
+            outstanding = OutstandingToken.objects.bulk_create([
+                OutstandingToken(user=user, jti=uuid4().hex, token="", created_at=now, expires_at=expires_at)
+                for _ in range(size)
+            ])
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in outstanding[::2]])
+
+    def _time(self, check, tokens):
+        latencies = []
+        for token in tokens:
+            started = time.perf_counter()
+            check(token)
+            latencies.append((time.perf_counter() - started) * 1000)
+        return sorted(latencies)
+
+    def _fmt(self, latencies, pct):
+        value = percentile(latencies, pct)
+        return f"{value:.3f}" if value is not None else "-"
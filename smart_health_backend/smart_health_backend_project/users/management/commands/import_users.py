@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.importer import FORMATS, import_users, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports users with their patient/doctor profiles from a CSV or JSONL "
+        "file, upserting on email. Re-running the same file changes nothing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--processes", type=int, default=os.cpu_count(), help="Password hashing processes (default: one per CPU)"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Cannot infer format from '{path}', pass --format")
+
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as stream:
+                report = import_users(
+                    read_rows(stream, fmt),
+                    chunk_size=options["chunk_size"],
+                    processes=options["processes"],
+                )
+        except OSError as e:
+            raise CommandError(f"Cannot read '{path}': {e}")
+
+        for error in report["errors"][:50]:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        self.stdout.write(
+            f"Rows: {report['rows']}, created: {report['created']}, updated: {report['updated']}, "
+            f"unchanged: {report['unchanged']}, errors: {len(report['errors'])}"
+        )
+        self.stdout.write(f"{report['rows_per_second']} rows/sec ({report['seconds']}s)")
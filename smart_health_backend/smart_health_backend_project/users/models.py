@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 
 
@@ -18,8 +18,44 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default=ROLE_PATIENT)
     phone = models.CharField(max_length=20, blank=True)
     address = models.CharField(max_length=255, blank=True)
+    # Embedded in access tokens; bumping it revokes every token issued before
+    auth_version = models.PositiveIntegerField(default=0, editable=False)
 
     REQUIRED_FIELDS = ["email"]
+    # Copied into access token claims (users.tokens); changing any of
+    # them must revoke tokens that carry the old values
+    CLAIM_FIELDS = ("is_active", "role", "username", "email", "is_staff", "is_superuser")
 
     def __str__(self):
         return f"{self.username} ({self.role})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_auth_state = instance._auth_state()
+        return instance
+
+    def _auth_state(self):
+        return tuple(self.__dict__.get(field) for field in self.CLAIM_FIELDS)
+
+    def save(self, *args, **kwargs):
+        """
+        Password changes and changes to any CLAIM_FIELDS bump auth_version
+        so tokens carrying the old claims stop authenticating.
+        """
+        revoke = not self._state.adding and (
+            self._password is not None
+            or getattr(self, "_loaded_auth_state", self._auth_state()) != self._auth_state()
+        )
+        if revoke:
+            self.auth_version += 1
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "auth_version"}
+
+        super().save(*args, **kwargs)
+        self._loaded_auth_state = self._auth_state()
+
+        if revoke:
+            from .tokens import cache_auth_version
+            transaction.on_commit(lambda: cache_auth_version(self.pk, self.auth_version))
@@ -1,12 +1,15 @@
 from rest_framework.permissions import BasePermission
 
+from .models import User
+from .profiles import get_profile_id, resolve_profiles
+
 
 class IsPatient(BasePermission):
     """
     Allows access only to users with a patient profile.
     """
     def has_permission(self, request, view):
-        return request.user.is_authenticated and hasattr(request.user, "patient_profile")
+        return get_profile_id(request, "patient") is not None
 
 
 class IsDoctor(BasePermission):
@@ -14,7 +17,7 @@ class IsDoctor(BasePermission):
     Allows access only to users with a doctor profile.
     """
     def has_permission(self, request, view):
-        return request.user.is_authenticated and hasattr(request.user, "doctor_profile")
+        return get_profile_id(request, "doctor") is not None
 
 
 class IsAdmin(BasePermission):
@@ -24,7 +27,7 @@ class IsAdmin(BasePermission):
     def has_permission(self, request, view):
         return (
             request.user.is_authenticated and
-            (request.user.is_staff or request.user.role == "admin")
+            (request.user.is_staff or resolve_profiles(request)["role"] == User.ROLE_ADMIN)
         )
 
 # class IsAdminUserForReports(BasePermission):
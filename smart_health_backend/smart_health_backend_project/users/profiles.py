@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .authentication import ClaimsUser
+from .models import User
+
+PROFILE_CACHE_TTL = getattr(settings, "PROFILE_CACHE_SECONDS", 60 * 60)
+
+EMPTY_PROFILES = {"role": "", "patient_profile_id": None, "doctor_profile_id": None}
+
+
+def _profiles_cache_key(user_id) -> str:
+    return f"users:profiles:{user_id}"
+
+
+def invalidate_profiles(user_id):
+    cache.delete(_profiles_cache_key(user_id))
+
+
+def _from_claims(user):
+    """
+    Token claims are trusted when they already hold the profile of the
+    user's role; otherwise the profile may have been created after login.
+    """
+    profiles = {
+        "role": user.role,
+        "patient_profile_id": user.patient_profile_id,
+        "doctor_profile_id": user.doctor_profile_id,
+    }
+    if user.role not in (User.ROLE_PATIENT, User.ROLE_DOCTOR):
+        return profiles
+    if profiles[f"{user.role}_profile_id"] is not None:
+        return profiles
+    return None
+
+
+def _load_profiles(user_id):
+    row = (
+        User.objects.filter(pk=user_id)
+        .values("role", "patient_profile__id", "doctor_profile__id")
+        .first()
+    )
+    if row is None:
+        return dict(EMPTY_PROFILES)
+    return {
+        "role": row["role"],
+        "patient_profile_id": row["patient_profile__id"],
+        "doctor_profile_id": row["doctor_profile__id"],
+    }
+
+
+def resolve_profiles(request) -> dict:
+    """
+    {"role", "patient_profile_id", "doctor_profile_id"} of the request user.
+
+    Resolved once per request (memoized on the request), then from token
+    claims, then from the cache, and only on a miss with one query.
+    Cache entries are dropped by the profile signals in users.signals.
+    """
+    user = request.user
+    if not user or not user.is_authenticated:
+        return dict(EMPTY_PROFILES)
+
+    memo = getattr(request, "_resolved_profiles", None)
+    if memo is not None and memo[0] == user.id:
+        return memo[1]
+
+    profiles = _from_claims(user) if isinstance(user, ClaimsUser) else None
+    if profiles is None:
+        key = _profiles_cache_key(user.id)
+        profiles = cache.get(key)
+        if profiles is None:
+            profiles = _load_profiles(user.id)
+            cache.set(key, profiles, PROFILE_CACHE_TTL)
+
+    request._resolved_profiles = (user.id, profiles)
+    return profiles
+
+
+def get_profile_id(request, kind):
+    """ID of the request user's "patient" or "doctor" profile, or None."""
+    return resolve_profiles(request)[f"{kind}_profile_id"]
@@ -0,0 +1,72 @@
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .hashing import hash_password
+from .models import User
+
+# Profile model created for each role; other roles get no profile
+PROFILE_MODELS = {
+    User.ROLE_PATIENT: ("patients", "PatientProfile"),
+    User.ROLE_DOCTOR: ("doctors", "DoctorProfile"),
+}
+
+
+def profile_model_for(role):
+    target = PROFILE_MODELS.get(role)
+    return apps.get_model(*target) if target else None
+
+
+def create_profile(user):
+    """
+    Creates the profile matching user.role with a single INSERT.
+    Called from the post_save receiver for newly created users only.
+    """
+    model = profile_model_for(user.role)
+    if model is None:
+        return None
+    return model.objects.create(user=user)
+
+
+def register_user(password=None, **fields):
+    """
+    Creates a user and its profile in one transaction, so a failed
+    profile insert never leaves a user without one. The password is
+    hashed in the bounded pool before the transaction opens.
+    """
+    fields["username"] = User.normalize_username(fields["username"])
+    fields["email"] = User.objects.normalize_email(fields.get("email"))
+    user = User(**fields)
+    user.password = hash_password(password) if password is not None else make_password(None)
+
+    with transaction.atomic():
+        user.save()
+    return user
+
+
+def bulk_register_users(users, batch_size=500, profile_fields=None):
+    """
+    Inserts unsaved User instances (passwords already hashed) and their
+    profiles with bulk_create, in one transaction. profile_fields, when
+    given, is a list aligned with users of extra profile field values.
+
+    bulk_create sends no post_save, so profiles are created here:
+    one INSERT per batch and role instead of one per user.
+    """
+    profile_fields = profile_fields or [{}] * len(users)
+
+    with transaction.atomic():
+        created = User.objects.bulk_create(users, batch_size=batch_size)
+
+        by_role = {}
+        for user, fields in zip(created, profile_fields):
+            by_role.setdefault(user.role, []).append((user, fields))
+
+        for role, members in by_role.items():
+            model = profile_model_for(role)
+            if model is not None:
+                model.objects.bulk_create(
+                    [model(user=user, **fields) for user, fields in members], batch_size=batch_size
+                )
+
+    return created
@@ -1,5 +1,13 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import mark_clean
+from .importer import FORMATS
 from .models import User
+from .registration import register_user
+from .tokens import RoleRefreshToken, get_auth_version
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -20,9 +28,42 @@ class RegisterSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        return User.objects.create_user(**validated_data)
+        return register_user(**validated_data)
 
 
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh with RoleRefreshToken: cache-fronted blacklist check, revoked
+    auth versions rejected, and the rotated token pre-marked as clean.
+    """
+    token_class = RoleRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        version = refresh.payload.get("auth_version")
+        if version is not None and get_auth_version(refresh[api_settings.USER_ID_CLAIM]) != version:
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+        data = super().validate(attrs)
+        if "refresh" in data:
+            rotated = self.token_class(data["refresh"], verify=False)
+            mark_clean(rotated[api_settings.JTI_CLAIM], rotated["exp"])
+        return data
+
+
+class UserImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=FORMATS, required=False)
+
+    def validate(self, attrs):
+        if "format" not in attrs:
+            extension = attrs["file"].name.rsplit(".", 1)[-1].lower()
+            if extension not in FORMATS:
+                raise serializers.ValidationError({"format": "Cannot infer format from the file name."})
+            attrs["format"] = extension
+        return attrs
@@ -1,20 +1,74 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from users.blacklist import mark_blacklisted
+from users.caching import invalidate_namespaces
 from users.models import User
+from users.profiles import invalidate_profiles
+from users.registration import create_profile
+
+# The only profile-creation receiver; patients/doctors register none of their own
+@receiver(post_save, sender=User)
+def create_profiles(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    create_profile(instance)
+
 
+# Keep the cached profile resolution (users.profiles) in step with the rows
 @receiver(post_save, sender=User)
-def create_profiles(sender, instance, created, **kwargs):
+def invalidate_user_profiles(sender, instance, created, **kwargs):
     if not created:
+        invalidate_profiles(instance.pk)
+
+
+@receiver(post_save, sender="patients.PatientProfile")
+@receiver(post_save, sender="doctors.DoctorProfile")
+@receiver(post_delete, sender="patients.PatientProfile")
+@receiver(post_delete, sender="doctors.DoctorProfile")
+def invalidate_profile_owner(sender, instance, created=True, **kwargs):
+    # Profile edits don't change the resolution; creation and deletion do
+    if created:
+        invalidate_profiles(instance.user_id)
+
+
+# Blacklisting from any path (rotation, logout, admin) must beat the JTI cache
+@receiver(post_save, sender=BlacklistedToken)
+def cache_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        mark_blacklisted(instance.token.jti, instance.token.expires_at.timestamp())
+
+
+# -------------------------------------------------
+# Cache namespaces (bulk writes bypass these and invalidate explicitly)
+# -------------------------------------------------
+@receiver(post_save, sender="doctors.DoctorProfile")
+@receiver(post_delete, sender="doctors.DoctorProfile")
+@receiver(post_save, sender="doctors.Availability")
+@receiver(post_delete, sender="doctors.Availability")
+@receiver(post_save, sender="doctors.AvailabilityOverride")
+@receiver(post_delete, sender="doctors.AvailabilityOverride")
+def invalidate_doctor_caches(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_namespaces("doctors", "appointments"))
+
+
+@receiver(post_save, sender=User)
+def invalidate_doctor_directory(sender, instance, created, update_fields=None, **kwargs):
+    # The doctor directory (doctors.directory) denormalizes these user columns
+    if created or (update_fields is not None and not {"username", "is_active", "role"} & set(update_fields)):
         return
+    if instance.role == User.ROLE_DOCTOR or (
+        apps.get_model("doctors", "DoctorProfile").objects.filter(user_id=instance.pk).exists()
+    ):
+        transaction.on_commit(lambda: invalidate_namespaces("doctors"))
 
-    if instance.role == User.ROLE_PATIENT:
-        PatientProfile = apps.get_model("patients", "PatientProfile")
-        PatientProfile.objects.get_or_create(user=instance)
 
-    elif instance.role == User.ROLE_DOCTOR:
-        DoctorProfile = apps.get_model("doctors", "DoctorProfile")
-        DoctorProfile.objects.get_or_create(user=instance)
+@receiver(post_save, sender="appointments.Appointment")
+@receiver(post_delete, sender="appointments.Appointment")
+def invalidate_appointment_caches(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_namespaces("appointments", "reports"))
 
 
 
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .blacklist import prune_expired_tokens
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={"max_retries": 3})
+def prune_expired_tokens_task(self):
+    """Periodic (CELERY_BEAT_SCHEDULE): drops expired outstanding/blacklisted tokens."""
+    return prune_expired_tokens()
@@ -1,3 +1,520 @@
-from django.test import TestCase
+import io
+import threading
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from doctors.locations import normalize_location
+from doctors.models import Availability, DoctorProfile
+from patients.models import PatientProfile
+
+from . import hashing
+from .authentication import ClaimsJWTAuthentication, ClaimsUser
+from .blacklist import prune_expired_tokens
+from .caching import get_namespace
+from .idempotency import IdempotentMixin
+from .importer import import_users, read_rows
+from .models import User
+from .permissions import IsDoctor, IsPatient
+from .profiles import get_profile_id, resolve_profiles
+from .registration import bulk_register_users, register_user
+from .throttling import LocalWindowStore, SlidingUserRateThrottle
+from .tokens import AUTH_VERSION_LOCAL_TTL, AUTH_VERSION_TTL, RoleRefreshToken, cache_auth_version
+
+
+class StatelessJWTTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="jwtpatient", email="jwtpatient@example.com", password="pass1234", role=User.ROLE_PATIENT
+        )
+        self.factory = APIRequestFactory()
+
+    def _authenticate(self, token):
+        request = self.factory.get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return ClaimsJWTAuthentication().authenticate(request)
+
+    def test_login_embeds_role_and_profile_claims(self):
+        response = APIClient().post(
+            reverse("users:login"), {"username": "jwtpatient", "password": "pass1234"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        user, token = self._authenticate(response.data["access"])
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual(user.role, User.ROLE_PATIENT)
+        self.assertEqual(user.patient_profile_id, self.user.patient_profile.id)
+        self.assertIsNone(user.doctor_profile_id)
+        self.assertEqual(user.patient_profile.pk, self.user.patient_profile.id)
+        self.assertFalse(hasattr(user, "doctor_profile"))
+        self.assertIsNone(getattr(user, "doctor_profile", None))
+
+    def test_authentication_and_permissions_need_no_queries(self):
+        access = str(RoleRefreshToken.for_user(self.user).access_token)
+
+        with self.assertNumQueries(0):
+            user, _ = self._authenticate(access)
+            request = self.factory.get("/")
+            request.user = user
+            self.assertTrue(IsPatient().has_permission(request, None))
+            self.assertFalse(IsDoctor().has_permission(request, None))
+
+    def test_password_change_revokes_issued_tokens(self):
+        access = str(RoleRefreshToken.for_user(self.user).access_token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("newpass5678")
+            self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(access)
+
+        fresh = str(RoleRefreshToken.for_user(self.user).access_token)
+        user, _ = self._authenticate(fresh)
+        self.assertEqual(user.id, self.user.id)
+
+    def test_per_process_cache_holds_auth_version_briefly(self):
+        with patch.object(cache, "set") as cache_set:
+            cache_auth_version(self.user.pk, 3)
+        self.assertEqual(cache_set.call_args.args[2], AUTH_VERSION_LOCAL_TTL)
+
+        with patch("users.tokens.cache_is_shared", return_value=True), patch.object(cache, "set") as cache_set:
+            cache_auth_version(self.user.pk, 3)
+        self.assertEqual(cache_set.call_args.args[2], AUTH_VERSION_TTL)
+
+    def test_admin_demotion_revokes_issued_tokens(self):
+        admin = User.objects.create_user(
+            username="jwtadmin", email="jwtadmin@example.com", password="pass1234",
+            role=User.ROLE_ADMIN, is_staff=True, is_superuser=True,
+        )
+        access = str(RoleRefreshToken.for_user(admin).access_token)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(client.get(reverse("users:cache_stats")).status_code, 200)
+
+        admin = User.objects.get(pk=admin.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.is_staff = admin.is_superuser = False
+            admin.role = User.ROLE_PATIENT
+            admin.save()
+
+        self.assertEqual(admin.auth_version, 1)
+        self.assertEqual(client.get(reverse("users:cache_stats")).status_code, 401)
+
+    def test_staff_flag_change_alone_revokes_tokens(self):
+        access = str(RoleRefreshToken.for_user(self.user).access_token)
+        user = User.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_staff = True
+            user.save(update_fields=["is_staff"])
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).auth_version, 1)
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(access)
+
+    def test_last_login_update_keeps_tokens_valid(self):
+        access = str(RoleRefreshToken.for_user(self.user).access_token)
+        user = User.objects.get(pk=self.user.pk)
+        user.save(update_fields=["last_login"])
+
+        self.assertEqual(self._authenticate(access)[0].id, self.user.id)
+
+
+class ProfileResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="resolver", email="resolver@example.com", password="pass1234", role=User.ROLE_PATIENT
+        )
+        self.factory = APIRequestFactory()
+
+    def test_resolution_is_cached_across_requests(self):
+        with self.assertNumQueries(1):
+            profiles = resolve_profiles(self._request_for(self.user))
+        self.assertEqual(profiles["patient_profile_id"], self.user.patient_profile.id)
+
+        with self.assertNumQueries(0):
+            request = self._request_for(self.user)
+            self.assertTrue(IsPatient().has_permission(request, None))
+            self.assertFalse(IsDoctor().has_permission(request, None))
+            self.assertEqual(get_profile_id(request, "patient"), profiles["patient_profile_id"])
+
+    def test_profile_creation_invalidates_cache(self):
+        self.assertIsNone(get_profile_id(self._request_for(self.user), "doctor"))
+
+        doctor = DoctorProfile.objects.create(user=self.user, specialization="General Practice")
+
+        self.assertEqual(get_profile_id(self._request_for(self.user), "doctor"), doctor.id)
+
+    def _request_for(self, user):
+        request = self.factory.get("/")
+        request.user = user
+        return request
+
+
+class RegistrationPipelineTests(TestCase):
+    def test_user_and_profile_created_with_two_inserts(self):
+        with self.assertNumQueries(2):
+            user = User.objects.create_user(
+                username="pipeline", email="pipeline@example.com", password="pass1234", role=User.ROLE_DOCTOR
+            )
+        self.assertTrue(DoctorProfile.objects.filter(user=user).exists())
+        self.assertFalse(PatientProfile.objects.filter(user=user).exists())
+
+    def test_updates_skip_profile_work(self):
+        user = User.objects.create_user(username="quiet", email="quiet@example.com", password="pass1234")
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+
+    def test_bulk_register_creates_profiles_per_role(self):
+        users = [
+            User(username=f"bulk{i}", email=f"bulk{i}@example.com", password="!", role=role)
+            for i, role in enumerate([User.ROLE_PATIENT, User.ROLE_DOCTOR, User.ROLE_PATIENT, User.ROLE_ADMIN])
+        ]
+        created = bulk_register_users(users)
+
+        self.assertEqual(len(created), 4)
+        self.assertEqual(PatientProfile.objects.filter(user__username__startswith="bulk").count(), 2)
+        self.assertEqual(DoctorProfile.objects.filter(user__username__startswith="bulk").count(), 1)
+
+
+class PasswordHashingPoolTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="pooled", email="pooled@example.com", password="pass1234", role=User.ROLE_PATIENT
+        )
+
+    def test_login_runs_through_pooled_backend(self):
+        self.assertEqual(authenticate(username="pooled", password="pass1234"), self.user)
+        self.assertIsNone(authenticate(username="pooled", password="wrong"))
+        self.assertIsNone(authenticate(username="nobody", password="pass1234"))
+
+    def test_full_queue_sheds_login_with_503(self):
+        with patch.object(hashing, "_slots", threading.BoundedSemaphore(1)), \
+                patch.object(hashing, "HASH_QUEUE_TIMEOUT", 0.01):
+            hashing._slots.acquire()
+            response = APIClient().post(
+                reverse("users:login"), {"username": "pooled", "password": "pass1234"}, format="json"
+            )
+        self.assertEqual(response.status_code, 503)
+
+    def test_registration_hashes_in_pool(self):
+        with patch.object(hashing, "make_password", wraps=make_password) as hashed:
+            user = register_user(username="fresh", email="fresh@example.com", password="pass1234")
+        hashed.assert_called_once_with("pass1234")
+        self.assertTrue(user.check_password("pass1234"))
+        self.assertTrue(PatientProfile.objects.filter(user=user).exists())
+
+
+    def test_stronger_hashes_are_never_downgraded(self):
+        hasher = hashing.ConfigurablePBKDF2PasswordHasher()
+        with patch.object(hashing.ConfigurablePBKDF2PasswordHasher, "iterations", 1000):
+            self.assertFalse(hasher.must_update(hasher.encode("pass1234", "salt", iterations=2000)))
+            self.assertTrue(hasher.must_update(hasher.encode("pass1234", "salt", iterations=500)))
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="refresher", email="refresher@example.com", password="pass1234"
+        )
+        self.client = APIClient()
+        self.url = reverse("users:token_refresh")
+
+    def test_rotation_blacklists_previous_refresh_token(self):
+        old = str(RoleRefreshToken.for_user(self.user))
+
+        response = self.client.post(self.url, {"refresh": old}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.data)
+
+        replay = self.client.post(self.url, {"refresh": old}, format="json")
+        self.assertEqual(replay.status_code, 401)
+
+        rotated = self.client.post(self.url, {"refresh": response.data["refresh"]}, format="json")
+        self.assertEqual(rotated.status_code, 200)
+
+    @patch("users.blacklist.cache_is_shared", return_value=True)
+    def test_fresh_token_blacklist_check_needs_no_query(self, mock_shared):
+        token = RoleRefreshToken.for_user(self.user)
+        with self.assertNumQueries(0):
+            token.check_blacklist()
+
+    def test_per_process_cache_never_vouches_for_a_token(self):
+        # Stands in for another worker's cache, still holding "clean"
+        token = RoleRefreshToken.for_user(self.user)
+        cache.set(f"auth:jti:{token['jti']}", 0, 60)
+        token.blacklist()
+
+        with self.assertRaises(TokenError):
+            token.check_blacklist()
+
+    def test_prune_removes_only_expired_tokens(self):
+        now = timezone.now()
+        expired = OutstandingToken.objects.create(
+            user=self.user, jti="expired", token="", created_at=now, expires_at=now - timedelta(days=1)
+        )
+        BlacklistedToken.objects.create(token=expired)
+        OutstandingToken.objects.create(
+            user=self.user, jti="live", token="", created_at=now, expires_at=now + timedelta(days=1)
+        )
+
+        self.assertEqual(prune_expired_tokens(batch_size=1), 1)
+        self.assertEqual(list(OutstandingToken.objects.values_list("jti", flat=True)), ["live"])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class UserImportTests(TestCase):
+    CSV = (
+        "email,username,password,role,specialization,location,age\n"
+        "doc@example.com,importdoc,pass1234,doctor,Cardiology,Remera,\n"
+        "pat@example.com,,pass1234,patient,,,41\n"
+        "not-an-email,,,patient,,,\n"
+    )
+
+    def _import(self, text):
+        return import_users(read_rows(io.StringIO(text), "csv"))
+
+    def test_import_creates_users_and_profiles(self):
+        report = self._import(self.CSV)
+
+        self.assertEqual((report["created"], report["updated"]), (2, 0))
+        self.assertEqual([e["line"] for e in report["errors"]], [4])
+        doctor = DoctorProfile.objects.get(user__email="doc@example.com")
+        self.assertEqual(doctor.specialization, "Cardiology")
+        self.assertEqual(doctor.location_key, normalize_location("Remera"))
+        patient = User.objects.get(email="pat@example.com")
+        self.assertEqual(patient.username, "pat@example.com")
+        self.assertEqual(patient.patient_profile.age, 41)
+        self.assertTrue(authenticate(username="importdoc", password="pass1234"))
+
+    def test_reimport_is_idempotent_and_upserts_on_email(self):
+        self._import(self.CSV)
+        version = User.objects.get(email="doc@example.com").auth_version
+
+        again = self._import(self.CSV)
+        self.assertEqual((again["created"], again["updated"], again["unchanged"]), (0, 0, 2))
+        self.assertEqual(User.objects.get(email="doc@example.com").auth_version, version)
+
+        changed = self._import("email,location,password\ndoc@example.com,Huye,newpass5678\n")
+        self.assertEqual(changed["updated"], 1)
+        user = User.objects.get(email="doc@example.com")
+        self.assertEqual(user.doctor_profile.location, "Huye")
+        self.assertEqual(user.auth_version, version + 1)
+        self.assertTrue(user.check_password("newpass5678"))
+
+    def test_command_path_hashes_in_spawned_processes(self):
+        report = import_users(read_rows(io.StringIO(self.CSV), "csv"), processes=1)
+        self.assertEqual(report["created"], 2)
+        self.assertTrue(User.objects.get(email="pat@example.com").check_password("pass1234"))
+
+    def test_admin_endpoint(self):
+        admin = User.objects.create_user(
+            username="importadmin", email="importadmin@example.com", password="pass1234",
+            role=User.ROLE_ADMIN, is_staff=True,
+        )
+        client = APIClient()
+        upload = SimpleUploadedFile("users.jsonl", b'{"email": "json@example.com", "role": "patient"}\n')
+
+        client.force_authenticate(User.objects.create_user(
+            username="plain", email="plain@example.com", password="pass1234"
+        ))
+        self.assertEqual(client.post(reverse("users:user_import"), {"file": upload}).status_code, 403)
+
+        upload.seek(0)
+        client.force_authenticate(admin)
+        response = client.post(reverse("users:user_import"), {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 1)
+        self.assertTrue(PatientProfile.objects.filter(user__email="json@example.com").exists())
+
+    def test_admin_endpoint_hashes_in_the_shared_thread_pool(self):
+        admin = User.objects.create_user(
+            username="importadmin", email="importadmin@example.com", password="pass1234",
+            role=User.ROLE_ADMIN, is_staff=True,
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = SimpleUploadedFile("users.csv", b"email,password\nhashed@example.com,pass1234\n")
+
+        with patch("users.importer.hash_many", return_value=["!"]) as hash_many:
+            response = client.post(reverse("users:user_import"), {"file": upload, "format": "csv"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(hash_many.call_args.kwargs["pool"])
+
+
+class IdempotencyMixinTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="idemuser", email="idemuser@example.com", password="pass1234"
+        )
+        self.calls = 0
+        test = self
+
+        class FlakyView(IdempotentMixin, APIView):
+            permission_classes = []
+
+            def post(self, request):
+                test.calls += 1
+                if test.calls == 1:
+                    raise RuntimeError("backend down")
+                return Response({"calls": test.calls}, status=201)
+
+        self.view = FlakyView.as_view()
+
+    def _post(self):
+        request = APIRequestFactory().post("/flaky/", {"a": 1}, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        force_authenticate(request, self.user)
+        return self.view(request)
+
+    def test_unhandled_error_releases_the_key_for_retries(self):
+        with self.assertRaises(RuntimeError):
+            self._post()
+
+        retry = self._post()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(self._post().data, {"calls": 2})
+        self.assertEqual(self.calls, 2)
+
+
+class SlidingWindowThrottleTests(TestCase):
+    def setUp(self):
+        self.now = 1_000_040.0  # 20s into a 60s window
+        self.store = LocalWindowStore(timer=lambda: self.now)
+
+    def test_window_slides_instead_of_resetting(self):
+        for _ in range(3):
+            self.assertTrue(self.store.hit("k", 3, 60)[0])
+        allowed, wait = self.store.hit("k", 3, 60)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 40)
+
+        # A fixed window would allow a fresh burst right after the boundary
+        self.now += 40
+        self.assertFalse(self.store.hit("k", 3, 60)[0])
+
+        # A third of the way in, the previous window only weighs 2
+        self.now += 20
+        self.assertTrue(self.store.hit("k", 3, 60)[0])
+        self.assertFalse(self.store.hit("k", 3, 60)[0])
+
+    def test_keys_are_independent_and_old_buckets_dropped(self):
+        for _ in range(3):
+            self.store.hit("a", 3, 60)
+        self.assertTrue(self.store.hit("b", 3, 60)[0])
+
+        self.now += 180
+        self.assertTrue(self.store.hit("a", 3, 60)[0])
+        # "b" went quiet and is gone; "a" keeps one entry
+        self.assertEqual(list(self.store.counters), ["a"])
+
+    def test_one_off_keys_do_not_accumulate(self):
+        for i in range(1000):
+            self.store.hit(f"ip-{i}", 3, 60)
+            self.now += 1
+        self.assertLessEqual(len(self.store.counters), 120)
+
+    def test_drf_throttle_uses_shared_store(self):
+        user = User.objects.create_user(username="throttled", email="throttled@example.com", password="pass1234")
+        request = APIRequestFactory().get("/")
+        request.user = user
+
+        with patch("users.throttling.get_store", return_value=self.store), \
+                patch.dict(SlidingUserRateThrottle.THROTTLE_RATES, {"user": "2/min"}):
+            # Separate instances, as separate workers would have
+            self.assertTrue(SlidingUserRateThrottle().allow_request(request, None))
+            self.assertTrue(SlidingUserRateThrottle().allow_request(request, None))
+
+            throttle = SlidingUserRateThrottle()
+            self.assertFalse(throttle.allow_request(request, None))
+            self.assertGreater(throttle.wait(), 0)
+
+    def test_store_outage_fails_open(self):
+        request = APIRequestFactory().get("/")
+        request.user = User.objects.create_user(username="open", email="open@example.com", password="pass1234")
+
+        with patch("users.throttling.get_store", side_effect=ConnectionError("down")):
+            self.assertTrue(SlidingUserRateThrottle().allow_request(request, None))
+
+
+TWO_TIER_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "shared-test"},
+    "local": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "l1-test"},
+}
+
+
+class CacheNamespaceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctors = get_namespace("doctors")
+        self.doctors.reset_stats()
+
+    def test_invalidate_retires_every_key_and_counts_hits(self):
+        self.doctors.set("a", 1)
+        self.doctors.set_many({"b": 2, "c": 3})
+        self.assertEqual(self.doctors.get_many(["a", "b", "x"]), {"a": 1, "b": 2})
+
+        self.doctors.invalidate()
+        self.assertIsNone(self.doctors.get("a"))
+        self.assertEqual(self.doctors.get_or_set("a", lambda: 10), 10)
+        self.assertIsNone(get_namespace("appointments").get("a"))
+
+        stats = self.doctors.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["invalidations"]), (2, 3, 1))
+        self.assertEqual(stats["hit_ratio"], 0.4)
+
+    @override_settings(CACHES=TWO_TIER_CACHES)
+    def test_local_tier_serves_repeat_reads_until_it_expires(self):
+        from django.core.cache import caches
+
+        self.doctors.set("a", 1)
+        self.assertEqual(self.doctors.get("a"), 1)
+
+        # Another worker invalidates: this one keeps its L1 copy until expiry
+        caches["default"].set(self.doctors.version_key, 0, None)
+        self.assertEqual(self.doctors.get("a"), 1)
+        caches["local"].clear()
+        self.assertIsNone(self.doctors.get("a"))
+
+        stats = self.doctors.stats()
+        self.assertEqual((stats["l1_hits"], stats["misses"]), (2, 1))
+
+    def test_model_saves_invalidate_their_namespaces(self):
+        doctor = User.objects.create_user(
+            username="cachedoc", email="cachedoc@example.com", password="pass1234", role=User.ROLE_DOCTOR
+        ).doctor_profile
+        self.doctors.set("directory", ["cachedoc"])
+        get_namespace("appointments").set("slots", [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Availability.objects.create(doctor=doctor, day_of_week="Monday", start_time="09:00", end_time="12:00")
+
+        self.assertIsNone(self.doctors.get("directory"))
+        self.assertIsNone(get_namespace("appointments").get("slots"))
+
+    def test_stats_endpoint_is_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(
+            username="statsadmin", email="statsadmin@example.com", password="pass1234", role=User.ROLE_ADMIN
+        ))
+        self.doctors.get("missing")
+
+        response = client.get(reverse("users:cache_stats"), {"reset": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["namespaces"]["doctors"]["misses"], 1)
+        self.assertEqual(client.get(reverse("users:cache_stats")).data["namespaces"]["doctors"]["misses"], 0)
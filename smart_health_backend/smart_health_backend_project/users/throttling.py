@@ -0,0 +1,190 @@
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, UserRateThrottle
+
+logger = logging.getLogger("users")
+
+# -------------------------------------------------
+# Sliding window counter
+#
+# Each key keeps two fixed-window counters (current and previous). The
+# request rate is estimated as previous * (unelapsed share of the window)
+# + current, which smooths the burst at window edges that fixed windows
+# allow while storing two integers per client instead of a timestamp log.
+# -------------------------------------------------
+SLIDING_WINDOW_LUA = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local limit = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+
+local bucket = math.floor(now_ms / window_ms)
+local elapsed = now_ms - bucket * window_ms
+local current_key = KEYS[1] .. ':' .. bucket
+local previous = tonumber(redis.call('GET', KEYS[1] .. ':' .. (bucket - 1)) or '0')
+local current = tonumber(redis.call('GET', current_key) or '0')
+
+local estimate = previous * (window_ms - elapsed) / window_ms + current
+if estimate + 1 <= limit then
+    redis.call('INCR', current_key)
+    redis.call('PEXPIRE', current_key, window_ms * 2)
+    return {1, 0}
+end
+
+local wait_ms = window_ms - elapsed
+if previous > 0 and current + 1 <= limit then
+    wait_ms = math.max(window_ms - (limit - 1 - current) * window_ms / previous - elapsed, 1)
+end
+return {0, math.ceil(wait_ms)}
+"""
+
+
+def window_decision(previous, current, limit, window, elapsed):
+    """
+    Python twin of the Lua script: (allowed, wait_seconds) for a request
+    `elapsed` seconds into the current window.
+    """
+    estimate = previous * (window - elapsed) / window + current
+    if estimate + 1 <= limit:
+        return True, 0.0
+    wait = window - elapsed
+    if previous > 0 and current + 1 <= limit:
+        wait = max(window - (limit - 1 - current) * window / previous - elapsed, 0.001)
+    return False, wait
+
+
+class RedisWindowStore:
+    """One EVALSHA round trip per request; atomic across all workers."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("THROTTLE_REDIS_URL is set but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(SLIDING_WINDOW_LUA)
+
+    def hit(self, key, limit, window):
+        allowed, wait_ms = self.script(keys=[key], args=[limit, int(window * 1000)])
+        return bool(allowed), wait_ms / 1000
+
+
+class LocalWindowStore:
+    """
+    In-process fake with the same algorithm, for tests and for
+    single-process development without Redis.
+    """
+
+    def __init__(self, timer=time.time):
+        self.timer = timer
+        # key -> (bucket, current, previous, expires_at), oldest write first
+        self.counters = OrderedDict()
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        with self.lock:
+            now = self.timer()
+            bucket = math.floor(now / window)
+            previous, current = self._counts(key, bucket)
+            allowed, wait = window_decision(previous, current, limit, window, now - bucket * window)
+            if allowed:
+                # Useless once the window after next starts
+                self.counters[key] = (bucket, current + 1, previous, (bucket + 2) * window)
+                self.counters.move_to_end(key)
+            self._prune(now)
+            return allowed, wait
+
+    def _counts(self, key, bucket):
+        """(previous, current) window counts of `key` as of `bucket`."""
+        entry = self.counters.get(key)
+        if entry is None:
+            return 0, 0
+        stored, current, previous, _ = entry
+        if stored == bucket:
+            return previous, current
+        if stored == bucket - 1:
+            return current, 0
+        return 0, 0
+
+    def _prune(self, now):
+        # Keys that went quiet collect at the front; each is dropped once
+        while self.counters:
+            key, entry = next(iter(self.counters.items()))
+            if entry[3] > now:
+                break
+            del self.counters[key]
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = getattr(settings, "THROTTLE_REDIS_URL", None)
+                _store = RedisWindowStore(url) if url else LocalWindowStore()
+                if not url:
+                    logger.warning("THROTTLE_REDIS_URL not set; rate limits are per process")
+    return _store
+
+
+# -------------------------------------------------
+# DRF throttles
+# -------------------------------------------------
+class SlidingWindowMixin:
+    """
+    Replaces SimpleRateThrottle's cache-stored timestamp list (a read and
+    a write per request, racy across workers) with the shared store.
+    Rates, scopes and cache keys are unchanged.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        try:
+            allowed, self._wait = get_store().hit(self.key, self.num_requests, self.duration)
+        except Exception as e:
+            # An unreachable limiter must not take the API down with it
+            logger.error(f"Throttle store unavailable, allowing request: {e}")
+            return True
+        return allowed
+
+    def wait(self):
+        return getattr(self, "_wait", None)
+
+
+class SlidingAnonRateThrottle(SlidingWindowMixin, AnonRateThrottle):
+    pass
+
+
+class SlidingUserRateThrottle(SlidingWindowMixin, UserRateThrottle):
+    pass
+
+
+class SlidingScopedRateThrottle(SlidingWindowMixin, ScopedRateThrottle):
+    def allow_request(self, request, view):
+        # ScopedRateThrottle resolves its rate per view before checking
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .blacklist import is_blacklisted, mark_clean
+from .caching import cache_is_shared
+from .models import User
+
+AUTH_VERSION_TTL = getattr(settings, "AUTH_VERSION_CACHE_SECONDS", 60 * 60)
+# A per-process cache never hears of another worker's bump, so revoked
+# tokens keep working there until the entry expires; keep that short
+AUTH_VERSION_LOCAL_TTL = getattr(settings, "AUTH_VERSION_LOCAL_CACHE_SECONDS", 5)
+
+
+# -------------------------------------------------
+# Auth version (revocation)
+# -------------------------------------------------
+def _auth_version_key(user_id) -> str:
+    return f"auth:version:{user_id}"
+
+
+def cache_auth_version(user_id, version: int):
+    ttl = AUTH_VERSION_TTL if cache_is_shared() else AUTH_VERSION_LOCAL_TTL
+    cache.set(_auth_version_key(user_id), version, ttl)
+
+
+def get_auth_version(user_id):
+    """
+    Current auth version of a user, served from the cache. Returns None
+    when the user no longer exists.
+    """
+    version = cache.get(_auth_version_key(user_id))
+    if version is None:
+        version = (
+            User.objects.filter(pk=user_id, is_active=True)
+            .values_list("auth_version", flat=True)
+            .first()
+        )
+        if version is None:
+            return None
+        cache_auth_version(user_id, version)
+    return version
+
+
+# -------------------------------------------------
+# Tokens
+# -------------------------------------------------
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token whose claims (copied into its access token) carry
+    everything permissions need, so requests resolve identity without
+    loading the user or its profiles.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        patient_profile = getattr(user, "patient_profile", None)
+        doctor_profile = getattr(user, "doctor_profile", None)
+
+        token["username"] = user.username
+        token["email"] = user.email
+        token["role"] = user.role
+        token["is_staff"] = user.is_staff
+        token["is_superuser"] = user.is_superuser
+        token["patient_profile_id"] = patient_profile.id if patient_profile else None
+        token["doctor_profile_id"] = doctor_profile.id if doctor_profile else None
+        token["auth_version"] = user.auth_version
+
+        cache_auth_version(user.pk, user.auth_version)
+        mark_clean(token[api_settings.JTI_CLAIM], token["exp"])
+        return token
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM], self.payload["exp"]):
+            raise TokenError(_("Token is blacklisted"))
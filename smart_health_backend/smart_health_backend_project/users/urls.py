@@ -1,9 +1,13 @@
 from django.urls import path
-from .views import RegisterView, LoginView
+from rest_framework_simplejwt.views import TokenRefreshView
+from .views import RegisterView, LoginView, UserImportView, CacheStatsView
 
 app_name = "users"
 
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="register"),
     path("login/", LoginView.as_view(), name="login"),
+    path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("import/", UserImportView.as_view(), name="user_import"),
+    path("cache/stats/", CacheStatsView.as_view(), name="cache_stats"),
 ]
@@ -1,11 +1,23 @@
+import csv
+import io
+from itertools import islice
+
 from rest_framework import generics, status
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from django.conf import settings
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
 
+from .caching import cache_stats, get_namespace
+from .importer import import_users, read_rows
 from .models import User
-from .serializers import RegisterSerializer, LoginSerializer
+from .permissions import IsAdmin
+from .tokens import RoleRefreshToken
+from .serializers import RegisterSerializer, LoginSerializer, UserImportSerializer
+
+# Larger files go through `manage.py import_users`
+IMPORT_MAX_ROWS = getattr(settings, "USER_IMPORT_MAX_ROWS", 5000)
 
 
 class RegisterView(generics.CreateAPIView):
@@ -43,7 +55,7 @@ class LoginView(generics.GenericAPIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        refresh = RefreshToken.for_user(user)
+        refresh = RoleRefreshToken.for_user(user)
 
         return Response(
             {
@@ -54,3 +66,50 @@ class LoginView(generics.GenericAPIView):
             },
             status=status.HTTP_200_OK,
         )
+
+
+class UserImportView(generics.GenericAPIView):
+    """
+    Admin bulk onboarding: upload a CSV/JSONL of users (upserted on
+    email) and get back created/updated counts, row errors and rows/sec.
+    """
+    serializer_class = UserImportSerializer
+    permission_classes = [IsAdmin]
+    parser_classes = [MultiPartParser]
+    http_method_names = ["post"]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        stream = io.TextIOWrapper(serializer.validated_data["file"], encoding="utf-8-sig", newline="")
+        try:
+            rows = list(islice(read_rows(stream, serializer.validated_data["format"]), IMPORT_MAX_ROWS + 1))
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response({"detail": f"Unreadable file: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > IMPORT_MAX_ROWS:
+            return Response(
+                {"detail": f"At most {IMPORT_MAX_ROWS} rows per upload; use the import_users command."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Hashed in the shared thread pool; worker processes are for the command
+        report = import_users(rows)
+        report["error_count"] = len(report["errors"])
+        report["errors"] = report["errors"][:100]
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class CacheStatsView(generics.GenericAPIView):
+    """
+    Hit/miss counts and ratios per cache namespace, summed over all
+    workers. `?reset=1` zeroes the counters after reading them.
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        stats = cache_stats()
+        if request.query_params.get("reset") in ("1", "true"):
+            for name in stats:
+                get_namespace(name).reset_stats()
+        return Response({"namespaces": stats}, status=status.HTTP_200_OK)